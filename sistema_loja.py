@@ -13,6 +13,69 @@ Garantias:
 - Um único APP_VERSION e um único __main__
 - Melhoria: janela volta para frente após abrir PDF (bring_app_to_front)
 """
+# ===================== PERFIL DE INICIALIZAÇÃO =====================
+# Rode com --perfil-inicio (ou BESIM_PERFIL_INICIO=1) para ver quanto cada fase
+# da abertura (imports, schema/migrações, licença, login) levou. Sem a flag,
+# marcar()/medir() só guardam os tempos e nada é impresso.
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+class PerfilInicio:
+    """Cronômetro por fase. `marcar` fecha a fase corrente; `medir` cronometra um bloco."""
+
+    def __init__(self, ativo: bool):
+        self.ativo = bool(ativo)
+        self.t0 = time.perf_counter()
+        self._ultimo = self.t0
+        self.fases = []       # [(nome, segundos)]
+        self._reportado = 0
+
+    def marcar(self, fase: str):
+        agora = time.perf_counter()
+        self.fases.append((fase, agora - self._ultimo))
+        self._ultimo = agora
+
+    @contextmanager
+    def medir(self, fase: str):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.fases.append((f"{fase} (sob demanda)", time.perf_counter() - inicio))
+
+    def relatorio(self, titulo: str):
+        """Imprime (stderr) e registra no log as fases desde o último relatório."""
+        if not self.ativo:
+            return
+        novas = self.fases[self._reportado:]
+        self._reportado = len(self.fases)
+        linhas = [f"[perfil] {titulo} — {time.perf_counter() - self.t0:.3f}s desde o início"]
+        for nome, seg in novas:
+            linhas.append(f"[perfil]   {seg * 1000:9.1f} ms  {nome}")
+        texto = "\n".join(linhas)
+        try:
+            print(texto, file=sys.stderr, flush=True)
+        except Exception:
+            pass
+        try:
+            logging.info("%s", texto)
+        except Exception:
+            pass
+
+
+PERFIL = PerfilInicio(
+    "--perfil-inicio" in sys.argv[1:]
+    or os.environ.get("BESIM_PERFIL_INICIO", "").strip() not in ("", "0")
+)
+if "--perfil-inicio" in sys.argv[1:]:
+    sys.argv = [a for a in sys.argv if a != "--perfil-inicio"]
+    os.environ["BESIM_PERFIL_INICIO"] = "1"  # sobrevive ao os.execv do auto-update
+# ===================== FIM PERFIL DE INICIALIZAÇÃO =====================
+
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 from PIL import Image, ImageTk
@@ -64,8 +127,20 @@ def _parse_br_date_flex(s: str):
     except Exception:
         return None
 
-import os
-import sys
+# Converte 'd/m/aaaa' ou 'dd/mm/aaaa' para 'aaaa-mm-dd' (coluna data_iso). None se inválida.
+def _br_to_iso(s: str):
+    dmY = _parse_br_date_flex(s)
+    if not dmY:
+        return None
+    d, mo, y = dmY
+    return f"{y:04d}-{mo:02d}-{d:02d}"
+
+# Intervalo semiaberto [inicio, fim) em ISO para um mês (uso: data_iso >= ? AND data_iso < ?).
+def _iso_range_mes(ano: int, mes: int):
+    ano = int(ano); mes = int(mes)
+    prox_ano, prox_mes = (ano + 1, 1) if mes == 12 else (ano, mes + 1)
+    return f"{ano:04d}-{mes:02d}-01", f"{prox_ano:04d}-{prox_mes:02d}-01"
+
 import hashlib
 import base64
 import platform
@@ -78,18 +153,16 @@ import ssl
 import glob
 import certifi
 from functools import partial
-from reportlab.lib.pagesizes import A4
 import smtplib
 from email.message import EmailMessage
 from email.utils import make_msgid
 import mimetypes
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
 import subprocess
 import hmac
 import secrets
 import getpass
-from io import BytesIO
+
+PERFIL.marcar("imports (tkinter, PIL, stdlib)")
 
 # ===================== COMMON HELPERS (Refatoração incremental) =====================
 # Objetivo: reduzir repetição e deixar o código mais fluido sem quebrar a arquitetura.
@@ -176,16 +249,49 @@ USE_TOAST_FOR_INFO = True
 # ===================== FIM COMMON HELPERS =====================
 
 
-# ---- Gráficos para relatório mensal (matplotlib, modo headless) ----
-# O app continua funcionando mesmo sem matplotlib (gera PDF sem gráfico).
-try:
-    import matplotlib
-    matplotlib.use("Agg")
-    import matplotlib.pyplot as plt
-    _HAS_MPL = True
-except Exception:
-    plt = None
-    _HAS_MPL = False
+# ---- Módulos pesados sob demanda (matplotlib / reportlab) ----
+# Só são importados no primeiro gráfico ou PDF, não na abertura: o matplotlib
+# sozinho custa ~1s e atrasava a licença e o login. O app continua funcionando
+# sem matplotlib (gera PDF sem gráfico).
+_LAZY_LOCK = threading.Lock()
+_LAZY_MODS = {}
+
+
+def _pyplot():
+    """matplotlib.pyplot com backend Agg (headless), ou None se não instalado."""
+    if "pyplot" not in _LAZY_MODS:
+        with _LAZY_LOCK:
+            if "pyplot" not in _LAZY_MODS:
+                with PERFIL.medir("import matplotlib"):
+                    try:
+                        import matplotlib
+                        matplotlib.use("Agg")
+                        import matplotlib.pyplot as plt
+                    except Exception as ex:
+                        logging.warning("matplotlib indisponível: %s", ex)
+                        plt = None
+                _LAZY_MODS["pyplot"] = plt
+    return _LAZY_MODS["pyplot"]
+
+
+def _reportlab():
+    """Namespace com `canvas`, `A4` e `ImageReader` do reportlab (importado no 1º PDF)."""
+    if "reportlab" not in _LAZY_MODS:
+        with _LAZY_LOCK:
+            if "reportlab" not in _LAZY_MODS:
+                with PERFIL.medir("import reportlab"):
+                    from types import SimpleNamespace
+                    from reportlab.lib.pagesizes import A4
+                    from reportlab.pdfgen import canvas
+                    from reportlab.lib.utils import ImageReader
+                _LAZY_MODS["reportlab"] = SimpleNamespace(canvas=canvas, A4=A4, ImageReader=ImageReader)
+    return _LAZY_MODS["reportlab"]
+
+
+def _pdf_canvas(nome_arquivo):
+    """reportlab Canvas A4 para `nome_arquivo`."""
+    rl = _reportlab()
+    return rl.canvas.Canvas(nome_arquivo, pagesize=rl.A4)
 
 
 
@@ -282,15 +388,143 @@ PADY = 8
 # ================= ENVIO DE CUPOM POR E-MAIL (movido para topo) =================
 
 def _load_email_config():
-    """Lê email_config.txt (chaves: EMAIL_GMAIL, EMAIL_GMAIL_APP)."""
+    """Lê email_config.txt (chaves: EMAIL_GMAIL, EMAIL_GMAIL_APP; opcionais: EMAIL_SMTP_HOST,
+    EMAIL_SMTP_PORT, EMAIL_SMTP_MODO = ssl | starttls | plain)."""
     return load_kv_config(P('email_config.txt'))
 
 
+SMTP_OCIOSO_MAX_SEG = 240   # sessão parada há mais tempo é testada (NOOP) antes de reusar
+SMTP_MAX_SESSOES = 2        # uma por worker do JOBS
+
+
+class SmtpPool:
+    """Sessões SMTP autenticadas reaproveitadas entre envios (sem handshake TLS + login por e-mail).
+    - enviar() é síncrono (chamar fora da thread do Tk, ex.: via JOBS); enviar_em_fila() usa o JOBS com retries
+    - sessão ociosa é validada com NOOP; se o servidor derrubou (timeout de inatividade), reconecta e reenvia
+    - modo padrão: SSL 465 com fallback para STARTTLS 587 (como antes)
+    """
+    def __init__(self, max_sessoes: int = SMTP_MAX_SESSOES):
+        self._max = int(max_sessoes)
+        self._lock = threading.Lock()
+        self._livres = []  # [(smtp, chave, ultimo_uso)]
+
+    @staticmethod
+    def _config():
+        cfg = _load_email_config()
+        remetente = cfg.get("EMAIL_GMAIL") or os.getenv("EMAIL_GMAIL")
+        senha = cfg.get("EMAIL_GMAIL_APP") or os.getenv("EMAIL_GMAIL_APP")
+        host = cfg.get("EMAIL_SMTP_HOST") or "smtp.gmail.com"
+        modo = (cfg.get("EMAIL_SMTP_MODO") or "ssl").strip().lower()
+        porta = int(cfg.get("EMAIL_SMTP_PORT") or (465 if modo == "ssl" else 587))
+        return remetente, senha, host, porta, modo
+
+    def _conectar(self, remetente, senha, host, porta, modo):
+        if modo == "plain":
+            smtp = smtplib.SMTP(host, porta, timeout=20)
+        elif modo == "starttls":
+            smtp = smtplib.SMTP(host, porta, timeout=20)
+            smtp.ehlo()
+            smtp.starttls(context=_SSL_CTX)
+        else:
+            try:
+                smtp = smtplib.SMTP_SSL(host, porta, timeout=20, context=_SSL_CTX)
+            except (OSError, smtplib.SMTPException) as e_ssl:
+                logging.warning("SMTP SSL falhou (%s); tentando STARTTLS 587", e_ssl)
+                smtp = smtplib.SMTP(host, 587, timeout=20)
+                smtp.ehlo()
+                smtp.starttls(context=_SSL_CTX)
+        try:
+            if remetente and senha:
+                smtp.login(remetente, senha)
+        except Exception:
+            self._fechar_sessao(smtp)
+            raise
+        return smtp
+
+    @staticmethod
+    def _fechar_sessao(smtp):
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def _obter(self, chave):
+        """(smtp, nova). Reusa uma sessão livre da mesma conta; se ociosa demais, confere com NOOP."""
+        while True:
+            with self._lock:
+                item = self._livres.pop() if self._livres else None
+            if item is None:
+                return self._conectar(*chave), True
+            smtp, chave_sessao, ultimo_uso = item
+            if chave_sessao != chave:
+                self._fechar_sessao(smtp)
+                continue
+            if time.monotonic() - ultimo_uso > SMTP_OCIOSO_MAX_SEG:
+                try:
+                    if smtp.noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected("NOOP recusado")
+                except (OSError, smtplib.SMTPException):
+                    self._fechar_sessao(smtp)
+                    continue
+            return smtp, False
+
+    def _devolver(self, smtp, chave):
+        with self._lock:
+            if len(self._livres) < self._max:
+                self._livres.append((smtp, chave, time.monotonic()))
+                return
+        self._fechar_sessao(smtp)
+
+    def enviar(self, msg, remetente: str = None):
+        """Envia `msg` (EmailMessage). Exceções do smtplib sobem para o chamador."""
+        chave = self._config()
+        if remetente and not msg.get("From"):
+            msg["From"] = remetente
+        while True:
+            smtp, nova = self._obter(chave)
+            try:
+                smtp.send_message(msg)
+            except (smtplib.SMTPServerDisconnected, OSError):
+                self._fechar_sessao(smtp)
+                if nova:
+                    raise
+                continue  # sessão reaproveitada caiu (timeout do servidor): reconecta e reenvia
+            except smtplib.SMTPResponseException:
+                self._devolver(smtp, chave)  # recusa do servidor; a sessão continua boa
+                raise
+            except Exception:
+                self._fechar_sessao(smtp)
+                raise
+            self._devolver(smtp, chave)
+            return
+
+    def enviar_em_fila(self, msg, on_done=None, on_error=None, retries: int = 2, backoff_sec: float = 5.0):
+        """Enfileira o envio no JOBS (repete com backoff; callbacks rodam no Tk)."""
+        JOBS.submit(self.enviar, msg, on_done=on_done, on_error=on_error, retries=retries, backoff_sec=backoff_sec)
+
+    def aquecer(self):
+        """Abre e autentica uma sessão antecipadamente (o 1º cupom do dia sai sem handshake)."""
+        remetente, senha = self._config()[:2]
+        if not remetente or not senha:
+            return
+        chave = self._config()
+        smtp, _nova = self._obter(chave)
+        self._devolver(smtp, chave)
+
+    def fechar(self):
+        with self._lock:
+            livres, self._livres = self._livres, []
+        for smtp, _chave, _uso in livres:
+            self._fechar_sessao(smtp)
 
+SMTP = SmtpPool()
 
 
 def enviar_cupom_email(destinatario_email, caminho_pdf):
-    """Envia o cupom por e-mail usando Gmail.
+    """Envia o cupom por e-mail usando Gmail (sessão SMTP reaproveitada; ver SmtpPool).
     Retorna (True, "OK") em caso de sucesso; em falha retorna (False, mensagem_detalhada)."""
     try:
         if not destinatario_email or "@" not in destinatario_email:
@@ -323,24 +557,14 @@ Obrigado pela preferência!""")
                 filename=os.path.basename(caminho_pdf)
             )
         try:
-            with smtplib.SMTP_SSL("smtp.gmail.com", 465, timeout=20) as smtp:
-                smtp.login(EMAIL_REMETENTE, SENHA_APP)
-                smtp.send_message(msg_obj)
-                return True, "OK"
+            SMTP.enviar(msg_obj)
+            return True, "OK"
         except smtplib.SMTPAuthenticationError as e:
             logging.error("Falha de autenticação SMTP: %s", str(e))
             return False, f"Autenticação SMTP falhou: {e}"
-        except Exception as e_ssl:
-            try:
-                with smtplib.SMTP("smtp.gmail.com", 587, timeout=20) as smtp:
-                    smtp.ehlo()
-                    smtp.starttls()
-                    smtp.login(EMAIL_REMETENTE, SENHA_APP)
-                    smtp.send_message(msg_obj)
-                    return True, "OK"
-            except Exception as e_tls:
-                logging.error("Erro ao enviar e-mail (SSL e TLS falharam): %s | %s", str(e_ssl), str(e_tls))
-                return False, f"Falha SSL/TLS: {e_ssl} | {e_tls}"
+        except (OSError, smtplib.SMTPException) as e:
+            logging.error("Erro ao enviar e-mail (SSL e TLS falharam): %s", str(e))
+            return False, f"Falha SSL/TLS: {e}"
     except Exception as e:
         logging.error("Erro inesperado ao enviar e-mail: %s", str(e), exc_info=True)
         return False, f"Erro inesperado: {e}"
@@ -351,18 +575,82 @@ def garantir_pastas_backup():
             os.makedirs(os.path.join(GOOGLE_DRIVE_BACKUP, pasta), exist_ok=True)
     except Exception as ex:
         logging.error(f"Falha ao criar pastas de backup: {ex}", exc_info=True)
-def backup_banco():
+BACKUP_PAGINAS_POR_PASSO = 256  # páginas copiadas por passo da API de backup
+
+def backup_banco(progresso=None):
+    """Backup consistente do banco pela API de backup do SQLite.
+
+    Pode rodar fora da thread do Tk (usa a conexão da thread atual). Copia em passos
+    de páginas chamando progresso(pct), valida a cópia com PRAGMA integrity_check e
+    só então a grava no store de snapshots (comprimido, com dedup e retenção).
+    Retorna o caminho do manifesto do snapshot ou None.
+    """
+    tmp = None
     try:
         garantir_pastas_backup()
-        if os.path.exists(DB_PATH):
-            agora = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            destino = os.path.join(
-                GOOGLE_DRIVE_BACKUP, "banco", f"besim_company_{agora}.db"
-            )
-            shutil.copy2(DB_PATH, destino)
-            logging.info(f"Backup do banco -> {destino}")
+        if not os.path.exists(DB_PATH):
+            return None
+        agora = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        nome = f"besim_company_{agora}"
+        # nome único: dois backups no mesmo segundo (fechamento do dia + timer) não dividem o arquivo
+        fd, tmp = tempfile.mkstemp(prefix=f"{nome}_", suffix=".db.tmp", dir=os.path.join(GOOGLE_DRIVE_BACKUP, "banco"))
+        os.close(fd)
+
+        def _passo(_status, restantes, total):
+            if progresso is not None and total:
+                try:
+                    progresso(int(100 * (total - restantes) / total))
+                except Exception as ex:
+                    logging.error("Erro ignorado: %s", ex, exc_info=True)
+
+        dst = sqlite3.connect(tmp)
+        try:
+            # Snapshot transacional (inclui o que ainda está no -wal); sem cópia de arquivo "rasgada"
+            DB.get().backup(dst, pages=BACKUP_PAGINAS_POR_PASSO, progress=_passo, sleep=0.005)
+            dst.execute("PRAGMA journal_mode=DELETE")  # cópia autocontida (sem -wal/-shm)
+            r = dst.execute("PRAGMA integrity_check").fetchone()
+            journal_ate = _journal_seq(dst)  # replay continua a partir daqui
+        finally:
+            dst.close()
+        if not r or str(r[0]).strip().lower() != "ok":
+            logging.error("Backup do banco reprovado no integrity_check: %s", r[0] if r else "?")
+            os.remove(tmp)
+            return None
+        destino = snapshot_salvar(tmp, nome, journal_ate=journal_ate)
+        os.remove(tmp)
+        try:
+            snapshot_aplicar_retencao()
+            journal_aplicar_retencao(journal_ate)
+        except Exception as ex:
+            logging.error("Erro ignorado: %s", ex, exc_info=True)
+        logging.info(f"Backup do banco -> {destino}")
+        return destino
     except Exception as ex:
         logging.error(f"Falha no backup do DB: {ex}", exc_info=True)
+        try:
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+        except Exception as ex2:
+            logging.error("Erro ignorado: %s", ex2, exc_info=True)
+        return None
+# Backup incremental de PDFs: a tabela backup_manifest guarda (tipo, nome, tamanho,
+# mtime, sha256) do que já foi copiado; só arquivos novos/alterados são copiados.
+def _sha256_arquivo(caminho: str) -> str:
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+def _backup_manifest_registrar(c, tipo: str, nome: str, st, sha: str):
+    c.execute(
+        """INSERT INTO backup_manifest(tipo,nome,tamanho,mtime_ns,sha256,copiado_em) VALUES (?,?,?,?,?,?)
+           ON CONFLICT(tipo,nome) DO UPDATE SET
+               tamanho=excluded.tamanho, mtime_ns=excluded.mtime_ns,
+               sha256=excluded.sha256, copiado_em=excluded.copiado_em""",
+        (tipo, nome, int(st.st_size), int(st.st_mtime_ns), sha, now_br()),
+    )
+
 def backup_pdf(caminho_pdf: str, tipo: str):
     try:
         garantir_pastas_backup()
@@ -373,19 +661,238 @@ def backup_pdf(caminho_pdf: str, tipo: str):
             logging.info(
                 f"Backup PDF ({tipo}) -> {os.path.join(destino_dir, os.path.basename(caminho_pdf))}"
             )
+            # Registra no manifesto para o backup em lote não copiar de novo
+            try:
+                c = DB.get()
+                with c:
+                    _backup_manifest_registrar(
+                        c, tipo, os.path.basename(caminho_pdf), os.stat(caminho_pdf), _sha256_arquivo(caminho_pdf)
+                    )
+            except Exception as ex:
+                logging.error("Erro ignorado: %s", ex, exc_info=True)
     except Exception as ex:
         logging.error(f"Falha no backup PDF: {ex}", exc_info=True)
 def backup_bulk_dir(local_dir: str, tipo: str):
+    """Backup incremental de `local_dir/*.pdf` para GOOGLE_DRIVE_BACKUP/<tipo>.
+
+    Pula arquivos com mesmo tamanho/mtime do manifesto (e presentes no destino);
+    se só o mtime mudou, compara o sha256 antes de copiar.
+    Retorna (arquivos_copiados, bytes_copiados).
+    """
+    copiados = 0
+    total_bytes = 0
     try:
         garantir_pastas_backup()
         destino_dir = os.path.join(GOOGLE_DRIVE_BACKUP, tipo)
         os.makedirs(destino_dir, exist_ok=True)
-        if os.path.exists(local_dir):
-            for pdf in glob.glob(os.path.join(local_dir, "*.pdf")):
+        if not os.path.exists(local_dir):
+            return 0, 0
+        c = DB.get()
+        manifesto = {
+            nome: (tamanho, mtime_ns, sha)
+            for nome, tamanho, mtime_ns, sha in c.execute(
+                "SELECT nome, tamanho, mtime_ns, sha256 FROM backup_manifest WHERE tipo=?", (tipo,)
+            )
+        }
+        no_destino = set(os.listdir(destino_dir))
+        alterados = []
+        for pdf in glob.glob(os.path.join(local_dir, "*.pdf")):
+            nome = os.path.basename(pdf)
+            st = os.stat(pdf)
+            ent = manifesto.get(nome)
+            presente = nome in no_destino
+            if ent and presente and ent[0] == st.st_size and ent[1] == st.st_mtime_ns:
+                continue
+            sha = _sha256_arquivo(pdf)
+            if not (ent and presente and ent[2] == sha):
                 shutil.copy2(pdf, destino_dir)
-            logging.info(f"Backup em lote de {local_dir} -> {destino_dir}")
+                copiados += 1
+                total_bytes += int(st.st_size)
+            alterados.append((nome, st, sha))
+        # Grava o manifesto numa transação curta (não segura o lock durante as cópias)
+        if alterados:
+            with c:
+                for nome, st, sha in alterados:
+                    _backup_manifest_registrar(c, tipo, nome, st, sha)
+        logging.info(
+            f"Backup incremental de {local_dir} -> {destino_dir}: {copiados} arquivo(s), {total_bytes} bytes"
+        )
     except Exception as ex:
         logging.error(f"Falha no backup em lote: {ex}", exc_info=True)
+    return copiados, total_bytes
+
+
+# ===================== SNAPSHOTS DO BANCO (comprimidos + dedup + retenção) =====================
+# GOOGLE_DRIVE_BACKUP/banco/store/
+#   blocos/ab/<sha256>.gz  -> blocos de SNAPSHOT_BLOCO_BYTES (alinhados às páginas do SQLite), gzip
+#   snapshots/<nome>.json  -> manifesto: tamanho, sha256 do arquivo e a lista de blocos
+# Blocos iguais entre snapshots são gravados uma única vez; a retenção (avô-pai-filho)
+# apaga manifestos antigos e os blocos que nenhum manifesto restante usa.
+import gzip
+import json
+import threading
+
+SNAPSHOT_BLOCO_BYTES = 64 * 1024          # múltiplo de qualquer page_size do SQLite (<= 64 KB)
+SNAPSHOT_RETENCAO = {"horas": 48, "dias": 30, "meses": 12}
+_SNAPSHOT_LOCK = threading.Lock()
+
+def _snapshot_dirs():
+    base = os.path.join(GOOGLE_DRIVE_BACKUP, "banco", "store")
+    blocos = os.path.join(base, "blocos")
+    snaps = os.path.join(base, "snapshots")
+    os.makedirs(blocos, exist_ok=True)
+    os.makedirs(snaps, exist_ok=True)
+    return blocos, snaps
+
+def _snapshot_bloco_path(dir_blocos: str, sha: str) -> str:
+    return os.path.join(dir_blocos, sha[:2], f"{sha}.gz")
+
+def _snapshot_nome_dt(nome: str):
+    try:
+        return datetime.datetime.strptime(nome.replace("besim_company_", ""), "%Y%m%d_%H%M%S")
+    except Exception:
+        return None
+
+def snapshot_salvar(caminho_db: str, nome: str, journal_ate: int = None) -> str:
+    """Grava `caminho_db` no store (lendo em blocos, sem carregar o arquivo inteiro).
+    `journal_ate` é o último id do journal de alterações contido na cópia.
+    Retorna o caminho do manifesto. Estatísticas (blocos novos/bytes) vão para o log.
+    """
+    dir_blocos, dir_snaps = _snapshot_dirs()
+    blocos = []
+    novos = 0
+    bytes_gravados = 0
+    h_total = hashlib.sha256()
+    tamanho = 0
+    with _SNAPSHOT_LOCK:
+        with open(caminho_db, "rb") as f:
+            for dados in iter(lambda: f.read(SNAPSHOT_BLOCO_BYTES), b""):
+                tamanho += len(dados)
+                h_total.update(dados)
+                sha = hashlib.sha256(dados).hexdigest()
+                blocos.append(sha)
+                destino = _snapshot_bloco_path(dir_blocos, sha)
+                if os.path.exists(destino):
+                    continue
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                comprimido = gzip.compress(dados, compresslevel=6)
+                tmp = destino + ".tmp"
+                with open(tmp, "wb") as out:
+                    out.write(comprimido)
+                os.replace(tmp, destino)
+                novos += 1
+                bytes_gravados += len(comprimido)
+        manifesto = {
+            "nome": nome,
+            "criado_em": now_br(),
+            "tamanho": tamanho,
+            "sha256": h_total.hexdigest(),
+            "bloco_bytes": SNAPSHOT_BLOCO_BYTES,
+            "journal_ate": journal_ate,
+            "blocos": blocos,
+        }
+        caminho_manifesto = os.path.join(dir_snaps, f"{nome}.json")
+        tmp = caminho_manifesto + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as out:
+            json.dump(manifesto, out)
+        os.replace(tmp, caminho_manifesto)
+    logging.info(
+        "Snapshot %s: %d bytes, %d bloco(s), %d novo(s) (%d bytes gravados)",
+        nome, tamanho, len(blocos), novos, bytes_gravados,
+    )
+    return caminho_manifesto
+
+def snapshot_listar() -> list:
+    """Nomes dos snapshots disponíveis, do mais recente para o mais antigo."""
+    _dir_blocos, dir_snaps = _snapshot_dirs()
+    nomes = [n[:-5] for n in os.listdir(dir_snaps) if n.endswith(".json")]
+    return sorted(nomes, key=lambda n: _snapshot_nome_dt(n) or datetime.datetime.min, reverse=True)
+
+def snapshot_restaurar(nome: str, destino: str) -> str:
+    """Reconstrói o banco do snapshot `nome` em `destino` (confere sha256 e integrity_check)."""
+    dir_blocos, dir_snaps = _snapshot_dirs()
+    with open(os.path.join(dir_snaps, f"{nome}.json"), "r", encoding="utf-8") as f:
+        manifesto = json.load(f)
+    h_total = hashlib.sha256()
+    tmp = destino + ".tmp"
+    with open(tmp, "wb") as out:
+        for sha in manifesto["blocos"]:
+            with open(_snapshot_bloco_path(dir_blocos, sha), "rb") as f:
+                dados = gzip.decompress(f.read())
+            if hashlib.sha256(dados).hexdigest() != sha:
+                raise ValueError(f"Bloco corrompido no snapshot {nome}: {sha}")
+            h_total.update(dados)
+            out.write(dados)
+    if h_total.hexdigest() != manifesto.get("sha256"):
+        os.remove(tmp)
+        raise ValueError(f"Snapshot {nome} não confere com o sha256 do manifesto")
+    c = sqlite3.connect(tmp)
+    try:
+        r = c.execute("PRAGMA integrity_check").fetchone()
+    finally:
+        c.close()
+    if not r or str(r[0]).strip().lower() != "ok":
+        os.remove(tmp)
+        raise ValueError(f"Snapshot {nome} reprovado no integrity_check")
+    os.replace(tmp, destino)
+    logging.info("Snapshot %s restaurado em %s", nome, destino)
+    return destino
+
+def snapshot_aplicar_retencao(agora=None) -> tuple:
+    """Retenção avô-pai-filho: o mais recente de cada hora (SNAPSHOT_RETENCAO['horas']),
+    de cada dia ('dias') e de cada mês ('meses'); o snapshot mais novo sempre fica.
+    As cópias completas antigas (banco/besim_company_*.db, de antes do store) entram na
+    mesma conta. Depois remove os blocos órfãos. Retorna (snapshots_removidos, blocos_removidos).
+    """
+    agora = agora or datetime.datetime.now()
+    dir_blocos, dir_snaps = _snapshot_dirs()
+    with _SNAPSHOT_LOCK:
+        legados = {}
+        for caminho in glob.glob(os.path.join(GOOGLE_DRIVE_BACKUP, "banco", "besim_company_*.db")):
+            n = os.path.basename(caminho)[:-3]
+            if _snapshot_nome_dt(n):
+                legados[n] = caminho
+        nomes = [n for n in snapshot_listar() if _snapshot_nome_dt(n)]
+        legados = {n: c for n, c in legados.items() if n not in nomes}
+        nomes = sorted(nomes + list(legados), key=_snapshot_nome_dt, reverse=True)
+        manter = set(nomes[:1])
+        vistos = set()
+        for n in nomes:  # do mais novo para o mais antigo: o 1º de cada balde é o mantido
+            dt = _snapshot_nome_dt(n)
+            idade = agora - dt
+            baldes = []
+            if idade <= datetime.timedelta(hours=SNAPSHOT_RETENCAO["horas"]):
+                baldes.append(("h", dt.strftime("%Y%m%d%H")))
+            if idade <= datetime.timedelta(days=SNAPSHOT_RETENCAO["dias"]):
+                baldes.append(("d", dt.strftime("%Y%m%d")))
+            if (agora.year - dt.year) * 12 + (agora.month - dt.month) < SNAPSHOT_RETENCAO["meses"]:
+                baldes.append(("m", dt.strftime("%Y%m")))
+            for b in baldes:
+                if b not in vistos:
+                    vistos.add(b)
+                    manter.add(n)
+        removidos = 0
+        for n in nomes:
+            if n not in manter:
+                os.remove(legados.get(n) or os.path.join(dir_snaps, f"{n}.json"))
+                removidos += 1
+
+        # Coleta de blocos sem referência
+        usados = set()
+        for n in os.listdir(dir_snaps):
+            if n.endswith(".json"):
+                with open(os.path.join(dir_snaps, n), "r", encoding="utf-8") as f:
+                    usados.update(json.load(f).get("blocos", []))
+        blocos_removidos = 0
+        for raiz, _dirs, arquivos in os.walk(dir_blocos):
+            for arq in arquivos:
+                if arq.endswith(".gz") and arq[:-3] not in usados:
+                    os.remove(os.path.join(raiz, arq))
+                    blocos_removidos += 1
+    if removidos or blocos_removidos:
+        logging.info("Retenção de snapshots: %d snapshot(s) e %d bloco(s) removidos", removidos, blocos_removidos)
+    return removidos, blocos_removidos
+# ===================== FIM SNAPSHOTS DO BANCO =====================
 
 
 # ===================== STATUSBAR GLOBAL (VERSÃO + LICENÇA) =====================
@@ -394,6 +901,166 @@ def backup_bulk_dir(local_dir: str, tipo: str):
 # - Dias restantes da licença (get_tempo_restante_licenca_str)
 # - Relógio (HH:MM:SS)
 # Implementação: hook seguro no __init__ de tk.Tk e tk.Toplevel.
+# Todos os rodapés (janelas, abas e barra principal) são atualizados por um
+# único serviço (STATUSBAR): um tick por segundo, licença em cache e cores
+# reaplicadas somente quando o tema muda.
+
+class StatusBarService:
+    """Relógio único das status bars: um tick atualiza todas as labels registradas."""
+
+    def __init__(self, intervalo_ms=1000):
+        self.intervalo_ms = int(intervalo_ms)
+        self._itens = []        # [widget, fonte(agora) -> str, ultimo_texto]
+        self._tema = []         # (widget, papel) com papel 'frame' ou 'label'
+        self._paleta = None
+        self._host = None
+        self._after_id = None
+        self._lic_versao = 0
+        self._lic_cache = None  # (dia, versao, texto)
+
+    # ---- licença (cache até a meia-noite ou até salvar nova licença) ----
+    def licenca_str(self):
+        chave = (datetime.date.today(), self._lic_versao)
+        if self._lic_cache is None or self._lic_cache[:2] != chave:
+            try:
+                texto = get_tempo_restante_licenca_str()
+            except Exception:
+                texto = 'Licença: indisponível'
+            self._lic_cache = (chave[0], chave[1], texto)
+        return self._lic_cache[2]
+
+    def invalidar_licenca(self):
+        self._lic_versao += 1
+
+    # ---- registro ----
+    def registrar(self, widget, fonte):
+        """Registra uma label cujo texto vem de fonte(agora); aplica o texto na hora."""
+        item = [widget, fonte, None]
+        self._itens.append(item)
+        self.registrar_tema(widget, 'label')
+        self._atualizar_item(item, datetime.datetime.now())
+        self._agendar(widget)
+
+    def registrar_tema(self, widget, papel='label'):
+        """Inclui o widget na recoloração por tema (sem texto dinâmico)."""
+        self._tema.append((widget, papel))
+        if self._paleta is not None:
+            self._colorir(widget, papel, self._paleta)
+
+    # ---- tema ----
+    def aplicar_tema(self, paleta):
+        """Chamado na troca de tema: recolore uma única vez todos os widgets registrados."""
+        self._paleta = paleta
+        vivos = []
+        for widget, papel in self._tema:
+            if self._colorir(widget, papel, paleta):
+                vivos.append((widget, papel))
+        self._tema = vivos
+
+    @staticmethod
+    def _colorir(widget, papel, pal):
+        try:
+            if not widget.winfo_exists():
+                return False
+            bg = pal.get('panel') or pal.get('bg')
+            fg = pal.get('muted') or pal.get('text')
+            if papel == 'frame':
+                if bg:
+                    widget.configure(bg=bg)
+                if pal.get('border') and int(widget.cget('highlightthickness') or 0) > 0:
+                    widget.configure(highlightbackground=pal['border'])
+            else:
+                if bg:
+                    widget.configure(bg=bg)
+                if fg:
+                    widget.configure(fg=fg)
+            return True
+        except tk.TclError:
+            return False
+        except Exception as ex:
+            logging.error("Erro ignorado: %s", ex, exc_info=True)
+            return True
+
+    # ---- agendamento ----
+    # O after() fica na janela raiz (Tk) do widget, não numa label qualquer. Se essa raiz for
+    # destruída (ex.: o Tk temporário do diálogo de licença), o tkinter apaga o after pendente:
+    # o <Destroy> da raiz e a checagem de host vivo reagendam o relógio em outra janela.
+    def _host_vivo(self):
+        try:
+            return self._host is not None and bool(self._host.winfo_exists())
+        except tk.TclError:
+            return False
+
+    def _agendar(self, widget=None, excluir=None):
+        if self._after_id is not None and self._host_vivo():
+            return
+        self._host = None
+        self._after_id = None
+        candidatos = ([widget] if widget is not None else []) + [it[0] for it in self._itens]
+        for w in candidatos:
+            try:
+                if not w.winfo_exists():
+                    continue
+                raiz = w._root()
+                if raiz is excluir:
+                    continue
+                self._after_id = raiz.after(self.intervalo_ms, self._tick)
+                self._host = raiz
+                if not getattr(raiz, '_statusbar_destroy_bind', False):
+                    raiz.bind('<Destroy>', self._host_destruido, add='+')
+                    raiz._statusbar_destroy_bind = True
+                return
+            except tk.TclError:
+                continue
+            except Exception as ex:
+                logging.error("Erro ignorado: %s", ex, exc_info=True)
+                continue
+
+    def _host_destruido(self, event):
+        raiz = event.widget
+        if raiz is not self._host:
+            return  # <Destroy> de um filho (propagado pela tag da raiz) ou de outra janela
+        self._host = None
+        self._after_id = None
+        self._agendar(excluir=raiz)
+
+    def _atualizar_item(self, item, agora):
+        widget, fonte, ultimo = item
+        try:
+            if not widget.winfo_exists():
+                return False
+            texto = fonte(agora)
+            if texto != ultimo:
+                widget.config(text=texto)
+                item[2] = texto
+            return True
+        except tk.TclError:
+            return False
+        except Exception as ex:
+            logging.error("Erro ao atualizar status bar: %s", ex, exc_info=True)
+            return True
+
+    def _tick(self):
+        self._after_id = None
+        self._host = None
+        agora = datetime.datetime.now()
+        self._itens = [it for it in self._itens if self._atualizar_item(it, agora)]
+        if self._itens:
+            self._agendar()
+
+    # ---- fontes prontas ----
+    @staticmethod
+    def fonte_relogio(fmt='%H:%M:%S', prefixo=''):
+        return lambda agora: f"{prefixo}{agora.strftime(fmt)}"
+
+    def fonte_licenca(self):
+        return lambda _agora: self.licenca_str()
+
+    def fonte_versao_licenca(self):
+        return lambda _agora: _statusbar_text_version_and_license()
+
+
+STATUSBAR = StatusBarService(intervalo_ms=1000)
 
 _STATUSBAR_HOOK_INSTALLED = False
 
@@ -402,11 +1069,31 @@ def _statusbar_text_version_and_license():
         ver = get_local_version()
     except Exception:
         ver = APP_VERSION
-    try:
-        lic = get_tempo_restante_licenca_str()
-    except Exception:
-        lic = 'Licença: indisponível'
-    return f"v{ver} • {lic}"
+    return f"v{ver} • {STATUSBAR.licenca_str()}"
+
+def _montar_statusbar_janela(win, relief='flat'):
+    """Cria o rodapé (versão + licença | relógio) e registra no serviço STATUSBAR."""
+    bar = tk.Frame(win, bd=1, relief=relief)
+    bar.pack(side='bottom', fill='x', pady=(0, 10))
+
+    # Esquerda: versão + licença
+    lbl_left = tk.Label(bar, text='', anchor='w', padx=10)
+    lbl_left.pack(side='left')
+
+    # Direita: relógio
+    lbl_clock = tk.Label(bar, text='', anchor='e', padx=10)
+    lbl_clock.pack(side='right')
+
+    STATUSBAR.registrar_tema(bar, 'frame')
+    STATUSBAR.registrar(lbl_left, STATUSBAR.fonte_versao_licenca())
+    STATUSBAR.registrar(lbl_clock, STATUSBAR.fonte_relogio())
+
+    # Marca referências
+    win._statusbar_attached = True
+    win._statusbar_widget = bar
+    win._statusbar_left = lbl_left
+    win._statusbar_clock = lbl_clock
+    return bar
 
 def _install_global_statusbar_hook():
     global _STATUSBAR_HOOK_INSTALLED
@@ -431,65 +1118,7 @@ def _install_global_statusbar_hook():
                     return
             except Exception as ex:
                 logging.error("Erro ignorado: %s", ex, exc_info=True)
-            # Cria container
-            bar = tk.Frame(win, bd=1, relief='flat')
-            bar.pack(side='bottom', fill='x', pady=(0, 10))
-
-            # Esquerda: versão + licença
-            lbl_left = tk.Label(bar, text=_statusbar_text_version_and_license(), anchor='w', padx=10)
-            lbl_left.pack(side='left')
-
-            # Direita: relógio
-            lbl_clock = tk.Label(bar, text='', anchor='e', padx=10)
-            lbl_clock.pack(side='right')
-
-            # Atualiza licença periodicamente (1 min)
-            def _tick_license():
-                try:
-                    lbl_left.config(text=_statusbar_text_version_and_license())
-                except Exception:
-                    return
-                try:
-                    win.after(60000, _tick_license)
-                except Exception as ex:
-                    logging.error("Erro ignorado: %s", ex, exc_info=True)
-            _tick_license()
-
-            # Relógio (1s)
-            import datetime as _dt
-            def _tick_clock():
-                try:
-                    lbl_clock.config(text=_dt.datetime.now().strftime('%H:%M:%S'))
-                except Exception:
-                    return
-                try:
-                    win.after(1000, _tick_clock)
-                except Exception as ex:
-                    logging.error("Erro ignorado: %s", ex, exc_info=True)
-            _tick_clock()
-
-            # Marca referências
-            win._statusbar_attached = True
-            win._statusbar_widget = bar
-            win._statusbar_left = lbl_left
-            win._statusbar_clock = lbl_clock
-
-            # Aplica tema (se existir infraestrutura)
-            try:
-                if 'current_theme' in globals() and isinstance(globals().get('current_theme'), dict):
-                    pal = globals().get('current_theme')
-                    # melhor esforço: pode ser dict com chaves bg/panel/text/muted
-                    bg = pal.get('panel') or pal.get('bg')
-                    fg = pal.get('muted') or pal.get('text')
-                    if bg:
-                        bar.configure(bg=bg)
-                        lbl_left.configure(bg=bg)
-                        lbl_clock.configure(bg=bg)
-                    if fg:
-                        lbl_left.configure(fg=fg)
-                        lbl_clock.configure(fg=fg)
-            except Exception as ex:
-                logging.error("Erro ignorado: %s", ex, exc_info=True)
+            _montar_statusbar_janela(win)
         except Exception:
             # Nunca quebrar criação de janelas
             return
@@ -541,54 +1170,15 @@ def add_tab_statusbar(tab_frame):
         lbl_user = tk.Label(status_frame, text='', anchor='e', padx=5)
         lbl_user.pack(side='right')
 
-        # Função para atualizar
-        def update_status():
-            try:
-                # Horário
-                now_str = datetime.datetime.now().strftime('%H:%M:%S')
-                lbl_time.config(text=f'Horário: {now_str}')
-
-                # Licença
-                lic_str = get_tempo_restante_licenca_str()
-                lbl_license.config(text=lic_str)
-
-                # Usuário
-                user_str = f'Usuário: {CURRENT_USER}' if CURRENT_USER else 'Usuário: N/A'
-                lbl_user.config(text=user_str)
-
-                # Aplicar tema
-                if 'current_theme' in globals() and isinstance(globals().get('current_theme'), dict):
-                    pal = globals().get('current_theme')
-                    bg = pal.get('panel') or pal.get('bg')
-                    fg = pal.get('muted') or pal.get('text')
-                    if bg:
-                        status_frame.configure(bg=bg)
-                        lbl_time.configure(bg=bg)
-                        lbl_license.configure(bg=bg)
-                        lbl_user.configure(bg=bg)
-                    if fg:
-                        lbl_time.configure(fg=fg)
-                        lbl_license.configure(fg=fg)
-                        lbl_user.configure(fg=fg)
-
-            except Exception as ex:
-                logging.error("Erro ao atualizar status bar da aba: %s", ex, exc_info=True)
-
-        # Atualização inicial e periódica
-        update_status()
-        tab_frame.after(1000, lambda: periodic_update(tab_frame, update_status))
+        # Atualização fica a cargo do tick único do STATUSBAR
+        STATUSBAR.registrar_tema(status_frame, 'frame')
+        STATUSBAR.registrar(lbl_time, STATUSBAR.fonte_relogio(prefixo='Horário: '))
+        STATUSBAR.registrar(lbl_license, STATUSBAR.fonte_licenca())
+        STATUSBAR.registrar(lbl_user, lambda _agora: f'Usuário: {CURRENT_USER}' if CURRENT_USER else 'Usuário: N/A')
 
     except Exception as ex:
         logging.error("Erro ao adicionar status bar na aba: %s", ex, exc_info=True)
 
-def periodic_update(tab_frame, update_func):
-    """Atualiza periodicamente o status bar da aba."""
-    try:
-        update_func()
-        tab_frame.after(1000, lambda: periodic_update(tab_frame, update_func))
-    except Exception as ex:
-        logging.error("Erro na atualização periódica: %s", ex, exc_info=True)
-
 # =================== FIM STATUSBAR PARA ABAS ===================
 
 # --- FORÇA STATUSBAR NA JANELA PRINCIPAL (fallback) ---
@@ -611,46 +1201,8 @@ def force_attach_statusbar(win):
             except Exception as ex:
                 logging.error("Erro ignorado: %s", ex, exc_info=True)
             return
-        # Caso não exista, cria igual ao hook, porém com altura/relief para ficar visível
-        bar = tk.Frame(win, bd=1, relief='groove')
-        bar.pack(side='bottom', fill='x', pady=(0, 10))
-        lbl_left = tk.Label(bar, text=_statusbar_text_version_and_license(), anchor='w', padx=10)
-        lbl_left.pack(side='left')
-        lbl_clock = tk.Label(bar, text='', anchor='e', padx=10)
-        lbl_clock.pack(side='right')
-        import datetime as _dt
-        def _tick_license():
-            try:
-                lbl_left.config(text=_statusbar_text_version_and_license())
-                win.after(60000, _tick_license)
-            except Exception:
-                return
-        def _tick_clock():
-            try:
-                lbl_clock.config(text=_dt.datetime.now().strftime('%H:%M:%S'))
-                win.after(1000, _tick_clock)
-            except Exception:
-                return
-        _tick_license(); _tick_clock()
-        win._statusbar_attached = True
-        win._statusbar_widget = bar
-        win._statusbar_left = lbl_left
-        win._statusbar_clock = lbl_clock
-        # tema best-effort
-        try:
-            if 'current_theme' in globals() and isinstance(globals().get('current_theme'), dict):
-                pal = globals().get('current_theme')
-                bg = pal.get('panel') or pal.get('bg')
-                fg = pal.get('muted') or pal.get('text')
-                if bg:
-                    bar.configure(bg=bg)
-                    lbl_left.configure(bg=bg)
-                    lbl_clock.configure(bg=bg)
-                if fg:
-                    lbl_left.configure(fg=fg)
-                    lbl_clock.configure(fg=fg)
-        except Exception as ex:
-            logging.error("Erro ignorado: %s", ex, exc_info=True)
+        # Caso não exista, cria igual ao hook, porém com relief para ficar visível
+        _montar_statusbar_janela(win, relief='groove')
     except Exception:
         return
 # --- FIM FORÇA STATUSBAR ---
@@ -678,6 +1230,17 @@ class CFG:
     # Se não definido, usa um diretório local dentro da pasta do app.
     GOOGLE_DRIVE_BACKUP = os.getenv("GOOGLE_DRIVE_BACKUP") or os.path.join(os.getcwd(), "google_drive_backup")
 
+    # Cupons: 1 = uma página por venda em cupons/cupons_AAAAMMDD.pdf (ver CUPONS: ARQUIVO DIÁRIO);
+    # 0 = um PDF por venda (padrão). Variável de ambiente CUPOM_ARQUIVO_DIARIO.
+    CUPOM_ARQUIVO_DIARIO = os.getenv("CUPOM_ARQUIVO_DIARIO", "0").strip().lower() not in ("", "0", "false", "no", "off")
+
+    # Impressora térmica: destino dos bytes ESC/POS (ver IMPRESSÃO TÉRMICA). Variável THERMAL_PRINTER_URI:
+    # win32:<nome> (ou só o nome / vazio = busca automática), tcp://host[:9100], dev:<caminho>, arquivo:<caminho>
+    THERMAL_PRINTER_URI = os.getenv("THERMAL_PRINTER_URI", "")
+    # Venda: cupom direto na térmica em vez de abrir o PDF (o PDF continua sendo gerado para
+    # e-mail/Telegram/backup). Variável de ambiente THERMAL_PRINT_CUPOM.
+    AUTO_PRINT_CUPOM = os.getenv("THERMAL_PRINT_CUPOM", "0").strip().lower() not in ("", "0", "false", "no", "off")
+
 # Aliases para manter compatibilidade com o resto do código (sem refatorar tudo de uma vez).
 DISABLE_AUTO_UPDATE = CFG.DISABLE_AUTO_UPDATE
 APP_VERSION = CFG.APP_VERSION
@@ -692,6 +1255,9 @@ CURRENT_USER = None
 IGNORE_FILES = CFG.IGNORE_FILES
 IGNORE_DIRS = CFG.IGNORE_DIRS
 GOOGLE_DRIVE_BACKUP = CFG.GOOGLE_DRIVE_BACKUP
+CUPOM_ARQUIVO_DIARIO = CFG.CUPOM_ARQUIVO_DIARIO
+THERMAL_PRINTER_URI = CFG.THERMAL_PRINTER_URI
+AUTO_PRINT_CUPOM = CFG.AUTO_PRINT_CUPOM
 
 
 # ===================== IMPRESSÃO TÉRMICA USB (OS) =====================
@@ -790,51 +1356,194 @@ def _build_os_thermal_text(os_num, nome, cpf, telefone, descricao, valor):
     return "\n".join(lines)
 
 
-def imprimir_os_termica(os_num, nome, cpf, telefone, descricao, valor, printer_name: str = None):
-    """Impressão direta RAW/ESC-POS em impressora térmica USB no Windows."""
-    try:
-        import win32print  # type: ignore
-    except Exception as ex:
-        logging.error("pywin32 não disponível para impressão térmica: %s", ex, exc_info=True)
-        return False, "pywin32 não está instalado no Windows deste cliente."
+# ---- Destinos RAW (ESC/POS) ----
+import abc
 
-    try:
-        target = printer_name or _find_thermal_printer_name()
-        if not target:
-            return False, "Impressora térmica USB não encontrada."
+# CFG.THERMAL_PRINTER_URI escolhe para onde vão os bytes:
+#   win32:<nome da impressora>   (ou só o nome / vazio = busca automática, como antes)
+#   tcp://host[:9100]            impressora de rede (porta RAW/JetDirect)
+#   dev:/dev/usb/lp0             arquivo de dispositivo (Linux /dev/usb/lpX, Windows \\.\COM3 ou LPT1)
+#   arquivo:<caminho>            captura em arquivo (testes / conferência sem impressora)
+THERMAL_TCP_TIMEOUT_SEG = 5.0
 
-        texto = _build_os_thermal_text(os_num, nome, cpf, telefone, descricao, valor)
-        payload = bytearray()
-        payload += b"\x1b@"          # init
-        payload += b"\x1bt\x10"     # codepage Windows-1252/Latin (compatível na maioria das ESC/POS)
-        payload += b"\x1ba\x01"     # center
-        payload += b"\x1d!\x11"     # double height/width para título
-        payload += "BESIM COMPANY\n".encode("cp1252", errors="replace")
-        payload += b"\x1d!\x00"
-        payload += "ORDEM DE SERVICO\n\n".encode("cp1252", errors="replace")
-        payload += b"\x1ba\x00"     # left
-        payload += texto.encode("cp1252", errors="replace")
-        payload += b"\n\n\n"
-        payload += b"\x1dV\x00"     # corte total (ou avança/corta, depende do modelo)
-
-        hprinter = win32print.OpenPrinter(target)
-        try:
-            job = win32print.StartDocPrinter(hprinter, 1, (f"OS {os_num}", None, "RAW"))
+
+class ImpressoraRaw(abc.ABC):
+    """Destino de bytes ESC/POS já montados."""
+
+    descricao = "impressora"
+
+    @abc.abstractmethod
+    def enviar(self, dados: bytes, titulo: str = "Documento"):
+        """Entrega `dados` à impressora; levanta exceção se falhar."""
+
+
+class ImpressoraWin32(ImpressoraRaw):
+    """Spooler do Windows em modo RAW (pywin32)."""
+
+    def __init__(self, nome: str = None):
+        self.nome = nome
+        self.descricao = nome or "impressora térmica (automática)"
+
+    def enviar(self, dados: bytes, titulo: str = "Documento"):
+        try:
+            import win32print  # type: ignore
+        except Exception as ex:
+            logging.error("pywin32 não disponível para impressão térmica: %s", ex, exc_info=True)
+            raise RuntimeError("pywin32 não está instalado no Windows deste cliente.")
+        alvo = self.nome or _find_thermal_printer_name()
+        if not alvo:
+            raise RuntimeError("Impressora térmica USB não encontrada.")
+        self.descricao = alvo
+        hprinter = win32print.OpenPrinter(alvo)
+        try:
+            win32print.StartDocPrinter(hprinter, 1, (titulo, None, "RAW"))
             try:
                 win32print.StartPagePrinter(hprinter)
-                win32print.WritePrinter(hprinter, bytes(payload))
+                win32print.WritePrinter(hprinter, dados)
                 win32print.EndPagePrinter(hprinter)
             finally:
                 win32print.EndDocPrinter(hprinter)
         finally:
             win32print.ClosePrinter(hprinter)
 
-        logging.info("OS %s enviada para impressão térmica direta na impressora: %s", os_num, target)
-        return True, target
+
+class ImpressoraTcp(ImpressoraRaw):
+    """Socket RAW (porta 9100) de impressora de rede."""
+
+    def __init__(self, host: str, porta: int = 9100, timeout: float = THERMAL_TCP_TIMEOUT_SEG):
+        self.host, self.porta, self.timeout = host, int(porta), float(timeout)
+        self.descricao = f"tcp://{host}:{self.porta}"
+
+    def enviar(self, dados: bytes, titulo: str = "Documento"):
+        import socket
+        with socket.create_connection((self.host, self.porta), timeout=self.timeout) as s:
+            s.sendall(dados)
+            try:
+                s.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+
+class ImpressoraDispositivo(ImpressoraRaw):
+    """Arquivo de dispositivo (/dev/usb/lp0, \\\\.\\COM3, LPT1...)."""
+
+    def __init__(self, caminho: str):
+        self.caminho = caminho
+        self.descricao = caminho
+
+    def enviar(self, dados: bytes, titulo: str = "Documento"):
+        with open(self.caminho, "wb", buffering=0) as f:
+            f.write(dados)
+
+
+class ImpressoraArquivo(ImpressoraRaw):
+    """Captura: acrescenta os bytes em `caminho` (se houver) e guarda cada envio em `enviados`."""
+
+    def __init__(self, caminho: str = None):
+        self.caminho = caminho
+        self.descricao = f"arquivo:{caminho}" if caminho else "memória"
+        self.enviados = []  # [(titulo, bytes)]
+
+    def enviar(self, dados: bytes, titulo: str = "Documento"):
+        self.enviados.append((titulo, bytes(dados)))
+        if self.caminho:
+            with open(self.caminho, "ab") as f:
+                f.write(dados)
+
+
+def impressora_termica(destino: str = None) -> ImpressoraRaw:
+    """Backend para `destino` (ou THERMAL_PRINTER_URI; vazio = win32 automático)."""
+    destino = str(destino or THERMAL_PRINTER_URI or "").strip()
+    low = destino.lower()
+    if low.startswith("tcp://"):
+        host, _sep, porta = destino[6:].rstrip("/").partition(":")
+        return ImpressoraTcp(host, int(porta or 9100))
+    if low.startswith("dev:"):
+        return ImpressoraDispositivo(destino[4:])
+    if low.startswith("arquivo:"):
+        return ImpressoraArquivo(destino[8:] or None)
+    if low.startswith("win32:"):
+        destino = destino[6:]
+    return ImpressoraWin32(destino or None)
+
+
+# Sequências ESC/POS fixas (montadas uma vez)
+_ESCPOS_INICIO = (
+    b"\x1b@"          # init
+    b"\x1bt\x10"      # codepage Windows-1252/Latin (compatível na maioria das ESC/POS)
+    b"\x1ba\x01"      # center
+    b"\x1d!\x11"      # double height/width para título
+    + "BESIM COMPANY\n".encode("cp1252", errors="replace")
+    + b"\x1d!\x00"
+)
+_ESCPOS_FIM = b"\n\n\n\x1dV\x00"  # avança e corta (total ou parcial, depende do modelo)
+
+
+def _escpos_documento(subtitulo: str, texto: str) -> bytes:
+    """Payload completo: cabeçalho centralizado + `texto` alinhado à esquerda + corte."""
+    return b"".join((
+        _ESCPOS_INICIO,
+        f"{subtitulo}\n\n".encode("cp1252", errors="replace"),
+        b"\x1ba\x00",     # left
+        texto.encode("cp1252", errors="replace"),
+        _ESCPOS_FIM,
+    ))
+
+
+def imprimir_os_termica(os_num, nome, cpf, telefone, descricao, valor, printer_name: str = None):
+    """Impressão direta RAW/ESC-POS da OS (destino: `printer_name` ou THERMAL_PRINTER_URI)."""
+    impressora = impressora_termica(printer_name)
+    try:
+        texto = _build_os_thermal_text(os_num, nome, cpf, telefone, descricao, valor)
+        impressora.enviar(_escpos_documento("ORDEM DE SERVICO", texto), f"OS {os_num}")
+        logging.info("OS %s enviada para impressão térmica direta na impressora: %s", os_num, impressora.descricao)
+        return True, impressora.descricao
     except Exception as ex:
         logging.error("Falha ao imprimir OS na térmica: %s", ex, exc_info=True)
         return False, str(ex)
 
+
+def _build_cupom_thermal_text(cliente, produto, qtd, pagamento, total, pontos=None, agora=None):
+    agora = agora or datetime.datetime.now()
+    width = THERMAL_MAX_CHARS
+    sep = "-" * width
+    lines = [sep]
+    lines += _wrap_thermal_line("Cliente", cliente, width)
+    lines += _wrap_thermal_line("Produto", produto, width)
+    lines += _wrap_thermal_line("Quantidade", qtd, width)
+    lines += _wrap_thermal_line("Pagamento", pagamento, width)
+    lines += _wrap_thermal_line("Total", _normalize_money_brl(total), width)
+    if pontos is not None:
+        lines += _wrap_thermal_line("Pontos acumulados", f"{pontos} pts", width)
+    lines += [
+        f"Data: {agora.strftime('%d/%m/%Y %H:%M:%S')}",
+        sep,
+        "Obrigado pela preferencia!",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def montar_cupom_escpos(cliente, produto, qtd, pagamento, total, pontos=None, agora=None) -> bytes:
+    """Bytes ESC/POS do cupom de venda (montados uma vez; o backend só os envia)."""
+    return _escpos_documento(
+        "CUPOM NAO FISCAL", _build_cupom_thermal_text(cliente, produto, qtd, pagamento, total, pontos, agora)
+    )
+
+
+def imprimir_cupom_termica(cliente, produto, qtd, pagamento, total, cpf=None, impressora: ImpressoraRaw = None):
+    """Cupom da venda direto na térmica (sem PDF nem visualizador). Retorna (ok, detalhe)."""
+    impressora = impressora or impressora_termica()
+    try:
+        pontos = get_pontos_cliente(cpf) if cpf else None
+        dados = montar_cupom_escpos(cliente, produto, qtd, pagamento, total, pontos)
+        impressora.enviar(dados, "Cupom")
+        logging.info("Cupom enviado para impressão térmica: %s (%d bytes)", impressora.descricao, len(dados))
+        return True, impressora.descricao
+    except Exception as ex:
+        logging.error("Falha ao imprimir cupom na térmica: %s", ex, exc_info=True)
+        return False, str(ex)
+
 # ===================== FIM IMPRESSÃO TÉRMICA USB (OS) =====================
 
 # ===================== LOG =====================
@@ -854,12 +1563,11 @@ _SSL_CTX = ssl.create_default_context(cafile=certifi.where())
 # TELEGRAM_SEND_PDF=1
 # (Opcional) TELEGRAM_DEDUPE_HOURS_LOW=6
 # (Opcional) TELEGRAM_DEDUPE_HOURS_ZERO=12
+# (Opcional) TELEGRAM_API_BASE=https://api.telegram.org
 import urllib.parse
-import threading
-import time
+import http.client
 
 _TELEGRAM_CFG_CACHE = None
-_LAST_TG_SENT = {}  # {dedupe_key: last_ts}
 
 def _load_telegram_config():
     """Lê telegram_config.txt (ou variáveis de ambiente)."""
@@ -898,12 +1606,302 @@ def _load_telegram_config():
         'send_pdf': send_pdf,
         'dedupe_low_sec': max(60, dedupe_low_h * 3600),
         'dedupe_zero_sec': max(60, dedupe_zero_h * 3600),
+        'api_base': (_get('TELEGRAM_API_BASE', '') or '').strip(),
     }
     return _TELEGRAM_CFG_CACHE
 
 
+TELEGRAM_JANELA_LOTE_SEG = 1.5      # mensagens de texto que chegam juntas viram uma só
+TELEGRAM_INTERVALO_CHAT_SEG = 1.0   # limite do Telegram: ~1 mensagem/s por chat
+TELEGRAM_MAX_TENTATIVAS = 12
+TELEGRAM_LIMITE_TEXTO = 4096
+TELEGRAM_AGUARDA_COMMIT_SEG = 0.5          # releitura da fila enquanto um chamador não fez commit
+TELEGRAM_AGUARDA_COMMIT_JANELA_SEG = 30.0
+MULTIPART_BLOCO_BYTES = 64 * 1024
+
+
+def multipart_streaming(campos: dict, campo_arquivo: str, caminho: str, content_type: str = 'application/octet-stream'):
+    """multipart/form-data lido do disco em blocos (memória constante, qualquer tamanho de arquivo).
+    Retorna (content_type, tamanho_total, gerar); gerar() devolve um iterador novo a cada chamada.
+    """
+    boundary = '----TGBOUNDARY' + secrets.token_hex(12)
+    partes = []
+    for nome, valor in campos.items():
+        partes.append(f"--{boundary}\r\n".encode())
+        partes.append(f'Content-Disposition: form-data; name="{nome}"\r\n\r\n'.encode())
+        partes.append((valor or '').encode('utf-8'))
+        partes.append(b"\r\n")
+    partes.append(f"--{boundary}\r\n".encode())
+    partes.append(
+        f'Content-Disposition: form-data; name="{campo_arquivo}"; filename="{os.path.basename(caminho)}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n".encode()
+    )
+    cabecalho = b''.join(partes)
+    rodape = f"\r\n--{boundary}--\r\n".encode()
+    tamanho_arquivo = os.path.getsize(caminho)
+
+    def gerar():
+        yield cabecalho
+        restante = tamanho_arquivo
+        with open(caminho, 'rb') as f:
+            while restante > 0:
+                bloco = f.read(min(MULTIPART_BLOCO_BYTES, restante))
+                if not bloco:
+                    raise OSError(f"Arquivo encurtou durante o envio: {caminho}")
+                restante -= len(bloco)
+                yield bloco
+        yield rodape
+
+    return f'multipart/form-data; boundary={boundary}', len(cabecalho) + tamanho_arquivo + len(rodape), gerar
+
+
+class TelegramDispatcher:
+    """Entrega única de mensagens/PDFs do Telegram.
+    - fila persistente (tabela telegram_outbox): o que não saiu é reenviado após reiniciar o app
+    - dedupe durável (tabela telegram_dedupe), verificado ao enfileirar
+    - uma thread e uma conexão HTTPS keep-alive (sem thread/handshake TLS por mensagem)
+    - textos do mesmo chat enfileirados numa janela curta são enviados juntos
+    - respeita o intervalo por chat e o retry_after das respostas 429; falhas voltam com backoff
+    """
+    def __init__(self):
+        self._acordar = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._conn = None
+        self._conn_chave = None
+        self._ultimo_envio = {}  # {chat_id: time.monotonic()}
+        self._aguardar_commit_ate = 0.0  # monotonic: linhas gravadas na transação de um chamador
+
+    # ---------- fila ----------
+    def enfileirar(self, tipo: str, chat_id: str, texto: str = '', arquivo: str = None,
+                   dedupe_key: str = None, dedupe_window_sec: int = 30) -> bool:
+        """Grava na fila (e no dedupe) e acorda a thread. Retorna False se foi barrado pelo dedupe."""
+        agora = time.time()
+        c = DB.get()
+
+        def _gravar():
+            if dedupe_key:
+                r = c.execute("SELECT enviado_em FROM telegram_dedupe WHERE chave=?", (dedupe_key,)).fetchone()
+                if r and (agora - float(r[0] or 0)) < int(dedupe_window_sec):
+                    return False
+                c.execute("INSERT OR REPLACE INTO telegram_dedupe(chave, enviado_em) VALUES (?,?)", (dedupe_key, agora))
+            c.execute(
+                """INSERT INTO telegram_outbox(tipo, chat_id, texto, arquivo, dedupe_key, criado_em, proxima_tentativa)
+                   VALUES (?,?,?,?,?,?,?)""",
+                (tipo, chat_id, texto or '', arquivo, dedupe_key, agora, agora),
+            )
+            return True
+
+        if c.in_transaction:
+            ok = _gravar()  # dentro da transação do chamador: sai junto com o commit dele
+            if ok:
+                # a linha só fica visível para a thread após esse commit: em vez de dormir
+                # o ocioso (60 s), a thread volta a olhar a fila a cada TELEGRAM_AGUARDA_COMMIT_SEG
+                self._aguardar_commit_ate = time.monotonic() + TELEGRAM_AGUARDA_COMMIT_JANELA_SEG
+        else:
+            with c:
+                ok = _gravar()
+        if ok:
+            self.iniciar()
+            self._acordar.set()
+        return ok
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="telegram-dispatcher", daemon=True)
+            self._thread.start()
+        self._acordar.set()
+
+    def _podar(self):
+        """Remove dedupe vencido e mensagens que falharam de vez há mais de 7 dias."""
+        limite = time.time() - 7 * 86400
+        try:
+            c = DB.get()
+            with c:
+                c.execute("DELETE FROM telegram_dedupe WHERE enviado_em < ?", (limite,))
+                c.execute("DELETE FROM telegram_outbox WHERE status='falhou' AND criado_em < ?", (limite,))
+        except Exception as ex:
+            logging.error("Erro ignorado: %s", ex, exc_info=True)
+
+    def _run(self):
+        self._podar()
+        espera = 0
+        while True:
+            self._acordar.wait(timeout=espera)
+            self._acordar.clear()
+            try:
+                espera = self._processar()
+            except Exception as ex:
+                logging.error("Falha no envio do Telegram: %s", ex, exc_info=True)
+                espera = 5
+
+    def _processar(self) -> float:
+        """Envia o próximo lote vencido. Retorna quantos segundos esperar até a próxima rodada."""
+        c = DB.get()
+        agora = time.time()
+        rows = c.execute(
+            """SELECT id, tipo, chat_id, texto, arquivo, criado_em, tentativas FROM telegram_outbox
+               WHERE status='pendente' AND proxima_tentativa <= ? ORDER BY id LIMIT 100""",
+            (agora,),
+        ).fetchall()
+        if not rows:
+            r = c.execute("SELECT MIN(proxima_tentativa) FROM telegram_outbox WHERE status='pendente'").fetchone()
+            espera = max(0.2, float(r[0]) - agora) if r and r[0] is not None else 60
+            if time.monotonic() < self._aguardar_commit_ate:
+                espera = min(espera, TELEGRAM_AGUARDA_COMMIT_SEG)
+            return espera
+        primeiro = rows[0]
+        tipo, chat_id = primeiro[1], primeiro[2]
+        if tipo == 'msg' and agora - float(primeiro[5]) < TELEGRAM_JANELA_LOTE_SEG:
+            return TELEGRAM_JANELA_LOTE_SEG - (agora - float(primeiro[5]))  # espera o resto da rajada
+        lote = [primeiro]
+        if tipo == 'msg':
+            tamanho = len(primeiro[3] or '')
+            for r in rows[1:]:
+                if r[2] != chat_id:
+                    continue
+                if r[1] != 'msg':
+                    break  # mantém a ordem em relação aos PDFs do mesmo chat
+                tamanho += len(r[3] or '') + 2
+                if tamanho > TELEGRAM_LIMITE_TEXTO:
+                    break
+                lote.append(r)
+
+        pausa = TELEGRAM_INTERVALO_CHAT_SEG - (time.monotonic() - self._ultimo_envio.get(chat_id, 0))
+        if pausa > 0:
+            time.sleep(pausa)
+        ids = [r[0] for r in lote]
+        try:
+            if tipo == 'msg':
+                status, resp = self._enviar_texto(chat_id, "\n\n".join(r[3] or '' for r in lote))
+            else:
+                if not primeiro[4] or not os.path.isfile(primeiro[4]):
+                    logging.warning("Telegram: arquivo não encontrado, descartado: %s", primeiro[4])
+                    self._marcar(ids, 'falhou', erro='arquivo não encontrado')
+                    return 0
+                status, resp = self._enviar_documento(chat_id, primeiro[3], primeiro[4])
+        except (OSError, http.client.HTTPException) as ex:
+            self._reagendar(lote, str(ex))
+            return 0
+        finally:
+            self._ultimo_envio[chat_id] = time.monotonic()
+
+        if status == 200 and resp.get('ok'):
+            with c:
+                c.executemany("DELETE FROM telegram_outbox WHERE id=?", [(i,) for i in ids])
+        elif status == 429:
+            espera = int((resp.get('parameters') or {}).get('retry_after') or 5)
+            logging.warning("Telegram: limite atingido; aguardando %ss", espera)
+            with c:
+                c.execute(
+                    "UPDATE telegram_outbox SET proxima_tentativa=? WHERE status='pendente' AND chat_id=?",
+                    (time.time() + espera, chat_id),
+                )
+        elif status in (400, 401, 403, 404):
+            logging.error("Telegram recusou a mensagem (%s): %s", status, resp.get('description'))
+            self._marcar(ids, 'falhou', erro=f"{status} {resp.get('description') or ''}".strip())
+        else:
+            self._reagendar(lote, f"HTTP {status} {resp.get('description') or ''}".strip())
+        return 0
+
+    def _marcar(self, ids, status: str, erro: str = None):
+        c = DB.get()
+        with c:
+            c.executemany(
+                "UPDATE telegram_outbox SET status=?, ultimo_erro=? WHERE id=?", [(status, erro, i) for i in ids]
+            )
+
+    def _reagendar(self, lote, erro: str):
+        c = DB.get()
+        with c:
+            for r in lote:
+                tentativas = int(r[6] or 0) + 1
+                if tentativas >= TELEGRAM_MAX_TENTATIVAS:
+                    logging.error("Telegram: desistindo da mensagem %s após %d tentativas: %s", r[0], tentativas, erro)
+                    c.execute(
+                        "UPDATE telegram_outbox SET status='falhou', tentativas=?, ultimo_erro=? WHERE id=?",
+                        (tentativas, erro, r[0]),
+                    )
+                else:
+                    c.execute(
+                        "UPDATE telegram_outbox SET tentativas=?, proxima_tentativa=?, ultimo_erro=? WHERE id=?",
+                        (tentativas, time.time() + min(3600, 5 * 2 ** tentativas), erro, r[0]),
+                    )
+        logging.warning("Telegram: envio adiado (%s)", erro)
+
+    # ---------- HTTP ----------
+    def _conexao(self, base: str):
+        partes = urllib.parse.urlsplit(base)
+        chave = (partes.scheme, partes.netloc)
+        if self._conn is None or self._conn_chave != chave:
+            self._fechar_conexao()
+            if partes.scheme == 'https':
+                self._conn = http.client.HTTPSConnection(partes.netloc, timeout=25, context=_SSL_CTX)
+            else:
+                self._conn = http.client.HTTPConnection(partes.netloc, timeout=25)
+            self._conn_chave = chave
+        return self._conn, partes.path.rstrip('/')
+
+    def _fechar_conexao(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+
+    def _post(self, metodo: str, corpo, content_type: str, tamanho: int = None):
+        """POST na API. `corpo` são bytes ou uma função que gera os pedaços (com `tamanho` total)."""
+        cfg = _load_telegram_config()
+        base = cfg.get('api_base') or 'https://api.telegram.org'
+        for tentativa in (1, 2):  # a 2ª cobre conexão keep-alive fechada pelo servidor
+            conn, prefixo = self._conexao(base)
+            try:
+                conn.request(
+                    'POST', f"{prefixo}/bot{cfg.get('token')}/{metodo}",
+                    body=corpo() if callable(corpo) else corpo,
+                    headers={
+                        'Content-Type': content_type,
+                        'Content-Length': str(len(corpo) if tamanho is None else tamanho),
+                    },
+                )
+                r = conn.getresponse()
+                dados = r.read()
+            except (OSError, http.client.HTTPException):
+                self._fechar_conexao()
+                if tentativa == 2:
+                    raise
+                continue
+            if r.will_close:
+                self._fechar_conexao()
+            try:
+                resp = json.loads(dados.decode('utf-8') or '{}')
+            except ValueError:
+                resp = {}
+            return r.status, resp
+
+    def _enviar_texto(self, chat_id: str, texto: str):
+        corpo = urllib.parse.urlencode({
+            'chat_id': chat_id,
+            'text': texto,
+            'parse_mode': 'HTML',
+            'disable_web_page_preview': 'true',
+        }).encode('utf-8')
+        return self._post('sendMessage', corpo, 'application/x-www-form-urlencoded')
+
+    def _enviar_documento(self, chat_id: str, legenda: str, caminho: str):
+        content_type, tamanho, corpo = multipart_streaming(
+            {'chat_id': chat_id, 'caption': legenda or ''}, 'document', caminho, 'application/pdf'
+        )
+        return self._post('sendDocument', corpo, content_type, tamanho)
+
+TELEGRAM = TelegramDispatcher()
+
+
 def telegram_notify(text: str, dedupe_key: str = None, dedupe_window_sec: int = 30):
-    """Envia mensagem Telegram em background (não trava UI)."""
+    """Enfileira mensagem Telegram (envio em segundo plano pelo TelegramDispatcher; não trava UI)."""
     try:
         cfg = _load_telegram_config()
         if not cfg.get('enabled', True):
@@ -912,35 +1910,11 @@ def telegram_notify(text: str, dedupe_key: str = None, dedupe_window_sec: int =
         chat_id = (cfg.get('chat_id') or '').strip()
         if not token or not chat_id:
             return
-
-        if dedupe_key:
-            now = time.time()
-            last = _LAST_TG_SENT.get(dedupe_key, 0)
-            if (now - last) < int(dedupe_window_sec):
-                return
-            _LAST_TG_SENT[dedupe_key] = now
-
-        def _send():
-            try:
-                url = f"https://api.telegram.org/bot{token}/sendMessage"
-                payload = {
-                    'chat_id': chat_id,
-                    'text': text,
-                    'parse_mode': 'HTML',
-                    'disable_web_page_preview': 'true',
-                }
-                data = urllib.parse.urlencode(payload).encode('utf-8')
-                req = urllib.request.Request(url, data=data, method='POST')
-                with urllib.request.urlopen(req, context=_SSL_CTX, timeout=10) as r:
-                    _ = r.read()
-            except Exception as ex:
-                logging.error('Erro ao enviar Telegram: %s', ex)
-
-        threading.Thread(target=_send, daemon=True).start()
+        TELEGRAM.enfileirar('msg', chat_id, text, dedupe_key=dedupe_key, dedupe_window_sec=dedupe_window_sec)
     except Exception as ex:
         logging.error("Erro ignorado: %s", ex, exc_info=True)
 def telegram_send_pdf(caption: str, file_path: str, dedupe_key: str = None, dedupe_window_sec: int = 30):
-    """Envia PDF para o Telegram (opcional)."""
+    """Enfileira PDF para o Telegram (opcional)."""
     try:
         cfg = _load_telegram_config()
         if not cfg.get('enabled', True) or not cfg.get('send_pdf', True):
@@ -951,52 +1925,10 @@ def telegram_send_pdf(caption: str, file_path: str, dedupe_key: str = None, dedu
             return
         if not file_path or not os.path.isfile(file_path):
             return
-
-        if dedupe_key:
-            now = time.time()
-            last = _LAST_TG_SENT.get(dedupe_key, 0)
-            if (now - last) < int(dedupe_window_sec):
-                return
-            _LAST_TG_SENT[dedupe_key] = now
-
-        def _send_doc():
-            try:
-                boundary = '----TGBOUNDARY1234567890'
-                url = f"https://api.telegram.org/bot{token}/sendDocument"
-                with open(file_path, 'rb') as f:
-                    file_bytes = f.read()
-
-                parts = []
-                def add_field(name, value):
-                    parts.append(f"--{boundary}\r\n".encode())
-                    parts.append(f'Content-Disposition: form-data; name="{name}"\r\n\r\n'.encode())
-                    parts.append((value or '').encode('utf-8'))
-                    parts.append(b"\r\n")
-
-                def add_file(name, filename, content_type, content):
-                    parts.append(f"--{boundary}\r\n".encode())
-                    parts.append(
-                        f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
-                        f"Content-Type: {content_type}\r\n\r\n".encode()
-                    )
-                    parts.append(content)
-                    parts.append(b"\r\n")
-
-                add_field('chat_id', chat_id)
-                add_field('caption', caption or '')
-                add_file('document', os.path.basename(file_path), 'application/pdf', file_bytes)
-                parts.append(f"--{boundary}--\r\n".encode())
-                body = b''.join(parts)
-
-                req = urllib.request.Request(url, data=body, method='POST')
-                req.add_header('Content-Type', f'multipart/form-data; boundary={boundary}')
-                req.add_header('Content-Length', str(len(body)))
-                with urllib.request.urlopen(req, context=_SSL_CTX, timeout=25) as r:
-                    _ = r.read()
-            except Exception as ex:
-                logging.error('Erro ao enviar PDF no Telegram: %s', ex)
-
-        threading.Thread(target=_send_doc, daemon=True).start()
+        TELEGRAM.enfileirar(
+            'pdf', chat_id, caption, arquivo=os.path.abspath(file_path),
+            dedupe_key=dedupe_key, dedupe_window_sec=dedupe_window_sec,
+        )
     except Exception as ex:
         logging.error("Erro ignorado: %s", ex, exc_info=True)
 # =================== FIM TELEGRAM NOTIFY ===================
@@ -1005,8 +1937,7 @@ def telegram_send_pdf(caption: str, file_path: str, dedupe_key: str = None, dedu
 def _meta_get(key: str, default: str = "") -> str:
     """Lê uma chave da tabela app_meta."""
     try:
-        cursor.execute("SELECT value FROM app_meta WHERE key=?", (key,))
-        r = cursor.fetchone()
+        r = DB.get().execute("SELECT value FROM app_meta WHERE key=?", (key,)).fetchone()
         if r and r[0] is not None:
             return str(r[0])
     except Exception as ex:
@@ -1017,8 +1948,9 @@ def _meta_get(key: str, default: str = "") -> str:
 def _meta_set(key: str, value: str):
     """Grava uma chave na tabela app_meta."""
     try:
-        with conn:
-            cursor.execute(
+        c = DB.get()
+        with c:
+            c.execute(
                 "INSERT OR REPLACE INTO app_meta(key,value) VALUES(?,?)",
                 (key, str(value)),
             )
@@ -1174,17 +2106,80 @@ def start_devedores_notify_on_open(root_widget):
 
 # ===================== BANCO =====================
 # ===================== DB WRAPPER (reduz globais) =====================
+def _db_connect(path: str = None) -> sqlite3.Connection:
+    """Abre uma conexão SQLite já com os PRAGMAs de desempenho aplicados."""
+    c = sqlite3.connect(path or DB_PATH, timeout=30)
+    for pragma in DB.PRAGMAS:
+        try:
+            c.execute(f"PRAGMA {pragma}")
+        except Exception as ex:
+            logging.error("Erro ignorado: %s", ex, exc_info=True)
+    return c
+
+
 class DB:
-    """Wrapper simples para SQLite.
-    Mantém `conn` e `cursor` disponíveis por compatibilidade, mas centraliza criação e transações.
+    """Gerenciador de conexões SQLite.
+    - WAL + synchronous=NORMAL: leitores não bloqueiam o escritor e o commit não faz fsync a cada transação
+    - cache de páginas, temp_store em memória e mmap ajustados
+    - uma conexão por thread (threading.local): relatórios, backups e notificações podem ler fora da thread do Tk
+    Mantém `conn` e `cursor` (conexão da thread principal) disponíveis por compatibilidade.
     """
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    PRAGMAS = (
+        "journal_mode=WAL",
+        "synchronous=NORMAL",
+        "cache_size=-16000",      # ~16 MB
+        "temp_store=MEMORY",
+        "mmap_size=134217728",    # 128 MB
+        "recursive_triggers=ON",  # INSERT OR REPLACE dispara os triggers de DELETE (índices de busca)
+    )
+    _local = threading.local()
+    conn = None
+    cursor = None
+
+    @staticmethod
+    def get() -> sqlite3.Connection:
+        """Conexão da thread atual (na thread principal é a própria `DB.conn`)."""
+        if threading.current_thread() is threading.main_thread():
+            return DB.conn
+        c = getattr(DB._local, "conn", None)
+        if c is None:
+            c = _db_connect()
+            DB._local.conn = c
+        return c
+
+    @staticmethod
+    def cur() -> sqlite3.Cursor:
+        """Cursor novo na conexão da thread atual."""
+        return DB.get().cursor()
 
     @staticmethod
     def tx():
-        """Context manager de transação."""
-        return DB.conn
+        """Context manager de transação (conexão da thread atual)."""
+        return DB.get()
+
+    @staticmethod
+    def close_thread():
+        """Fecha a conexão da thread atual (threads de trabalho, ao terminar)."""
+        c = getattr(DB._local, "conn", None)
+        if c is not None:
+            DB._local.conn = None
+            try:
+                c.close()
+            except Exception as ex:
+                logging.error("Erro ignorado: %s", ex, exc_info=True)
+
+    @staticmethod
+    def checkpoint():
+        """Aplica o WAL no arquivo principal (antes de copiar o .db)."""
+        try:
+            DB.get().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        except Exception as ex:
+            logging.error("Erro ignorado: %s", ex, exc_info=True)
+
+PERFIL.marcar("helpers, config, e-mail e Telegram")
+
+DB.conn = _db_connect(DB_PATH)
+DB.cursor = DB.conn.cursor()
 
 # Aliases antigos (compatibilidade)
 conn = DB.conn
@@ -1192,6 +2187,125 @@ cursor = DB.cursor
 
 # ===================== FIM DB WRAPPER =====================
 
+
+# ===================== TAREFAS EM SEGUNDO PLANO =====================
+import queue
+
+class JobExecutor:
+    """Executor limitado (fila + N threads) para efeitos colaterais lentos: PDF, e-mail, Telegram.
+    - submit() não bloqueia a UI; se a fila estiver cheia, executa na thread chamadora
+      (tarefas com `retries` nunca rodam inline: são reenfileiradas logo depois)
+    - falhas são repetidas com backoff exponencial (`retries`), reagendadas por timer —
+      nenhuma thread de trabalho fica parada esperando a próxima tentativa
+    - on_done/on_error rodam na thread do Tk (entregues via `after`), nunca na thread de trabalho
+    """
+    def __init__(self, workers: int = 2, maxsize: int = 100, poll_ms: int = 100):
+        self._q = queue.Queue(maxsize=int(maxsize))
+        self._results = queue.Queue()
+        self._workers = int(workers)
+        self._poll_ms = int(poll_ms)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._tk = None
+
+    def attach(self, widget):
+        """Liga a entrega de resultados ao mainloop (chamar ao abrir a janela principal)."""
+        self._tk = widget
+        self._poll(widget)
+
+    def _poll(self, widget):
+        try:
+            while True:
+                cb, args = self._results.get_nowait()
+                try:
+                    cb(*args)
+                except Exception as ex:
+                    logging.error("Erro ignorado: %s", ex, exc_info=True)
+        except queue.Empty:
+            pass
+        try:
+            if widget is self._tk and widget.winfo_exists():
+                widget.after(self._poll_ms, lambda: self._poll(widget))
+        except Exception:
+            pass
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self._workers):
+                t = threading.Thread(target=self._run, name=f"job-worker-{i + 1}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, fn, *args, on_done=None, on_error=None, retries: int = 0, backoff_sec: float = 1.0, **kwargs):
+        """Enfileira fn(*args, **kwargs). on_done(resultado) / on_error(exceção) rodam no Tk."""
+        job = (fn, args, kwargs, on_done, on_error, int(retries), float(backoff_sec), 0)
+        self._ensure_started()
+        try:
+            self._q.put_nowait(job)
+        except queue.Full:
+            if job[5] > 0:
+                logging.warning("Fila de tarefas cheia; %s reenfileirada em %.1fs", getattr(fn, "__name__", fn), self.REENFILEIRAR_SEG)
+                self._agendar(job, self.REENFILEIRAR_SEG)
+                return
+            logging.warning("Fila de tarefas cheia; executando %s na thread atual", getattr(fn, "__name__", fn))
+            self._execute(job)
+
+    def _agendar(self, job, espera: float):
+        """Devolve `job` à fila após `espera` segundos (timer daemon, sem ocupar worker)."""
+        t = threading.Timer(max(0.0, float(espera)), self._reenfileirar, args=(job,))
+        t.daemon = True
+        t.start()
+
+    def _reenfileirar(self, job):
+        try:
+            self._q.put_nowait(job)
+        except queue.Full:
+            self._agendar(job, self.REENFILEIRAR_SEG)
+
+    def _run(self):
+        while True:
+            job = self._q.get()
+            try:
+                self._execute(job)
+            except Exception as ex:
+                logging.error("Erro ignorado: %s", ex, exc_info=True)
+            finally:
+                self._q.task_done()
+
+    def _execute(self, job):
+        fn, args, kwargs, on_done, on_error, retries, backoff, tentativa = job
+        nome = getattr(fn, "__name__", "tarefa")
+        try:
+            res = fn(*args, **kwargs)
+        except Exception as ex:
+            if tentativa < retries:
+                espera = backoff * (2 ** tentativa)
+                tentativa += 1
+                logging.warning("Tarefa %s falhou (%s); tentativa %d/%d em %.1fs", nome, ex, tentativa, retries, espera)
+                self._agendar(job[:7] + (tentativa,), espera)
+                return
+            logging.error("Tarefa %s falhou: %s", nome, ex, exc_info=True)
+            if on_error is not None:
+                self._deliver(on_error, ex)
+            return
+        if on_done is not None:
+            self._deliver(on_done, res)
+
+    def post(self, cb, *args):
+        """Entrega cb(*args) na thread do Tk (ex.: progresso de uma tarefa em andamento)."""
+        self._deliver(cb, *args)
+
+    def _deliver(self, cb, *args):
+        if threading.current_thread() is threading.main_thread():
+            cb(*args)  # execução inline (fila cheia): já estamos no Tk
+        else:
+            self._results.put((cb, args))
+
+JOBS = JobExecutor(workers=2, maxsize=100)
+# ===================== FIM TAREFAS EM SEGUNDO PLANO =====================
+
 # >>> NOVO: garante tabela CLIENTES (evita erro: no such table: clientes)
 def ensure_clientes_table_and_columns():
     try:
@@ -1263,7 +2377,8 @@ CREATE TABLE IF NOT EXISTS caixa (
     valor REAL,
     data TEXT,
     hora TEXT,
-    motivo TEXT
+    motivo TEXT,
+    data_iso TEXT
 )
 """
 )
@@ -1317,7 +2432,8 @@ CREATE TABLE IF NOT EXISTS manutencao (
     descricao TEXT,
     data TEXT,
     valor REAL DEFAULT 0,
-    aprovado INTEGER DEFAULT 0
+    aprovado INTEGER DEFAULT 0,
+    data_iso TEXT
 )
 """
 )
@@ -1352,10 +2468,13 @@ CREATE TABLE IF NOT EXISTS resgates_pontos (
     item TEXT,
     pontos_usados INTEGER,
     data TEXT,
-    hora TEXT
+    hora TEXT,
+    data_iso TEXT
 )
 """
 )
+# Último resgate por cliente (aba Pontuação)
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_resgates_pontos_cpf_id ON resgates_pontos(cpf, id)")
 conn.commit()
 cursor.execute(
     """
@@ -1377,7 +2496,8 @@ CREATE TABLE IF NOT EXISTS vendas (
     total REAL,
     pagamento TEXT,
     data TEXT,
-    hora TEXT
+    hora TEXT,
+    data_iso TEXT
 )
 """
 )
@@ -1528,29 +2648,443 @@ def ensure_caixa_columns():
             conn.commit()
     except Exception as ex:
         logging.error("Erro ignorado: %s", ex, exc_info=True)
-ensure_caixa_columns()
+ensure_caixa_columns()
+
+
+def ensure_password_policy_tables():
+    # Tabela de histórico de senhas (uma entrada por troca)
+    cursor.execute(
+        """
+    CREATE TABLE IF NOT EXISTS user_password_history (
+        username TEXT,
+        password_hash TEXT,
+        changed_at TEXT,
+        PRIMARY KEY (username, changed_at)
+    )
+    """
+    )
+    # Adiciona coluna 'password_last_changed' na tabela users, se ainda não existir
+    cursor.execute("PRAGMA table_info(users)")
+    cols = [c[1] for c in cursor.fetchall()]
+    if "password_last_changed" not in cols:
+        cursor.execute("ALTER TABLE users ADD COLUMN password_last_changed TEXT")
+        conn.commit()
+
+ensure_password_policy_tables()
+
+
+# ===================== DATAS ISO (colunas-sombra + índices) =====================
+# As tabelas guardam 'data' em dd/mm/aaaa (texto), o que impede uso de índice em filtros
+# por dia/mês. A coluna 'data_iso' (aaaa-mm-dd) é preenchida em todo INSERT e permite
+# predicados de intervalo (data_iso >= ? AND data_iso < ?).
+_DATA_ISO_TABELAS = ("vendas", "caixa", "manutencao", "resgates_pontos")
+
+def ensure_data_iso_columns():
+    try:
+        for tabela in _DATA_ISO_TABELAS:
+            cursor.execute(f"PRAGMA table_info({tabela})")
+            cols = {c[1] for c in cursor.fetchall()}
+            if "data_iso" not in cols:
+                cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN data_iso TEXT")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_vendas_data_iso_pagamento ON vendas(data_iso, pagamento)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_vendas_data_iso_produto ON vendas(data_iso, produto)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_caixa_data_iso ON caixa(data_iso)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_manutencao_data_iso ON manutencao(data_iso, aprovado)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_resgates_pontos_data_iso ON resgates_pontos(data_iso)")
+        conn.commit()
+    except Exception as ex:
+        logging.error("Erro ignorado: %s", ex, exc_info=True)
+ensure_data_iso_columns()
+
+def run_data_iso_migration_once():
+    """Preenche data_iso a partir de 'data' (dd/mm/aaaa) nos registros antigos (uma vez)."""
+    try:
+        cursor.execute("SELECT value FROM app_meta WHERE key=?", ('data_iso_migracao_v1',))
+        r = cursor.fetchone()
+        if r and str(r[0] or '').strip() == '1':
+            return
+        with conn:
+            for tabela in _DATA_ISO_TABELAS:
+                cursor.execute(f"SELECT rowid, data FROM {tabela} WHERE data_iso IS NULL")
+                updates = []
+                for rowid, data_raw in (cursor.fetchall() or []):
+                    iso = _br_to_iso(data_raw)
+                    if iso:
+                        updates.append((iso, rowid))
+                if updates:
+                    cursor.executemany(f"UPDATE {tabela} SET data_iso=? WHERE rowid=?", updates)
+            cursor.execute("INSERT OR REPLACE INTO app_meta(key,value) VALUES(?,?)", ('data_iso_migracao_v1', '1'))
+    except Exception as ex:
+        logging.error("Erro ignorado: %s", ex, exc_info=True)
+run_data_iso_migration_once()
+# ===================== FIM DATAS ISO =====================
+
+
+# ===================== VENDAS DIÁRIO (resumo pré-agregado) =====================
+# Uma linha por (dia, pagamento, produto) com nº de vendas, quantidade e total.
+# Atualizada na MESMA transação de toda escrita em 'vendas' (finalizar_venda,
+# finalizar_upgrade, excluir_venda); dashboard e relatórios leem daqui.
+cursor.execute(
+    """
+CREATE TABLE IF NOT EXISTS vendas_diario (
+    dia TEXT NOT NULL,          -- ISO: YYYY-MM-DD
+    pagamento TEXT NOT NULL DEFAULT '',
+    produto TEXT NOT NULL DEFAULT '',
+    vendas INTEGER NOT NULL DEFAULT 0,
+    quantidade INTEGER NOT NULL DEFAULT 0,
+    total REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (dia, pagamento, produto)
+)
+"""
+)
+conn.commit()
+
+def vendas_diario_aplicar(dia_iso: str, pagamento: str, produto: str, quantidade, total, sinal: int = 1):
+    """Soma (sinal=1) ou subtrai (sinal=-1) uma venda do resumo diário.
+    Não faz commit: deve ser chamada dentro do `with conn:` da escrita em 'vendas'.
+    """
+    if not dia_iso:
+        return
+    pagamento = str(pagamento or "").strip()
+    produto = str(produto or "").strip()
+    s = 1 if int(sinal) >= 0 else -1
+    cursor.execute(
+        """INSERT INTO vendas_diario(dia,pagamento,produto,vendas,quantidade,total) VALUES (?,?,?,?,?,?)
+           ON CONFLICT(dia,pagamento,produto) DO UPDATE SET
+               vendas=vendas+excluded.vendas,
+               quantidade=quantidade+excluded.quantidade,
+               total=total+excluded.total""",
+        (dia_iso, pagamento, produto, s, s * int(quantidade or 0), s * float(total or 0.0)),
+    )
+    if s < 0:
+        cursor.execute(
+            "DELETE FROM vendas_diario WHERE dia=? AND pagamento=? AND produto=? AND vendas<=0",
+            (dia_iso, pagamento, produto),
+        )
+
+def rebuild_vendas_diario():
+    """Reconstrói 'vendas_diario' a partir do histórico de 'vendas'. Retorna nº de linhas."""
+    with conn:
+        cursor.execute("DELETE FROM vendas_diario")
+        cursor.execute(
+            """
+            INSERT INTO vendas_diario(dia,pagamento,produto,vendas,quantidade,total)
+            SELECT data_iso, TRIM(COALESCE(pagamento,'')), TRIM(COALESCE(produto,'')),
+                   COUNT(1), COALESCE(SUM(quantidade),0), COALESCE(SUM(total),0)
+            FROM vendas
+            WHERE data_iso IS NOT NULL
+            GROUP BY data_iso, TRIM(COALESCE(pagamento,'')), TRIM(COALESCE(produto,''))
+            """
+        )
+        cursor.execute("SELECT COUNT(1) FROM vendas_diario")
+        n = int((cursor.fetchone() or [0])[0] or 0)
+    return n
+
+def run_vendas_diario_migration_once():
+    """Popula o resumo diário a partir do histórico (uma vez)."""
+    try:
+        cursor.execute("SELECT value FROM app_meta WHERE key=?", ('vendas_diario_v1',))
+        r = cursor.fetchone()
+        if r and str(r[0] or '').strip() == '1':
+            return
+        rebuild_vendas_diario()
+        cursor.execute("INSERT OR REPLACE INTO app_meta(key,value) VALUES(?,?)", ('vendas_diario_v1', '1'))
+        conn.commit()
+    except Exception as ex:
+        logging.error("Erro ignorado: %s", ex, exc_info=True)
+run_vendas_diario_migration_once()
+# ===================== FIM VENDAS DIÁRIO =====================
+# ===================== CUPONS: ÍNDICE DO ARQUIVO DIÁRIO =====================
+# venda -> (dia, página) em cupons/cupons_AAAAMMDD.pdf, com o texto do cupom para
+# regravar o PDF do dia ou extrair um cupom isolado (ver CUPONS: ARQUIVO DIÁRIO).
+cursor.execute(
+    """
+CREATE TABLE IF NOT EXISTS cupons_arquivo (
+    id INTEGER PRIMARY KEY,
+    venda_id INTEGER,
+    dia TEXT NOT NULL,          -- ISO: YYYY-MM-DD
+    pagina INTEGER NOT NULL,    -- 1..N dentro do PDF do dia
+    linhas TEXT NOT NULL,       -- JSON: linhas do cupom
+    criado_em TEXT,
+    UNIQUE (dia, pagina)
+)
+"""
+)
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_cupons_arquivo_venda ON cupons_arquivo(venda_id)")
+conn.commit()
+# ===================== FIM CUPONS: ÍNDICE DO ARQUIVO DIÁRIO =====================
+
+# ===================== BUSCA (FTS5 trigram + fallback LIKE) =====================
+# Índices de texto para os filtros de Clientes, Pontuação e Manutenção.
+# Tabelas FTS5 de conteúdo externo (tokenizer trigram) mantidas por triggers;
+# se o SQLite não tiver FTS5/trigram, as consultas caem para LIKE.
+_BUSCA_COLUNAS = {
+    'clientes': ('cpf', 'nome', 'telefone'),
+    'manutencao': ('cpf', 'nome', 'telefone', 'descricao'),
+}
+_BUSCA_ROWID = {'clientes': 'rowid', 'manutencao': 'os'}
+_BUSCA_FTS = {'clientes': False, 'manutencao': False}
+
+def ensure_busca_fts():
+    """Cria as tabelas <tabela>_fts e os triggers de sincronização (idempotente).
+    Tabela criada agora já nasce indexada (registros existentes), na mesma transação dos triggers.
+    """
+    for tabela, cols in _BUSCA_COLUNAS.items():
+        fts = f"{tabela}_fts"
+        rid = _BUSCA_ROWID[tabela]
+        lista = ", ".join(cols)
+        novos = ", ".join(f"new.{c}" for c in cols)
+        velhos = ", ".join(f"old.{c}" for c in cols)
+        try:
+            with conn:
+                nova = cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (fts,)
+                ).fetchone() is None
+                cursor.execute(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                    f"{lista}, content='{tabela}', content_rowid='{rid}', tokenize='trigram')"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabela} BEGIN "
+                    f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.{rid}, {novos}); END"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabela} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.{rid}, {velhos}); END"
+                )
+                cursor.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {tabela} BEGIN "
+                    f"INSERT INTO {fts}({fts}, rowid, {lista}) VALUES ('delete', old.{rid}, {velhos}); "
+                    f"INSERT INTO {fts}(rowid, {lista}) VALUES (new.{rid}, {novos}); END"
+                )
+                if nova:
+                    cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+            _BUSCA_FTS[tabela] = True
+        except sqlite3.OperationalError as ex:
+            # SQLite sem FTS5/trigram: segue com LIKE
+            logging.warning("Busca FTS5 indisponível para %s (%s); usando LIKE", tabela, ex)
+            _BUSCA_FTS[tabela] = False
+        except Exception as ex:
+            logging.error("Erro ignorado: %s", ex, exc_info=True)
+            _BUSCA_FTS[tabela] = False
+
+def rebuild_busca_fts():
+    """Reconstrói os índices de busca a partir das tabelas de origem."""
+    for tabela, ok in _BUSCA_FTS.items():
+        if ok:
+            with conn:
+                cursor.execute(f"INSERT INTO {tabela}_fts({tabela}_fts) VALUES ('rebuild')")
+
+ensure_busca_fts()
+
+def run_busca_fts_migration_once():
+    """Indexa os registros já existentes (uma vez, e só quando todas as tabelas têm FTS5)."""
+    try:
+        if _meta_get('busca_fts_v1') == '1':
+            return
+        rebuild_busca_fts()
+        if all(ok is True for ok in _BUSCA_FTS.values()):
+            _meta_set('busca_fts_v1', '1')
+    except Exception as ex:
+        logging.error("Erro ignorado: %s", ex, exc_info=True)
+run_busca_fts_migration_once()
 
+def busca_filtro_sql(tabela: str, q: str, colunas=None, alias: str = ''):
+    """Retorna (condição SQL, params) para filtrar `tabela` pelo texto q.
 
-def ensure_password_policy_tables():
-    # Tabela de histórico de senhas (uma entrada por troca)
-    cursor.execute(
-        """
-    CREATE TABLE IF NOT EXISTS user_password_history (
-        username TEXT,
-        password_hash TEXT,
-        changed_at TEXT,
-        PRIMARY KEY (username, changed_at)
-    )
+    Usa o índice FTS5 trigram (q com 3+ caracteres) ou LIKE '%q%' nas mesmas colunas.
+    """
+    q = (q or '').strip()
+    if not q:
+        return '', []
+    cols = tuple(colunas or _BUSCA_COLUNAS[tabela])
+    if _BUSCA_FTS.get(tabela) and len(q) >= 3:
+        expr = '"' + q.replace('"', '""') + '"'
+        if colunas and cols != _BUSCA_COLUNAS[tabela]:
+            expr = "{" + " ".join(cols) + "} : " + expr
+        rid = _BUSCA_ROWID[tabela]
+        return (f"{alias}{rid} IN (SELECT rowid FROM {tabela}_fts WHERE {tabela}_fts MATCH ?)", [expr])
+    like = f"%{q}%"
+    return ("(" + " OR ".join(f"{alias}{c} LIKE ?" for c in cols) + ")", [like] * len(cols))
+
+def consultar_clientes(q: str = '', ultima=None, limite: int = 200, cur=None):
+    """Página de clientes (cpf, nome, telefone) ordenada por nome; keyset pela última linha."""
+    cur = cur or DB.cur()
+    where, params = [], []
+    cond, p = busca_filtro_sql('clientes', q)
+    if cond:
+        where.append(cond)
+        params += p
+    if ultima is not None:
+        where.append("(COALESCE(nome,''), cpf) > (?, ?)")
+        params += [ultima[1], ultima[0]]
+    sql = "SELECT cpf, COALESCE(nome,''), telefone FROM clientes"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY COALESCE(nome,''), cpf LIMIT ?"
+    return cur.execute(sql, (*params, int(limite))).fetchall()
+
+def consultar_pontuacao(q: str = '', ultima=None, limite: int = 200, cur=None):
+    """Página da pontuação (cpf, nome, pontos, último resgate) por pontos DESC, nome.
+
+    Uma única consulta: o último resgate de cada cliente vem de uma subconsulta
+    correlacionada resolvida por idx_resgates_pontos_cpf_id. Busca por CPF ou nome.
+    """
+    cur = cur or DB.cur()
+    where, params = [], []
+    cond, p = busca_filtro_sql('clientes', q, colunas=('cpf', 'nome'), alias='c.')
+    if cond:
+        where.append(cond)
+        params += p
+    if ultima is not None:
+        where.append(
+            "(COALESCE(p.pontos,0) < ? OR (COALESCE(p.pontos,0) = ? AND (COALESCE(c.nome,''), c.cpf) > (?, ?)))"
+        )
+        params += [ultima[2], ultima[2], ultima[1], ultima[0]]
+    sql = """
+        SELECT c.cpf, COALESCE(c.nome,''), COALESCE(p.pontos,0),
+               COALESCE((SELECT r.item || ' (' || r.data || ' ' || r.hora || ')'
+                         FROM resgates_pontos r
+                         WHERE r.cpf = c.cpf
+                         ORDER BY r.id DESC LIMIT 1), '')
+        FROM clientes c
+        LEFT JOIN pontuacao p ON p.cpf=c.cpf
+    """
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY COALESCE(p.pontos,0) DESC, COALESCE(c.nome,'') ASC, c.cpf ASC LIMIT ?"
+    return cur.execute(sql, (*params, int(limite))).fetchall()
+
+def consultar_manutencao(q: str = '', ultima=None, limite: int = 200, cur=None):
+    """Página de OS (os, nome, cpf, telefone, descricao, data, valor, aprovado) por os DESC."""
+    cur = cur or DB.cur()
+    where, params = [], []
+    cond, p = busca_filtro_sql('manutencao', q)
+    if cond:
+        where.append(cond)
+        params += p
+    if ultima is not None:
+        where.append("os < ?")
+        params.append(ultima[0])
+    sql = "SELECT os, nome, cpf, telefone, descricao, data, COALESCE(valor,0), COALESCE(aprovado,0) FROM manutencao"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY os DESC"
+    if limite is not None:
+        sql += " LIMIT ?"
+        params.append(int(limite))
+    return cur.execute(sql, params).fetchall()
+
+class BuscaIncremental:
+    """Busca com debounce para campos de filtro.
+
+    agendar(texto) espera `delay_ms` sem digitação, roda consultar(texto) em segundo
+    plano (JOBS) e entrega aplicar(texto, linhas) no Tk. Cada digitação nova invalida
+    a anterior: o resultado velho é descartado e a consulta em curso é interrompida
+    pelo progress handler do SQLite.
     """
-    )
-    # Adiciona coluna 'password_last_changed' na tabela users, se ainda não existir
-    cursor.execute("PRAGMA table_info(users)")
-    cols = [c[1] for c in cursor.fetchall()]
-    if "password_last_changed" not in cols:
-        cursor.execute("ALTER TABLE users ADD COLUMN password_last_changed TEXT")
-        conn.commit()
 
-ensure_password_policy_tables()
+    def __init__(self, widget, consultar, aplicar, delay_ms: int = 250):
+        self.widget = widget
+        self.consultar = consultar
+        self.aplicar = aplicar
+        self.delay_ms = int(delay_ms)
+        self._after_id = None
+        self._geracao = 0
+
+    def _cancelar_agendada(self):
+        if self._after_id is not None:
+            try:
+                self.widget.after_cancel(self._after_id)
+            except Exception as ex:
+                logging.error("Erro ignorado: %s", ex, exc_info=True)
+            self._after_id = None
+
+    def agendar(self, texto: str):
+        self._cancelar_agendada()
+        self._geracao += 1
+        g = self._geracao
+        self._after_id = self.widget.after(self.delay_ms, lambda: self._disparar(g, texto))
+
+    def agora(self, texto: str):
+        """Executa imediatamente na thread do Tk (Enter, botão Atualizar, recarga após salvar)."""
+        self._cancelar_agendada()
+        self._geracao += 1
+        self.aplicar(texto, self.consultar(texto))
+
+    def _disparar(self, g, texto):
+        self._after_id = None
+        if g != self._geracao:
+            return
+        JOBS.submit(
+            self._executar, g, texto,
+            on_done=lambda linhas: self._entregar(g, texto, linhas),
+            on_error=lambda ex: None,
+        )
+
+    def _executar(self, g, texto):
+        c = DB.get()
+        # Interrompe a consulta (sqlite3.OperationalError: interrupted) se outra digitação chegar
+        c.set_progress_handler(lambda: 1 if g != self._geracao else 0, 1000)
+        try:
+            if g != self._geracao:
+                return None
+            return self.consultar(texto)
+        except sqlite3.OperationalError:
+            if g != self._geracao:
+                return None  # interrompida por uma busca mais nova
+            raise
+        finally:
+            c.set_progress_handler(None, 0)
+
+    def _entregar(self, g, texto, linhas):
+        if g != self._geracao or linhas is None:
+            return
+        try:
+            self.aplicar(texto, linhas)
+        except tk.TclError:
+            return
+        except Exception as ex:
+            logging.error("Erro ao aplicar resultado da busca: %s", ex, exc_info=True)
+# ===================== FIM BUSCA =====================
+
+# Fila persistente e dedupe do Telegram (ver TelegramDispatcher)
+cursor.execute(
+    """
+CREATE TABLE IF NOT EXISTS telegram_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tipo TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    texto TEXT,
+    arquivo TEXT,
+    dedupe_key TEXT,
+    criado_em REAL,
+    proxima_tentativa REAL,
+    tentativas INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'pendente',
+    ultimo_erro TEXT
+)
+"""
+)
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_telegram_outbox_pendente ON telegram_outbox(status, proxima_tentativa)")
+cursor.execute("CREATE TABLE IF NOT EXISTS telegram_dedupe (chave TEXT PRIMARY KEY, enviado_em REAL)")
+conn.commit()
+
+# Manifesto do backup incremental de PDFs (ver backup_bulk_dir)
+cursor.execute(
+    """
+CREATE TABLE IF NOT EXISTS backup_manifest (
+    tipo TEXT NOT NULL,
+    nome TEXT NOT NULL,
+    tamanho INTEGER,
+    mtime_ns INTEGER,
+    sha256 TEXT,
+    copiado_em TEXT,
+    PRIMARY KEY (tipo, nome)
+)
+"""
+)
+conn.commit()
 
 
 # ===================== PONTUAÇÃO (1 R$ = 1 ponto) =====================
@@ -1574,13 +3108,54 @@ def get_pontos_cliente(cpf: str) -> int:
         cpf = (cpf or '').strip()
         if not cpf:
             return 0
-        cursor.execute("SELECT COALESCE(pontos,0) FROM pontuacao WHERE cpf=?", (cpf,))
-        r = cursor.fetchone()
+        r = DB.get().execute("SELECT COALESCE(pontos,0) FROM pontuacao WHERE cpf=?", (cpf,)).fetchone()
         return int(r[0]) if r else 0
     except Exception:
         return 0
 
+# Razão de pontos: cada crédito/débito vira uma linha em pontos_movimentos e o
+# saldo em `pontuacao` é atualizado no mesmo statement (ON CONFLICT). O saldo
+# pode ser auditado/reconstruído a partir do razão sem reprocessar `vendas`.
+cursor.execute(
+    """
+CREATE TABLE IF NOT EXISTS pontos_movimentos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    cpf TEXT NOT NULL,
+    pontos INTEGER NOT NULL,
+    origem TEXT,
+    ref_id INTEGER,
+    data_iso TEXT,
+    criado_em TEXT
+)
+"""
+)
+cursor.execute("CREATE INDEX IF NOT EXISTS idx_pontos_movimentos_cpf ON pontos_movimentos(cpf)")
+conn.commit()
+
+def pontos_lancar(cpf: str, pontos: int, origem: str, ref_id=None) -> int:
+    """Lança `pontos` (positivo = crédito, negativo = débito) no razão e no saldo.
+    Não faz commit: deve ser chamada dentro do `with conn:` da operação de origem.
+    """
+    cpf = (cpf or '').strip()
+    pts = int(pontos or 0)
+    if not cpf or pts == 0:
+        return 0
+    agora = now_br()
+    cursor.execute(
+        "INSERT INTO pontos_movimentos(cpf,pontos,origem,ref_id,data_iso,criado_em) VALUES(?,?,?,?,?,?)",
+        (cpf, pts, origem, ref_id, today_iso(), agora),
+    )
+    cursor.execute(
+        """INSERT INTO pontuacao(cpf,pontos,atualizado_em) VALUES(?,?,?)
+           ON CONFLICT(cpf) DO UPDATE SET
+               pontos=COALESCE(pontuacao.pontos,0)+excluded.pontos,
+               atualizado_em=excluded.atualizado_em""",
+        (cpf, pts, agora),
+    )
+    return pts
+
 def set_pontos_cliente(cpf: str, pontos: int):
+    """Define o saldo absoluto (ajuste manual/migração); a diferença vai para o razão."""
     cpf = (cpf or '').strip()
     if not cpf:
         return
@@ -1589,23 +3164,20 @@ def set_pontos_cliente(cpf: str, pontos: int):
     except Exception:
         pts = 0
     pts = max(0, pts)
-    agora = now_br()
     with conn:
-        cursor.execute(
-            "INSERT OR REPLACE INTO pontuacao(cpf,pontos,atualizado_em) VALUES(?,?,?)",
-            (cpf, pts, agora),
-        )
+        pontos_lancar(cpf, pts - get_pontos_cliente(cpf), 'ajuste')
 
-def adicionar_pontos_cliente(cpf: str, valor_em_reais: float) -> int:
-    """Adiciona pontos ao cliente com base no valor final pago."""
+def adicionar_pontos_cliente(cpf: str, valor_em_reais: float, origem: str = 'venda', ref_id=None) -> int:
+    """Adiciona pontos ao cliente com base no valor final pago (um único upsert atômico).
+    Não faz commit: chamada dentro do `with conn:` da venda/upgrade.
+    """
     cpf = (cpf or '').strip()
     if not cpf:
         return 0
     pts_add = _pontos_de_valor(valor_em_reais)
     if pts_add <= 0:
         return 0
-    set_pontos_cliente(cpf, get_pontos_cliente(cpf) + pts_add)
-    return pts_add
+    return pontos_lancar(cpf, pts_add, origem, ref_id)
 
 @ui_safe('Pontuação')
 def registrar_resgate_pontos(cpf: str, item: str) -> tuple:
@@ -1620,21 +3192,59 @@ def registrar_resgate_pontos(cpf: str, item: str) -> tuple:
         return False, "Item inválido. Use Capa ou Película.", get_pontos_cliente(cpf)
 
     custo = CUSTO_CAPA_PONTOS if item == "Capa" else CUSTO_PELICULA_PONTOS
-    saldo = get_pontos_cliente(cpf)
-    if saldo < custo:
-        return False, f"Pontos insuficientes. Saldo: {saldo} pts. Necessário: {custo} pts.", saldo
-
-    novo = max(0, saldo - custo)
     data = today_br()
     hora = datetime.datetime.now().strftime("%H:%M:%S")
     with conn:
-        set_pontos_cliente(cpf, novo)
+        # Débito condicional: só passa se o saldo cobrir o custo (sem ler-e-gravar)
+        cursor.execute(
+            "UPDATE pontuacao SET pontos=pontos-?, atualizado_em=? WHERE cpf=? AND COALESCE(pontos,0) >= ?",
+            (int(custo), now_br(), cpf, int(custo)),
+        )
+        if cursor.rowcount == 0:
+            saldo = get_pontos_cliente(cpf)
+            return False, f"Pontos insuficientes. Saldo: {saldo} pts. Necessário: {custo} pts.", saldo
         cursor.execute(
-            "INSERT INTO resgates_pontos(cpf,item,pontos_usados,data,hora) VALUES(?,?,?,?,?)",
-            (cpf, "Película" if item in ("Película", "Pelicula") else "Capa", int(custo), data, hora),
+            "INSERT INTO resgates_pontos(cpf,item,pontos_usados,data,hora,data_iso) VALUES(?,?,?,?,?,?)",
+            (cpf, "Película" if item in ("Película", "Pelicula") else "Capa", int(custo), data, hora, _br_to_iso(data)),
         )
+        cursor.execute(
+            "INSERT INTO pontos_movimentos(cpf,pontos,origem,ref_id,data_iso,criado_em) VALUES(?,?,?,?,?,?)",
+            (cpf, -int(custo), 'resgate', cursor.lastrowid, _br_to_iso(data), now_br()),
+        )
+    novo = get_pontos_cliente(cpf)
     return True, f"Resgate registrado: {item} (-{custo} pts).", novo
 
+def auditar_pontuacao() -> list:
+    """Lista (cpf, saldo, soma_razao) dos clientes cujo saldo difere do razão."""
+    cursor.execute(
+        """
+        SELECT cpf, saldo, razao FROM (
+            SELECT p.cpf AS cpf, COALESCE(p.pontos,0) AS saldo,
+                   COALESCE((SELECT SUM(m.pontos) FROM pontos_movimentos m WHERE m.cpf=p.cpf),0) AS razao
+            FROM pontuacao p
+            UNION ALL
+            SELECT m.cpf, 0, SUM(m.pontos) FROM pontos_movimentos m
+            WHERE m.cpf NOT IN (SELECT cpf FROM pontuacao)
+            GROUP BY m.cpf
+        ) WHERE saldo <> razao
+        """
+    )
+    return cursor.fetchall() or []
+
+def rebuild_pontuacao_do_razao() -> int:
+    """Recalcula todos os saldos a partir de pontos_movimentos. Retorna nº de clientes."""
+    agora = now_br()
+    with conn:
+        cursor.execute("UPDATE pontuacao SET pontos=0, atualizado_em=?", (agora,))
+        cursor.execute(
+            """INSERT INTO pontuacao(cpf,pontos,atualizado_em)
+               SELECT cpf, SUM(pontos), ? FROM pontos_movimentos GROUP BY cpf
+               ON CONFLICT(cpf) DO UPDATE SET pontos=excluded.pontos, atualizado_em=excluded.atualizado_em""",
+            (agora,),
+        )
+        cursor.execute("SELECT COUNT(1) FROM pontuacao")
+        return int(cursor.fetchone()[0] or 0)
+
 def run_pontos_migration_once():
     """Migra pontos iniciais a partir do histórico de vendas (uma vez)."""
     try:
@@ -1660,6 +3270,448 @@ def run_pontos_migration_once():
 # Executa migração inicial de pontos (apenas 1 vez)
 run_pontos_migration_once()
 
+def run_pontos_razao_migration_once():
+    """Abre o razão com o saldo atual de cada cliente (uma vez)."""
+    try:
+        if _meta_get('pontos_razao_v1') == '1':
+            return
+        with conn:
+            cursor.execute(
+                """INSERT INTO pontos_movimentos(cpf,pontos,origem,ref_id,data_iso,criado_em)
+                   SELECT p.cpf,
+                          COALESCE(p.pontos,0) - COALESCE((SELECT SUM(m.pontos) FROM pontos_movimentos m WHERE m.cpf=p.cpf),0),
+                          'saldo_inicial', NULL, ?, ?
+                   FROM pontuacao p
+                   WHERE COALESCE(p.pontos,0) <> COALESCE((SELECT SUM(m.pontos) FROM pontos_movimentos m WHERE m.cpf=p.cpf),0)""",
+                (today_iso(), now_br()),
+            )
+        _meta_set('pontos_razao_v1', '1')
+    except Exception as ex:
+        logging.error("Erro ignorado: %s", ex, exc_info=True)
+run_pontos_razao_migration_once()
+
+# ===================== JOURNAL DE ALTERAÇÕES (replicação quase em tempo real) =====================
+# Triggers gravam cada INSERT/UPDATE/DELETE das tabelas de negócio em journal_alteracoes
+# (mesma transação do app: o registro só existe se o commit aconteceu). Uma thread envia
+# os registros pendentes, a cada poucos segundos, para GOOGLE_DRIVE_BACKUP/banco/journal
+# em arquivos .jsonl rotativos (os fechados ficam em .jsonl.gz). Snapshot + journal
+# reconstroem o banco até o último commit enviado (journal_replay / --replay-journal).
+JOURNAL_TABELAS = (
+    "vendas", "caixa", "produtos", "clientes", "manutencao", "devedores", "pontuacao",
+    # dependentes das acima (mantêm resumo e razão de pontos coerentes no replay)
+    "vendas_diario", "pontos_movimentos", "resgates_pontos", "fechamento_caixa",
+    "cupons_arquivo",
+)
+JOURNAL_INTERVALO_SEG = 2.0
+JOURNAL_LOTE = 2000
+JOURNAL_ROTACAO_BYTES = 4 * 1024 * 1024
+
+cursor.execute(
+    """
+CREATE TABLE IF NOT EXISTS journal_alteracoes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tabela TEXT NOT NULL,
+    op TEXT NOT NULL,
+    rid INTEGER,
+    rid_antigo INTEGER,
+    dados TEXT,
+    criado_em TEXT DEFAULT (datetime('now','localtime'))
+)
+"""
+)
+conn.commit()
+
+def _journal_colunas(c, tabela: str):
+    """(colunas, alias_do_rowid) da tabela; alias é a coluna INTEGER PRIMARY KEY, se houver."""
+    info = c.execute(f"PRAGMA table_info({tabela})").fetchall()
+    cols = [r[1] for r in info]
+    pks = [r for r in info if r[5]]
+    alias = pks[0][1] if len(pks) == 1 and str(pks[0][2]).upper() == "INTEGER" else None
+    return cols, alias
+
+def ensure_journal_triggers():
+    """(Re)cria os triggers do journal quando o conjunto de colunas muda (ex.: ALTER TABLE)."""
+    try:
+        sqls = []
+        for t in JOURNAL_TABELAS:
+            cols, _alias = _journal_colunas(conn, t)
+            if not cols:
+                continue
+            novo = "json_object(" + ", ".join(f"'{col}', NEW.\"{col}\"" for col in cols) + ")"
+            sqls.append(
+                f"CREATE TRIGGER trg_journal_{t}_i AFTER INSERT ON {t} BEGIN "
+                f"INSERT INTO journal_alteracoes(tabela, op, rid, dados) VALUES ('{t}', 'I', NEW.rowid, {novo}); END"
+            )
+            sqls.append(
+                f"CREATE TRIGGER trg_journal_{t}_u AFTER UPDATE ON {t} BEGIN "
+                f"INSERT INTO journal_alteracoes(tabela, op, rid, rid_antigo, dados) "
+                f"VALUES ('{t}', 'U', NEW.rowid, OLD.rowid, {novo}); END"
+            )
+            sqls.append(
+                f"CREATE TRIGGER trg_journal_{t}_d AFTER DELETE ON {t} BEGIN "
+                f"INSERT INTO journal_alteracoes(tabela, op, rid) VALUES ('{t}', 'D', OLD.rowid); END"
+            )
+        assinatura = hashlib.sha256("\n".join(sqls).encode("utf-8")).hexdigest()
+        if _meta_get('journal_sig') == assinatura:
+            return
+        with conn:
+            for t in JOURNAL_TABELAS:
+                for sufixo in ("i", "u", "d"):
+                    conn.execute(f"DROP TRIGGER IF EXISTS trg_journal_{t}_{sufixo}")
+            for sql in sqls:
+                conn.execute(sql)
+        _meta_set('journal_sig', assinatura)
+    except Exception as ex:
+        logging.error("Erro ignorado: %s", ex, exc_info=True)
+ensure_journal_triggers()
+
+def _journal_dir() -> str:
+    d = os.path.join(GOOGLE_DRIVE_BACKUP, "banco", "journal")
+    os.makedirs(d, exist_ok=True)
+    return d
+
+def _journal_arquivos() -> list:
+    """[(primeiro_id, caminho)] dos arquivos do journal, em ordem."""
+    arquivos = []
+    for n in os.listdir(_journal_dir()):
+        m = re.match(r"journal_(\d+)\.jsonl(\.gz)?$", n)
+        if m:
+            arquivos.append((int(m.group(1)), os.path.join(_journal_dir(), n)))
+    return sorted(arquivos)
+
+def _journal_seq(c) -> int:
+    r = c.execute("SELECT seq FROM sqlite_sequence WHERE name='journal_alteracoes'").fetchone()
+    return int(r[0]) if r and r[0] is not None else 0
+
+def journal_ler(desde_id: int = 0, ate_id: int = None):
+    """Gera os registros do journal com desde_id < id <= ate_id, em ordem e sem repetidos."""
+    arquivos = _journal_arquivos()
+    ultimo = int(desde_id or 0)
+    for i, (_primeiro, caminho) in enumerate(arquivos):
+        if i + 1 < len(arquivos) and arquivos[i + 1][0] <= ultimo + 1:
+            continue  # arquivo inteiro já coberto
+        abrir = gzip.open if caminho.endswith(".gz") else open
+        with abrir(caminho, "rt", encoding="utf-8") as f:
+            for linha in f:
+                linha = linha.strip()
+                if not linha:
+                    continue
+                try:
+                    reg = json.loads(linha)
+                except ValueError:
+                    logging.warning("Journal: linha inválida ignorada em %s", caminho)
+                    continue
+                if reg["id"] <= ultimo:
+                    continue
+                if ate_id is not None and reg["id"] > ate_id:
+                    return
+                ultimo = reg["id"]
+                yield reg
+
+def _journal_ultimo_id_enviado() -> int:
+    """Maior id já gravado nos arquivos do journal (0 se não houver)."""
+    arquivos = _journal_arquivos()
+    if not arquivos:
+        return 0
+    ultimo = arquivos[-1][0] - 1
+    for reg in journal_ler(ultimo):
+        ultimo = reg["id"]
+    return ultimo
+
+
+class JournalShipper:
+    """Thread que envia journal_alteracoes para os arquivos do backup.
+    - a cada `intervalo_seg` grava os pendentes (id > app_meta.journal_enviado_ate) com fsync
+    - rotaciona por tamanho; o arquivo fechado é comprimido (.jsonl.gz)
+    - ao iniciar, realinha a numeração se o banco voltou no tempo (restauração sem replay)
+    """
+    def __init__(self, intervalo_seg: float = JOURNAL_INTERVALO_SEG):
+        self._intervalo = float(intervalo_seg)
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def iniciar(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._run, name="journal-shipper", daemon=True)
+        self._thread.start()
+
+    def parar(self, timeout: float = 5.0):
+        """Para a thread e envia o que faltar (chamar ao fechar o app, antes de fechar a conexão)."""
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            while self.enviar() >= JOURNAL_LOTE:
+                pass
+        except Exception as ex:
+            logging.error("Erro ignorado: %s", ex, exc_info=True)
+
+    def _run(self):
+        try:
+            self._alinhar_numeracao()
+        except Exception as ex:
+            logging.error("Erro ignorado: %s", ex, exc_info=True)
+        while not self._parar.wait(self._intervalo):
+            try:
+                while self.enviar() >= JOURNAL_LOTE:
+                    pass
+            except Exception as ex:
+                logging.error("Falha ao enviar journal: %s", ex, exc_info=True)
+        DB.close_thread()
+
+    def _alinhar_numeracao(self):
+        """Se os arquivos já têm ids além do que o banco conhece, empurra os pendentes para depois deles."""
+        with self._lock:
+            ultimo_arquivo = _journal_ultimo_id_enviado()
+            c = DB.get()
+            enviado = int(_meta_get('journal_enviado_ate', '0') or 0)
+            if ultimo_arquivo <= enviado:
+                return
+            desloc = ultimo_arquivo - enviado
+            with c:
+                pendentes = [r[0] for r in c.execute(
+                    "SELECT id FROM journal_alteracoes WHERE id > ? ORDER BY id DESC", (enviado,)
+                )]
+                for jid in pendentes:
+                    c.execute("UPDATE journal_alteracoes SET id = ? WHERE id = ?", (jid + desloc, jid))
+                seq = max(_journal_seq(c) + desloc, ultimo_arquivo)
+                if c.execute("UPDATE sqlite_sequence SET seq=? WHERE name='journal_alteracoes'", (seq,)).rowcount == 0:
+                    c.execute("INSERT INTO sqlite_sequence(name, seq) VALUES ('journal_alteracoes', ?)", (seq,))
+                c.execute(
+                    "INSERT OR REPLACE INTO app_meta(key,value) VALUES('journal_enviado_ate',?)", (str(ultimo_arquivo),)
+                )
+            logging.warning(
+                "Journal realinhado: banco estava em %d, arquivos em %d (%d pendente(s) renumerado(s))",
+                enviado, ultimo_arquivo, len(pendentes),
+            )
+
+    def enviar(self) -> int:
+        """Grava um lote de pendentes no arquivo corrente. Retorna quantos registros foram enviados."""
+        with self._lock:
+            c = DB.get()
+            enviado = int(_meta_get('journal_enviado_ate', '0') or 0)
+            rows = c.execute(
+                """SELECT id, tabela, op, rid, rid_antigo, dados, criado_em
+                   FROM journal_alteracoes WHERE id > ? ORDER BY id LIMIT ?""",
+                (enviado, JOURNAL_LOTE),
+            ).fetchall()
+            if not rows:
+                return 0
+            arquivos = _journal_arquivos()
+            caminho = arquivos[-1][1] if arquivos else None
+            if caminho and (caminho.endswith(".gz") or os.path.getsize(caminho) >= JOURNAL_ROTACAO_BYTES):
+                self._fechar(caminho)
+                caminho = None
+            if caminho is None:
+                caminho = os.path.join(_journal_dir(), f"journal_{rows[0][0]:012d}.jsonl")
+            with open(caminho, "a+b") as f:
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        f.write(b"\n")  # última linha cortada (queda no meio da escrita)
+                for jid, tabela, op, rid, rid_antigo, dados, criado_em in rows:
+                    reg = {"id": jid, "t": tabela, "op": op, "rid": rid}
+                    if rid_antigo is not None and rid_antigo != rid:
+                        reg["ra"] = rid_antigo
+                    if dados is not None:
+                        reg["d"] = json.loads(dados)
+                    reg["em"] = criado_em
+                    f.write((json.dumps(reg, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8"))
+                f.flush()
+                os.fsync(f.fileno())
+            _meta_set('journal_enviado_ate', str(rows[-1][0]))
+            return len(rows)
+
+    @staticmethod
+    def _fechar(caminho: str):
+        if caminho.endswith(".gz"):
+            return
+        with open(caminho, "rb") as src, gzip.open(caminho + ".gz.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(caminho + ".gz.tmp", caminho + ".gz")
+        os.remove(caminho)
+
+JOURNAL = JournalShipper()
+
+
+def journal_aplicar_retencao(snapshot_journal_ate: int = None):
+    """Limpa o journal já protegido: linhas da tabela enviadas e cobertas pelo último snapshot,
+    e arquivos inteiramente anteriores ao snapshot mais antigo mantido.
+    """
+    c = DB.get()
+    enviado = int(_meta_get('journal_enviado_ate', '0') or 0)
+    if snapshot_journal_ate is not None:
+        with c:
+            c.execute("DELETE FROM journal_alteracoes WHERE id <= ?", (min(enviado, int(snapshot_journal_ate)),))
+    _dir_blocos, dir_snaps = _snapshot_dirs()
+    cobertos = []
+    for n in os.listdir(dir_snaps):
+        if n.endswith(".json"):
+            with open(os.path.join(dir_snaps, n), "r", encoding="utf-8") as f:
+                cobertos.append(json.load(f).get("journal_ate") or 0)
+    if not cobertos:
+        return 0
+    limite = min(cobertos)
+    arquivos = _journal_arquivos()
+    removidos = 0
+    for i in range(len(arquivos) - 1):
+        if arquivos[i + 1][0] <= limite + 1:
+            os.remove(arquivos[i][1])
+            removidos += 1
+    if removidos:
+        logging.info("Retenção do journal: %d arquivo(s) removido(s)", removidos)
+    return removidos
+
+
+def _journal_aplicar(c, reg: dict, colunas: dict):
+    t = reg["t"]
+    if t not in JOURNAL_TABELAS:
+        raise ValueError(f"Tabela fora do journal: {t}")
+    if t not in colunas:
+        colunas[t] = _journal_colunas(c, t)
+    cols, alias = colunas[t]
+    if reg["op"] == "D":
+        c.execute(f"DELETE FROM {t} WHERE rowid=?", (reg["rid"],))
+        return
+    if reg.get("ra") is not None:
+        c.execute(f"DELETE FROM {t} WHERE rowid=?", (reg["ra"],))
+    dados = {k: v for k, v in reg["d"].items() if k in cols and k != alias}
+    nomes = ", ".join(f'"{k}"' for k in dados)
+    marcas = ", ".join("?" for _ in dados)
+    c.execute(
+        f"INSERT OR REPLACE INTO {t}(rowid{', ' + nomes if nomes else ''}) VALUES (?{', ' + marcas if marcas else ''})",
+        (reg["rid"], *dados.values()),
+    )
+
+def journal_replay(destino: str, nome: str = None, ate_id: int = None) -> tuple:
+    """Restaura o snapshot `nome` (padrão: o mais recente) em `destino` e aplica o journal
+    até o fim (ou até `ate_id`). Retorna (snapshot, registros_aplicados, ultimo_id).
+    """
+    if not nome:
+        nomes = snapshot_listar()
+        if not nomes:
+            raise ValueError("Nenhum snapshot encontrado")
+        nome = nomes[0]
+    snapshot_restaurar(nome, destino)
+    c = _db_connect(destino)  # mesmos PRAGMAs (recursive_triggers mantém a busca FTS coerente)
+    try:
+        ultimo = _journal_seq(c)
+        aplicados = 0
+        colunas = {}
+        with c:
+            for reg in journal_ler(ultimo, ate_id):
+                _journal_aplicar(c, reg, colunas)
+                # Troca o que os triggers do destino gravaram pelo registro original (mesmo id)
+                c.execute("DELETE FROM journal_alteracoes WHERE id > ?", (ultimo,))
+                c.execute(
+                    """INSERT INTO journal_alteracoes(id, tabela, op, rid, rid_antigo, dados, criado_em)
+                       VALUES (?,?,?,?,?,?,?)""",
+                    (reg["id"], reg["t"], reg["op"], reg["rid"], reg.get("ra"),
+                     json.dumps(reg["d"], ensure_ascii=False) if "d" in reg else None, reg.get("em")),
+                )
+                ultimo = reg["id"]
+                aplicados += 1
+            c.execute("UPDATE sqlite_sequence SET seq=? WHERE name='journal_alteracoes'", (ultimo,))
+            c.execute("INSERT OR REPLACE INTO app_meta(key,value) VALUES('journal_enviado_ate',?)", (str(ultimo),))
+        c.execute("PRAGMA journal_mode=DELETE")
+        r = c.execute("PRAGMA integrity_check").fetchone()
+        if not r or str(r[0]).strip().lower() != "ok":
+            raise ValueError("Banco reconstruído reprovado no integrity_check")
+    finally:
+        c.close()
+    logging.info("Replay do journal: snapshot %s + %d registro(s) até o id %d -> %s", nome, aplicados, ultimo, destino)
+    return nome, aplicados, ultimo
+# ===================== FIM JOURNAL DE ALTERAÇÕES =====================
+
+# ===================== MONITOR DE ESTOQUE (alertas por transição) =====================
+# Chamado depois do commit que mexeu no estoque. Alerta uma única vez quando o produto
+# cruza um limite para baixo (ok -> baixo, -> zerado); o nível atual fica em app_meta
+# (estoque_nivel:<codigo>), então reiniciar o app ou redesenhar a grade não repete alertas.
+ESTOQUE_LIMITE_BAIXO = 5
+_ESTOQUE_ORDEM = {"ok": 0, "baixo": 1, "zerado": 2}
+
+def estoque_nivel(qtd) -> str:
+    qtd = int(qtd or 0)
+    if qtd <= 0:
+        return "zerado"
+    if qtd <= ESTOQUE_LIMITE_BAIXO:
+        return "baixo"
+    return "ok"
+
+def estoque_verificar(codigos=None, nomes=None) -> int:
+    """Compara o estoque atual dos produtos (por código e/ou nome) com o último nível
+    registrado e envia o alerta das transições para baixo. Retorna quantos alertas saíram.
+    """
+    alertas = 0
+    try:
+        c = DB.get()
+        filtros, params = [], []
+        if codigos:
+            filtros.append(f"codigo IN ({','.join('?' * len(codigos))})")
+            params.extend(codigos)
+        if nomes:
+            filtros.append(f"nome IN ({','.join('?' * len(nomes))})")
+            params.extend(nomes)
+        if not filtros:
+            return 0
+        produtos = c.execute(
+            f"SELECT codigo, nome, COALESCE(estoque,0) FROM produtos WHERE {' OR '.join(filtros)}", params
+        ).fetchall()
+        if not produtos:
+            return 0
+        chaves = [f"estoque_nivel:{codigo}" for codigo, _n, _q in produtos]
+        anteriores = dict(c.execute(
+            f"SELECT key, value FROM app_meta WHERE key IN ({','.join('?' * len(chaves))})", chaves
+        ).fetchall())
+        mudancas = []
+        cfg_tg = _load_telegram_config()
+        for codigo, nome, qtd in produtos:
+            chave = f"estoque_nivel:{codigo}"
+            antes = anteriores.get(chave) or "ok"
+            agora = estoque_nivel(qtd)
+            if agora == antes:
+                continue
+            mudancas.append((chave, agora))
+            if _ESTOQUE_ORDEM[agora] <= _ESTOQUE_ORDEM.get(antes, 0):
+                continue  # reposição: só atualiza o nível
+            if agora == "zerado":
+                telegram_notify(f"""⛔ <b>ESTOQUE ZERADO</b>
+            📦 Produto: {nome}
+            🔢 Qtd: {qtd}""", dedupe_key=f"stock_zero_{codigo}", dedupe_window_sec=int(cfg_tg.get('dedupe_zero_sec', 43200)))
+            else:
+                telegram_notify(f"""⚠️ <b>ESTOQUE BAIXO</b>
+            📦 Produto: {nome}
+            🔢 Qtd: {qtd}""", dedupe_key=f"stock_low_{codigo}", dedupe_window_sec=int(cfg_tg.get('dedupe_low_sec', 21600)))
+            alertas += 1
+        if mudancas:
+            with c:
+                c.executemany("INSERT OR REPLACE INTO app_meta(key,value) VALUES(?,?)", mudancas)
+    except Exception as ex:
+        logging.error("Erro ignorado: %s", ex, exc_info=True)
+    return alertas
+
+def run_estoque_monitor_migration_once():
+    """Registra o nível atual de todos os produtos sem alertar (só transições futuras alertam)."""
+    try:
+        if _meta_get('estoque_monitor_v1') == '1':
+            return
+        niveis = [
+            (f"estoque_nivel:{codigo}", estoque_nivel(qtd))
+            for codigo, qtd in cursor.execute("SELECT codigo, COALESCE(estoque,0) FROM produtos").fetchall()
+        ]
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO app_meta(key,value) VALUES(?,?)", niveis)
+        _meta_set('estoque_monitor_v1', '1')
+    except Exception as ex:
+        logging.error("Erro ignorado: %s", ex, exc_info=True)
+run_estoque_monitor_migration_once()
+PERFIL.marcar("schema e migrações")
+# ===================== FIM MONITOR DE ESTOQUE =====================
+
 # ====== POLÍTICA DE SENHA (centralizada) ======
 PASSWORD_MIN_LEN = 8
 
@@ -1864,6 +3916,7 @@ ON CONFLICT(id) DO UPDATE SET
 """,
             (machine_id, chave, expira_em_iso, now, now),
         )
+    STATUSBAR.invalidar_licenca()
 
 def licenca_valida_local():
     """Valida a licença local e BLOQUEIA se estiver vencida.
@@ -1922,17 +3975,13 @@ def get_tempo_restante_licenca_str():
 
 
 def bind_licenca_statusbar_auto_update(root_widget, label_widget, interval_ms=60000):
-    """Atualiza periodicamente a label da status bar com o tempo restante da licença."""
-    def _tick():
-        try:
-            label_widget.config(text=get_tempo_restante_licenca_str())
-        except Exception as ex:
-            logging.error("Erro ignorado: %s", ex, exc_info=True)
-        try:
-            root_widget.after(int(interval_ms), _tick)
-        except Exception as ex:
-            logging.error("Erro ignorado: %s", ex, exc_info=True)
-    _tick()
+    """Mantém a label da status bar com o tempo restante da licença.
+
+    A atualização é feita pelo tick único do STATUSBAR (texto em cache até a
+    meia-noite ou até salvar nova licença); root_widget/interval_ms ficam por
+    compatibilidade.
+    """
+    STATUSBAR.registrar(label_widget, STATUSBAR.fonte_licenca())
 
 def mostrar_dialogo_licenca(master=None):
     """Exige uma chave válida para liberar o app. Retorna True se ativar."""
@@ -2126,9 +4175,7 @@ def enviar_chave_licenca_email(destinatario_email: str, chave: str, expira_iso:
             html_part = msg.get_payload()[-1]
             html_part.add_related(img_bytes, maintype=maintype, subtype=subtype, cid=logo_cid)
 
-        with smtplib.SMTP_SSL("smtp.gmail.com", 465, timeout=20) as smtp:
-            smtp.login(EMAIL_REMETENTE, SENHA_APP)
-            smtp.send_message(msg)
+        SMTP.enviar(msg)
         return True, "OK"
     except Exception as e:
         return False, f"Falha ao enviar e-mail: {e}"
@@ -2168,7 +4215,15 @@ def admin_gerar_enviar_licenca_dialog(master):
             exp = _add_days_iso(LICENCA_DIAS)
             fake_mid = mid8 + "0" * 56
             chave = gerar_chave_licenca(exp, fake_mid)
-            ok, msg = enviar_chave_licenca_email(email, chave, exp)
+            lbl_out.config(text="Enviando chave…")
+            JOBS.submit(
+                enviar_chave_licenca_email, email, chave, exp,
+                on_done=lambda res: _enviado(res, email, chave, exp),
+                on_error=lambda e: _enviado((False, f"Falha ao enviar e-mail: {e}"), email, chave, exp),
+            )
+
+        def _enviado(res, email, chave, exp):
+            ok, msg = res
             if ok:
                 try:
                     win.clipboard_clear(); win.clipboard_append(chave)
@@ -2222,6 +4277,8 @@ def setup_global_exception_handlers(tk_root: tk.Misc):
 # ===================== FOCO PÓS-PDF =====================
 def bring_app_to_front():
     """Recoloca a janela do app na frente após abrir viewer externo."""
+    if threading.current_thread() is not threading.main_thread():
+        return  # Tk só pode ser tocado na thread principal
     try:
         root = tk._default_root
         if root and root.winfo_exists():
@@ -2302,14 +4359,16 @@ def _abrir_programa_por_caminhos(nome: str, caminhos: list, parent=None):
             messagebox.showerror('Erro', 'Falha ao abrir ' + str(nome) + ':\n' + str(ex))
         return False
 
-def montar_aba_ferramentas(abas: ttk.Notebook, root_win):
-    """Cria a aba Ferramentas com botões em formato de ícone."""
-    aba_ferramentas = ttk.Frame(abas, padding=10)
-    # insere perto do início para ficar visível mesmo com muitas abas
-    try:
-        abas.insert(1, aba_ferramentas, text='Ferramentas')
-    except Exception:
-        abas.add(aba_ferramentas, text='Ferramentas')
+def montar_aba_ferramentas(abas: ttk.Notebook, root_win, aba_ferramentas=None):
+    """Cria a aba Ferramentas com botões em formato de ícone.
+    Se `aba_ferramentas` vier pronta (aba sob demanda), só monta o conteúdo dentro dela."""
+    if aba_ferramentas is None:
+        aba_ferramentas = ttk.Frame(abas, padding=10)
+        # insere perto do início para ficar visível mesmo com muitas abas
+        try:
+            abas.insert(1, aba_ferramentas, text='Ferramentas')
+        except Exception:
+            abas.add(aba_ferramentas, text='Ferramentas')
 
     try:
         ttk.Label(aba_ferramentas, text='Atalhos rápidos', font=('Segoe UI', 12, 'bold')).grid(row=0, column=0, columnspan=4, sticky='w', pady=(0, 12))
@@ -2671,6 +4730,143 @@ def apply_zebra(tree: ttk.Treeview):
             tree.item(iid, tags=tuple(tags))
     except Exception as ex:
         logging.error("Erro ignorado: %s", ex, exc_info=True)
+
+# ===================== TREEVIEW: Sincronização incremental =====================
+def sync_treeview(tree: ttk.Treeview, rows, zebra: bool = False):
+    """Sincroniza o Treeview com `rows` alterando só as linhas que mudaram.
+
+    Cada linha é (chave, values) ou (chave, values, tags); a chave (codigo, id, os, cpf...)
+    vira o iid do item. Itens que sumiram são removidos, novos são inseridos na posição
+    certa e existentes só são reconfigurados se values/tags mudaram.
+    Retorna (inseridos, atualizados, removidos).
+    """
+    cache = getattr(tree, '_sync_cache', None)
+    if cache is None:
+        cache = {}
+        tree._sync_cache = cache
+
+    desejado = []
+    vistos = set()
+    for row in rows:
+        iid = str(row[0])
+        if iid in vistos:
+            continue
+        vistos.add(iid)
+        tags = tuple(row[2]) if len(row) > 2 and row[2] else ()
+        if zebra:
+            tags = tags + ('even' if len(desejado) % 2 == 0 else 'odd',)
+        desejado.append((iid, tuple(row[1]), tags))
+
+    atuais = tree.get_children('')
+    remover = [iid for iid in atuais if iid not in vistos]
+    if remover:
+        tree.delete(*remover)
+    ordem = [iid for iid in atuais if iid in vistos]
+    existentes = set(ordem)
+
+    inseridos = atualizados = 0
+    for pos, (iid, values, tags) in enumerate(desejado):
+        if iid not in existentes:
+            tree.insert('', pos, iid=iid, values=values, tags=tags)
+            ordem.insert(pos, iid)
+            inseridos += 1
+        else:
+            # prefixo [0, pos) já está na ordem certa: só move se este item estiver fora do lugar
+            if pos >= len(ordem) or ordem[pos] != iid:
+                tree.move(iid, '', pos)
+                ordem.remove(iid)
+                ordem.insert(pos, iid)
+            if cache.get(iid) != (values, tags):
+                tree.item(iid, values=values, tags=tags)
+                atualizados += 1
+        cache[iid] = (values, tags)
+
+    for iid in [k for k in cache if k not in vistos]:
+        del cache[iid]
+    return inseridos, atualizados, len(remover)
+
+class PagedTreeview:
+    """Liga um Treeview existente a uma consulta paginada por keyset.
+
+    Carrega `page_size` linhas e busca a próxima página quando a rolagem passa de
+    `threshold`. fetch_page(ultima_linha, limite) roda a consulta do chamador
+    (ex.: ``WHERE os < ? ORDER BY os DESC LIMIT ?``) recebendo a última linha
+    carregada (None na primeira página); row_to_item(linha) devolve
+    (chave, values[, tags]) como em sync_treeview.
+    """
+
+    def __init__(self, tree, scrollbar, fetch_page, row_to_item, page_size=200, zebra=False, threshold=0.9):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.fetch_page = fetch_page
+        self.row_to_item = row_to_item
+        self.page_size = int(page_size)
+        self.zebra = zebra
+        self.threshold = float(threshold)
+        self._ultima = None
+        self._esgotado = False
+        self._carregando = False
+        self._agendado = False
+        tree.configure(yscrollcommand=self._on_yscroll)
+
+    def _on_yscroll(self, first, last):
+        try:
+            self.scrollbar.set(first, last)
+        except Exception as ex:
+            logging.error("Erro ignorado: %s", ex, exc_info=True)
+        try:
+            if not self._esgotado and not self._agendado and float(last) >= self.threshold:
+                self._agendado = True
+                self.tree.after_idle(self._carregar_mais)
+        except Exception as ex:
+            logging.error("Erro ignorado: %s", ex, exc_info=True)
+
+    def recarregar(self):
+        """Volta ao início da consulta mantendo a quantidade de linhas já carregadas (diff por chave)."""
+        limite = max(self.page_size, len(self.tree.get_children('')))
+        self.aplicar(self.fetch_page(None, limite), limite)
+
+    def aplicar(self, rows, limite=None):
+        """Mostra `rows` como primeira(s) página(s) (ex.: resultado de uma busca feita em segundo plano)."""
+        rows = rows or []
+        limite = self.page_size if limite is None else limite
+        self._ultima = rows[-1] if rows else None
+        self._esgotado = len(rows) < limite
+        sync_treeview(self.tree, [self.row_to_item(r) for r in rows], zebra=self.zebra)
+
+    def _carregar_mais(self):
+        self._agendado = False
+        if self._esgotado or self._carregando:
+            return
+        self._carregando = True
+        try:
+            rows = self.fetch_page(self._ultima, self.page_size) or []
+            self._esgotado = len(rows) < self.page_size
+            if rows:
+                self._ultima = rows[-1]
+            cache = getattr(self.tree, '_sync_cache', None)
+            if cache is None:
+                cache = {}
+                self.tree._sync_cache = cache
+            n = len(self.tree.get_children(''))
+            for r in rows:
+                item = self.row_to_item(r)
+                iid = str(item[0])
+                if self.tree.exists(iid):
+                    continue
+                values = tuple(item[1])
+                tags = tuple(item[2]) if len(item) > 2 and item[2] else ()
+                if self.zebra:
+                    tags = tags + ('even' if n % 2 == 0 else 'odd',)
+                self.tree.insert('', 'end', iid=iid, values=values, tags=tags)
+                cache[iid] = (values, tags)
+                n += 1
+        except tk.TclError:
+            return
+        except Exception as ex:
+            logging.error("Erro ao carregar próxima página: %s", ex, exc_info=True)
+        finally:
+            self._carregando = False
 # ===================== SPLASH SCREEN (corrigida: primeiro plano garantido) =====================
 class SplashScreen(tk.Toplevel):
     def __init__(self, master):
@@ -3350,35 +5546,270 @@ def check_and_update_after_login(master: tk.Misc) -> bool:
             logging.error("Erro ignorado: %s", ex, exc_info=True)
         return False
 # ================= FUNÇÕES PDF =================
+# Motor comum dos PDFs (cupom, OS, relatórios):
+# - logo.png é reduzida/codificada UMA vez por processo e o XObject pronto é reaproveitado
+#   em todo documento (antes cada PDF decodificava e comprimia o PNG de 1024px: ~230ms)
+# - PdfDocumento: cabeçalho de página (logo + título + régua) e cabeçalho da tabela em
+#   andamento repetidos automaticamente a cada quebra de página; colunas declarativas (PdfColuna)
+# - pdf_documento_curto: caminho rápido para documentos de uma página (cupom/OS)
+import copy
+
+PDF_LOGO_MAX_PX = 400  # ~300 dpi na maior caixa usada (90pt)
+
+_PDF_LOGO_LOCK = threading.Lock()
+_PDF_LOGO = {"chave": None, "nome": None, "xobj": None, "leitor": None}
+
+
+def _pdf_logo_cache():
+    """(nome, PDFImageXObject, ImageReader) da logo já codificada; None sem logo.png.
+    Só recodifica se o arquivo mudar (mtime/tamanho)."""
+    logo_path = str(P('logo.png'))
+    try:
+        st = os.stat(logo_path)
+    except OSError:
+        return None
+    chave = (logo_path, st.st_mtime_ns, st.st_size)
+    with _PDF_LOGO_LOCK:
+        if _PDF_LOGO["chave"] != chave:
+            rl = _reportlab()
+            from reportlab.pdfbase import pdfdoc
+            img = Image.open(logo_path)
+            img.load()
+            if max(img.size) > PDF_LOGO_MAX_PX:
+                img.thumbnail((PDF_LOGO_MAX_PX, PDF_LOGO_MAX_PX), Image.LANCZOS)
+            leitor = rl.ImageReader(img)
+            nome = hashlib.md5(leitor.getRGBData() + repr((chave, PDF_LOGO_MAX_PX)).encode()).hexdigest()
+            xobj = pdfdoc.PDFImageXObject(nome, leitor, mask="auto")
+            _PDF_LOGO.update(chave=chave, nome=nome, xobj=xobj, leitor=leitor)
+        return _PDF_LOGO["nome"], _PDF_LOGO["xobj"], _PDF_LOGO["leitor"]
+
+
+def _pdf_registrar_logo(c, nome, modelo):
+    """Registra no documento de `c` uma cópia rasa do XObject em cache (o stream
+    comprimido é compartilhado; só o registro é por documento). Retorna o nome interno."""
+    doc = c._doc
+    reg = doc.getXObjectName(nome)
+    xobj = doc.idToObject.get(reg)
+    if xobj is None:
+        xobj = copy.copy(modelo)
+        smask = xobj.__dict__.pop("_smask", None)
+        c._setXObjects(xobj)
+        doc.Reference(xobj, reg)
+        doc.addForm(nome, xobj)
+        if smask is not None:
+            smask = copy.copy(smask)
+            c._setXObjects(smask)
+            xobj.smask = doc.Reference(smask, doc.getXObjectName(smask.name))
+    return reg, xobj
+
+
+def _pdf_xobj_suportado(c) -> bool:
+    """O caminho rápido da logo usa estado interno do reportlab; confere antes de escrever na página."""
+    doc = getattr(c, "_doc", None)
+    return (
+        isinstance(getattr(c, "_code", None), list)
+        and isinstance(getattr(c, "_formsinuse", None), list)
+        and hasattr(c, "_currentPageHasImages")
+        and callable(getattr(c, "_setXObjects", None))
+        and isinstance(getattr(doc, "idToObject", None), dict)
+        and all(callable(getattr(doc, m, None)) for m in ("getXObjectName", "Reference", "addForm"))
+    )
+
+
+def _pdf_draw_logo(c, x=40, y=740, w=260, h=90):
+    """Desenha a logo (logo.png) centralizada na caixa (x, y, w, h), mantendo a proporção.
+    Qualquer falha do caminho rápido (API interna do reportlab diferente) cai no drawImage
+    público, ainda com a logo reduzida; nada é escrito na página antes de tudo estar pronto."""
+    try:
+        cache = _pdf_logo_cache()
+        if cache is None:
+            return
+        nome, modelo, leitor = cache
+    except Exception as ex:
+        logging.error("Erro ignorado: %s", ex, exc_info=True)
+        return
+    try:
+        if not _pdf_xobj_suportado(c):
+            raise AttributeError("canvas sem os atributos internos esperados")
+        reg, xobj = _pdf_registrar_logo(c, nome, modelo)
+        escala = min(w / float(xobj.width), h / float(xobj.height))
+        lw, lh = xobj.width * escala, xobj.height * escala
+        ox, oy = x + (w - lw) / 2.0, y + (h - lh) / 2.0
+        comando = "/%s Do" % reg
+    except Exception as ex:
+        logging.warning("Logo em cache indisponível (%s); usando drawImage", ex)
+        try:
+            c.drawImage(leitor, x, y, width=w, height=h, preserveAspectRatio=True, mask="auto")
+        except Exception as ex2:
+            logging.error("Erro ignorado: %s", ex2, exc_info=True)
+        return
+    c.saveState()
+    c.translate(ox, oy)
+    c.scale(lw, lh)
+    c._code.append(comando)
+    c.restoreState()
+    c._formsinuse.append(nome)
+    c._currentPageHasImages = 1
+
+
+class PdfColuna:
+    """Coluna de tabela: título, posição x e alinhamento ('w' = esquerda em x; 'e' = direita em x)."""
+
+    def __init__(self, titulo: str, x: float, alinhar: str = "w", max_chars: int = None, x_titulo: float = None):
+        self.titulo = titulo
+        self.x = x
+        self.alinhar = alinhar
+        self.max_chars = max_chars
+        self.x_titulo = x_titulo if x_titulo is not None else (x - 70 if alinhar == "e" else x)
+
+    def desenhar(self, c, y, valor):
+        txt = "" if valor is None else str(valor)
+        if self.max_chars:
+            txt = txt[:self.max_chars]
+        if self.alinhar == "e":
+            c.drawRightString(self.x, y, txt)
+        else:
+            c.drawString(self.x, y, txt)
+
+
+class PdfDocumento:
+    """PDF A4 paginado: `y` desce a cada linha e, ao passar do rodapé, a página é
+    quebrada com o cabeçalho (logo + título + régua) e o da tabela corrente repetidos."""
+
+    def __init__(self, nome_arquivo: str, titulo: str, tamanho_titulo: int = 12, logo=(40, 740, 260, 90),
+                 y_titulo: int = 720, y_regua: int = 702, topo: int = 680, rodape: int = 60):
+        self.nome_arquivo = nome_arquivo
+        self.titulo = titulo
+        self.tamanho_titulo = tamanho_titulo
+        self.logo = logo
+        self.y_titulo, self.y_regua, self.topo, self.rodape = y_titulo, y_regua, topo, rodape
+        self.c = _pdf_canvas(nome_arquivo)
+        self._tabela = None  # (colunas, continuacao, passo, tamanho, regua) enquanto desenha linhas
+        self._cabecalho_pagina(False)
+
+    def _cabecalho_pagina(self, continuacao: bool):
+        c = self.c
+        if self.logo:
+            _pdf_draw_logo(c, *self.logo)
+        c.setFont("Helvetica-Bold", self.tamanho_titulo)
+        c.drawString(40, self.y_titulo, self.titulo + (" (continuação)" if continuacao else ""))
+        c.setFont("Helvetica", 11)
+        c.drawString(40, self.y_regua, "-" * 110)
+        self.y = self.topo
+
+    def nova_pagina(self):
+        self.c.showPage()
+        self._cabecalho_pagina(True)
+        if self._tabela is not None:
+            self._cabecalho_tabela(continuacao=True)
+
+    def garantir(self, altura: float = 0):
+        """Quebra a página se `altura` pontos não couberem acima do rodapé."""
+        if self.y - altura < self.rodape:
+            self.nova_pagina()
+
+    def linha(self, texto: str, negrito: bool = False, tamanho: int = 10, x: float = 40, passo: float = 16):
+        self.garantir()
+        self.c.setFont("Helvetica-Bold" if negrito else "Helvetica", tamanho)
+        self.c.drawString(x, self.y, texto)
+        self.y -= passo
+
+    def regua(self, passo: float = 18):
+        self.linha("-" * 110, tamanho=11, passo=passo)
+
+    def espaco(self, dy: float):
+        self.y -= dy
+
+    def _cabecalho_tabela(self, continuacao: bool = False):
+        colunas, titulo_cont, passo, tamanho, regua = self._tabela
+        c = self.c
+        if continuacao and titulo_cont:
+            c.setFont("Helvetica-Bold", 12)
+            c.drawString(40, self.y, titulo_cont)
+            self.y -= 18
+        c.setFont("Helvetica-Bold", tamanho)
+        for col in colunas:
+            c.drawString(col.x_titulo, self.y, col.titulo)
+        if regua:
+            self.y -= 6
+            c.setFont("Helvetica", tamanho)
+            c.drawString(40, self.y, "-" * 110)
+        self.y -= passo
+
+    def tabela(self, colunas, linhas, vazio: str = None, continuacao: str = None,
+               passo: float = 16, tamanho: int = 10, regua: bool = False):
+        """Desenha `linhas` (uma célula por coluna, já formatada). `continuacao` é o
+        subtítulo repetido antes do cabeçalho da tabela quando ela continua na outra página."""
+        if not linhas:
+            if vazio:
+                self.linha(vazio, tamanho=tamanho, passo=18)
+            return
+        self.garantir(passo * 2)  # não deixa o cabeçalho da tabela sozinho no pé da página
+        self._tabela = (colunas, continuacao, passo, tamanho, regua)
+        try:
+            self._cabecalho_tabela()
+            for celulas in linhas:
+                if self.y < self.rodape:
+                    self.nova_pagina()
+                self.c.setFont("Helvetica", tamanho)
+                for col, cel in zip(colunas, celulas):
+                    col.desenhar(self.c, self.y, cel)
+                self.y -= passo
+        finally:
+            self._tabela = None
+
+    def salvar(self) -> str:
+        self.c.save()
+        return self.nome_arquivo
 
-def _pdf_draw_logo(c, x=40, y=740, w=260, h=90):
-    """Desenha a logo (logo.png) em PDFs com tamanho maior e consistente (260x90)."""
-    try:
-        logo_path = str(P('logo.png'))
-        if os.path.exists(logo_path):
-            c.drawImage(
-                ImageReader(logo_path),
-                x,
-                y,
-                width=w,
-                height=h,
-                preserveAspectRatio=True,
-                mask="auto",
-            )
-    except Exception as ex:
-        logging.error("Erro ignorado: %s", ex, exc_info=True)
-def gerar_cupom(cliente, produto, qtd, pagamento, total, cpf=None):
-    agora = datetime.datetime.now()
-    pasta_cupons = os.path.join(os.getcwd(), "cupons")
-    os.makedirs(pasta_cupons, exist_ok=True)
-    nome_arquivo = os.path.join(
-        pasta_cupons, f"cupom_{agora.strftime('%Y%m%d_%H%M%S')}.pdf"
-    )
-    c = canvas.Canvas(nome_arquivo, pagesize=A4)
-    logo_path = str(P('logo.png'))
-    _pdf_draw_logo(c, x=40, y=730, w=260, h=90)
-    t = c.beginText(40, 650)
-    t.setFont("Helvetica", 12)
+
+def pdf_documento_curto(nome_arquivo: str, linhas, logo_y: int = 730, y_texto: int = 650, tamanho: int = 12) -> str:
+    """Caminho rápido para documentos de uma página (cupom, OS): logo em cache e um
+    único objeto de texto, sem a contabilidade de paginação do PdfDocumento."""
+    c = _pdf_canvas(nome_arquivo)
+    _pdf_pagina_curta(c, linhas, logo_y, y_texto, tamanho)
+    c.save()
+    return nome_arquivo
+
+
+def _pdf_pagina_curta(c, linhas, logo_y: int = 730, y_texto: int = 650, tamanho: int = 12):
+    _pdf_draw_logo(c, x=40, y=logo_y, w=260, h=90)
+    t = c.beginText(40, y_texto)
+    t.setFont("Helvetica", tamanho)
+    for l in linhas:
+        t.textLine(l)
+    c.drawText(t)
+
+
+def pdf_benchmark_cupons(n: int = 1000, pasta: str = None) -> dict:
+    """Renderiza `n` cupons com o layout real (sem backup, Telegram ou abertura do PDF).
+
+    Retorna {'n', 'primeiro_ms' (inclui importar o reportlab e codificar a logo),
+    'ms_por_cupom' (média dos demais), 'total_s'}. Uso: --benchmark-pdf [N].
+    """
+    n = max(1, int(n))
+    destino = pasta or tempfile.mkdtemp(prefix="bench_cupons_")
+    try:
+        linhas = _cupom_linhas("Cliente Exemplo", "Produto Exemplo", 1, "PIX", 149.9, None, datetime.datetime.now())
+        t0 = time.perf_counter()
+        pdf_documento_curto(os.path.join(destino, "cupom_00000.pdf"), linhas)
+        t1 = time.perf_counter()
+        for i in range(1, n):
+            pdf_documento_curto(os.path.join(destino, f"cupom_{i:05d}.pdf"), linhas)
+        t2 = time.perf_counter()
+    finally:
+        if pasta is None:
+            shutil.rmtree(destino, ignore_errors=True)
+    return {
+        "n": n,
+        "primeiro_ms": (t1 - t0) * 1000.0,
+        "ms_por_cupom": ((t2 - t1) * 1000.0 / (n - 1)) if n > 1 else (t1 - t0) * 1000.0,
+        "total_s": t2 - t0,
+    }
+
+
+def _cupom_linhas(cliente, produto, qtd, pagamento, total, pontos, agora):
+    """Texto do cupom de venda (uma entrada por linha)."""
     linhas = [
         "BESIM COMPANY",
         "----------------------------------------------"
@@ -3388,27 +5819,168 @@ def gerar_cupom(cliente, produto, qtd, pagamento, total, cpf=None):
         f"Quantidade: {qtd}",
         f"Forma de Pagamento: {pagamento}",
         f"Total: R$ {total:.2f}",
-        (f"Pontos acumulados: {get_pontos_cliente(cpf)} pts" if cpf else ""),
+        (f"Pontos acumulados: {pontos} pts" if pontos is not None else ""),
         f"Data: {agora.strftime('%d/%m/%Y')}",
         f"Hora: {agora.strftime('%H:%M:%S')}",
         "----------------------------------------------"
         "----------------------------------------------",
         "Obrigado pela preferência!",
     ]
-    for l in linhas:
-        if l:
-            t.textLine(l)
-    c.drawText(t)
-    c.save()
+    return [l for l in linhas if l]
+
+
+# ===================== CUPONS: ARQUIVO DIÁRIO (opcional) =====================
+# Com CUPOM_ARQUIVO_DIARIO ligado, em vez de um PDF por venda cada cupom vira uma página de
+# cupons/cupons_AAAAMMDD.pdf (logo gravada uma vez por arquivo; ~365 arquivos por ano):
+# - cupons_arquivo guarda venda_id -> (dia, página) e o texto do cupom;
+# - o PDF do dia é regravado em segundo plano a partir do índice (troca atômica: backup,
+#   Drive e visualizador nunca veem arquivo pela metade);
+# - o cupom isolado (abrir / e-mail / Telegram) é renderizado sob demanda, só aquela página,
+#   num arquivo temporário novo a cada pedido, fora de cupons/ (não entra no backup).
+CUPOM_EXTRAIDOS_DIAS = 7
+
+_CUPOM_ARQ_LOCK = threading.Lock()       # numeração das páginas
+_CUPOM_ARQ_PDF_LOCK = threading.Lock()   # regravação do PDF do dia
+_CUPOM_ARQ_PAGINAS = {}                  # dia -> nº de páginas já gravadas no PDF do dia
+
+
+def _cupom_arquivo_pdf(dia_iso: str) -> str:
+    return os.path.join(os.getcwd(), "cupons", f"cupons_{dia_iso.replace('-', '')}.pdf")
+
+
+def _cupom_extraidos_dir() -> str:
+    d = os.path.join(tempfile.gettempdir(), "besim_cupons")
+    os.makedirs(d, exist_ok=True)
+    return d
+
+
+def cupom_arquivar(linhas, venda_id=None, agora=None) -> tuple:
+    """Registra o cupom como próxima página do dia. Retorna (dia_iso, pagina)."""
+    dia = (agora or datetime.datetime.now()).strftime("%Y-%m-%d")
+    c = DB.get()
+    with _CUPOM_ARQ_LOCK:
+        with c:
+            pagina = int(c.execute(
+                "SELECT COALESCE(MAX(pagina),0)+1 FROM cupons_arquivo WHERE dia=?", (dia,)
+            ).fetchone()[0])
+            c.execute(
+                "INSERT INTO cupons_arquivo(venda_id, dia, pagina, linhas, criado_em) VALUES (?,?,?,?,?)",
+                (venda_id, dia, pagina, json.dumps(list(linhas), ensure_ascii=False), now_br()),
+            )
+    return dia, pagina
+
+
+def cupom_arquivo_localizar(venda_id):
+    """(dia_iso, pagina, pdf_do_dia) do cupom da venda (o mais recente, se reemitido) ou None."""
+    r = DB.get().execute(
+        "SELECT dia, pagina FROM cupons_arquivo WHERE venda_id=? ORDER BY id DESC LIMIT 1", (venda_id,)
+    ).fetchone()
+    if not r:
+        return None
+    return r[0], int(r[1]), _cupom_arquivo_pdf(r[0])
+
+
+def cupom_extrair(dia_iso: str, pagina: int) -> str:
+    """PDF de um único cupom arquivado, sempre renderizado de novo a partir do índice (~3 ms).
+
+    Nunca reaproveita um arquivo extraído antes: (dia, página) se repete depois de restaurar
+    um snapshot, e a pasta temporária é compartilhada por qualquer banco da máquina.
+    """
+    r = DB.get().execute(
+        "SELECT id, linhas FROM cupons_arquivo WHERE dia=? AND pagina=?", (dia_iso, int(pagina))
+    ).fetchone()
+    if not r:
+        raise ValueError(f"Cupom não encontrado no arquivo: {dia_iso} página {pagina}")
+    fd, destino = tempfile.mkstemp(
+        prefix=f"cupom_{dia_iso.replace('-', '')}_p{int(pagina):04d}_a{int(r[0])}_",
+        suffix=".pdf", dir=_cupom_extraidos_dir(),
+    )
+    os.close(fd)
     try:
-        backup_pdf(nome_arquivo, "cupons")
-    except Exception as ex:
-        logging.error("Erro ignorado: %s", ex, exc_info=True)
+        pdf_documento_curto(destino, json.loads(r[1]))
+    except Exception:
+        try:
+            os.remove(destino)
+        except OSError:
+            pass
+        raise
+    return destino
+
+
+def cupom_arquivo_reconstruir(dia_iso: str) -> str:
+    """Regrava cupons/cupons_AAAAMMDD.pdf com todas as páginas do índice (no-op se já está em dia)."""
+    destino = _cupom_arquivo_pdf(dia_iso)
+    with _CUPOM_ARQ_PDF_LOCK:
+        paginas = DB.get().execute(
+            "SELECT linhas FROM cupons_arquivo WHERE dia=? ORDER BY pagina", (dia_iso,)
+        ).fetchall()
+        if not paginas or (_CUPOM_ARQ_PAGINAS.get(dia_iso) == len(paginas) and os.path.exists(destino)):
+            return destino
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        tmp = destino + ".tmp"
+        c = _pdf_canvas(tmp)
+        for (linhas,) in paginas:
+            _pdf_pagina_curta(c, json.loads(linhas))
+            c.showPage()
+        c.save()
+        try:
+            os.replace(tmp, destino)
+        except PermissionError as ex:
+            # Windows: PDF do dia aberto num visualizador; a próxima venda tenta de novo
+            logging.warning("PDF do dia %s em uso, não regravado agora: %s", dia_iso, ex)
+            return destino
+        _CUPOM_ARQ_PAGINAS[dia_iso] = len(paginas)
+    backup_pdf(destino, "cupons")
+    _cupom_extraidos_limpar()
+    return destino
+
+
+def _cupom_extraidos_limpar():
+    limite = time.time() - CUPOM_EXTRAIDOS_DIAS * 86400
     try:
-        open_in_default_app(nome_arquivo)
+        for n in os.listdir(_cupom_extraidos_dir()):
+            p = os.path.join(_cupom_extraidos_dir(), n)
+            if os.path.getmtime(p) < limite:
+                os.remove(p)
     except Exception as ex:
         logging.error("Erro ignorado: %s", ex, exc_info=True)
-    bring_app_to_front()
+
+
+def _cupom_nome_livre(pasta: str, agora, venda_id=None) -> str:
+    """cupom_AAAAMMDD_HHMMSS[_v<id>].pdf sem sobrescrever outro cupom do mesmo segundo."""
+    base = f"cupom_{agora.strftime('%Y%m%d_%H%M%S')}" + (f"_v{venda_id}" if venda_id is not None else "")
+    nome = os.path.join(pasta, base + ".pdf")
+    n = 2
+    while os.path.exists(nome):
+        nome = os.path.join(pasta, f"{base}_{n}.pdf")
+        n += 1
+    return nome
+# ===================== FIM CUPONS: ARQUIVO DIÁRIO =====================
+
+
+def gerar_cupom(cliente, produto, qtd, pagamento, total, cpf=None, abrir_pdf: bool = True, venda_id=None):
+    agora = datetime.datetime.now()
+    pontos = get_pontos_cliente(cpf) if cpf else None
+    linhas = _cupom_linhas(cliente, produto, qtd, pagamento, total, pontos, agora)
+    if CUPOM_ARQUIVO_DIARIO:
+        dia, pagina = cupom_arquivar(linhas, venda_id, agora)
+        nome_arquivo = cupom_extrair(dia, pagina)
+        JOBS.submit(cupom_arquivo_reconstruir, dia)
+    else:
+        pasta_cupons = os.path.join(os.getcwd(), "cupons")
+        os.makedirs(pasta_cupons, exist_ok=True)
+        nome_arquivo = _cupom_nome_livre(pasta_cupons, agora, venda_id)
+        pdf_documento_curto(nome_arquivo, linhas)
+        try:
+            backup_pdf(nome_arquivo, "cupons")
+        except Exception as ex:
+            logging.error("Erro ignorado: %s", ex, exc_info=True)
+    if abrir_pdf:
+        try:
+            open_in_default_app(nome_arquivo)
+        except Exception as ex:
+            logging.error("Erro ignorado: %s", ex, exc_info=True)
+        bring_app_to_front()
     return nome_arquivo
 
 def gerar_os_pdf(os_num, nome, cpf, telefone, descricao, valor, abrir_pdf: bool = True, imprimir_termica: bool = False):
@@ -3416,12 +5988,6 @@ def gerar_os_pdf(os_num, nome, cpf, telefone, descricao, valor, abrir_pdf: bool
     pasta_os = os.path.join(os.getcwd(), "OS")
     os.makedirs(pasta_os, exist_ok=True)
     nome_arquivo = os.path.join(pasta_os, f"OS_{os_num}.pdf")
-    c = canvas.Canvas(nome_arquivo, pagesize=A4)
-    logo_path = str(P('logo.png'))
-    _pdf_draw_logo(c, x=40, y=730, w=260, h=90)
-    t = c.beginText(40, 650)
-    t.setFont("Helvetica", 12)
-
     linhas = [
         "BESIM COMPANY - ORDEM DE SERVIÇO",
         "----------------------------------------------"
@@ -3445,10 +6011,7 @@ def gerar_os_pdf(os_num, nome, cpf, telefone, descricao, valor, abrir_pdf: bool
         "----------------------------------------------"
         "----------------------------------------------",
     ]
-    for l in linhas:
-        t.textLine(l)
-    c.drawText(t)
-    c.save()
+    pdf_documento_curto(nome_arquivo, linhas)
     try:
         backup_pdf(nome_arquivo, "OS")
     except Exception as ex:
@@ -3471,98 +6034,47 @@ def gerar_os_pdf(os_num, nome, cpf, telefone, descricao, valor, abrir_pdf: bool
     return nome_arquivo
 # ================= RELATÓRIO VENDAS (PDF) =================
 def gerar_relatorio_vendas_dia_pdf(data_str: str = None, abrir_pdf: bool = True):
+    cursor = DB.cur()  # conexão da thread atual (pode rodar fora do Tk)
     hoje = today_br()
     data_alvo = data_str or hoje
+    iso_alvo = _br_to_iso(data_alvo) or data_alvo
     pasta_rel = os.path.join(os.getcwd(), "relatorios")
     os.makedirs(pasta_rel, exist_ok=True)
     nome_arquivo = os.path.join(
         pasta_rel, f"relatorio_vendas_{data_alvo.replace('/', '-')}" + ".pdf"
     )
-    c = canvas.Canvas(nome_arquivo, pagesize=A4)
-    logo_path_local = str(P('logo.png'))
-    _pdf_draw_logo(c, x=40, y=740, w=260, h=90)
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(40, 720, f"Relatório de Vendas - {data_alvo}")
-    c.setFont("Helvetica", 11)
-    c.drawString(40, 702, "-" * 110)
-    y = 680
+    doc = PdfDocumento(nome_arquivo, f"Relatório de Vendas - {data_alvo}")
     # Vendas do dia
     cursor.execute(
-        "SELECT hora, cliente, produto, quantidade, pagamento, total FROM vendas WHERE data=? ORDER BY hora DESC",
-        (data_alvo,),
+        "SELECT hora, cliente, produto, quantidade, pagamento, total FROM vendas WHERE data_iso=? ORDER BY hora DESC",
+        (iso_alvo,),
     )
     linhas = cursor.fetchall()
     totais_pg = {"PIX": 0.0, "Cartão": 0.0, "Dinheiro": 0.0, "OUTROS": 0.0}
     total_dia = 0.0
-    c.setFont("Helvetica", 10)
-    if not linhas:
-        c.drawString(40, y, "Nenhuma venda registrada neste dia.")
-        y -= 18
-    else:
-        c.setFont("Helvetica-Bold", 10)
-        c.drawString(40, y, "Hora")
-        c.drawString(90, y, "Cliente")
-        c.drawString(250, y, "Produto")
-        c.drawString(420, y, "Qtd")
-        c.drawString(455, y, "Pagto")
-        c.drawString(520, y, "Total")
-        y -= 16
-        c.setFont("Helvetica", 10)
-        for hora, cliente, produto, qtd, pagamento, total in linhas:
-            total_dia += total or 0.0
-            if pagamento in totais_pg:
-                totais_pg[pagamento] += total or 0.0
-            else:
-                totais_pg["OUTROS"] += total or 0.0
-            c.drawString(40, y, str(hora))
-            c.drawString(90, y, str(cliente)[:24])
-            c.drawString(250, y, str(produto)[:24])
-            c.drawString(420, y, str(qtd))
-            c.drawString(455, y, str(pagamento))
-            c.drawRightString(590, y, f"R$ {float(total):.2f}")
-            y -= 16
-            if y < 60:
-                c.showPage()
-                _pdf_draw_logo(c, x=40, y=740, w=260, h=90)
-                c.setFont("Helvetica-Bold", 12)
-                c.drawString(40, 720, f"Relatório de Vendas - {data_alvo}")
-                c.setFont("Helvetica", 11)
-                c.drawString(40, 702, "-" * 110)
-                y = 680
-                c.setFont("Helvetica-Bold", 10)
-                c.drawString(40, y, "Hora")
-                c.drawString(90, y, "Cliente")
-                c.drawString(250, y, "Produto")
-                c.drawString(420, y, "Qtd")
-                c.drawString(455, y, "Pagto")
-                c.drawString(520, y, "Total")
-                y -= 16
-                c.setFont("Helvetica", 10)
+    for _hora, _cliente, _produto, _qtd, pagamento, total in linhas:
+        total_dia += total or 0.0
+        totais_pg[pagamento if pagamento in totais_pg else "OUTROS"] += total or 0.0
+    doc.tabela(
+        [PdfColuna("Hora", 40), PdfColuna("Cliente", 90, max_chars=24), PdfColuna("Produto", 250, max_chars=24),
+         PdfColuna("Qtd", 420), PdfColuna("Pagto", 455), PdfColuna("Total", 590, alinhar="e")],
+        [(hora, cliente, produto, qtd, pagamento, f"R$ {float(total):.2f}")
+         for hora, cliente, produto, qtd, pagamento, total in linhas],
+        vazio="Nenhuma venda registrada neste dia.",
+    )
     # Totais por forma de pagamento
-    y -= 8
-    c.setFont("Helvetica", 11)
-    c.drawString(40, y, "-" * 110)
-    y -= 18
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(40, y, "Totais por Forma de Pagamento:")
-    y -= 18
-    c.setFont("Helvetica", 11)
+    doc.espaco(8)
+    doc.garantir(140)  # bloco inteiro na mesma página
+    doc.regua()
+    doc.linha("Totais por Forma de Pagamento:", negrito=True, tamanho=11, passo=18)
     for k in ["PIX", "Cartão", "Dinheiro", "OUTROS"]:
-        c.drawString(40, y, f"{k}: R$ {totais_pg[k]:.2f}")
-        y -= 18
-    y -= 6
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(40, y, f"Total de vendas do dia: R$ {total_dia:.2f}")
-    y -= 24
+        doc.linha(f"{k}: R$ {totais_pg[k]:.2f}", tamanho=11, passo=18)
+    doc.espaco(6)
+    doc.linha(f"Total de vendas do dia: R$ {total_dia:.2f}", negrito=True, tamanho=12, passo=24)
 
     # ----------------- FECHAMENTO EXPLICADO: Entradas por origem -----------------
     # Este bloco detalha as entradas do dia por categoria e faz uma conferência rápida.
     try:
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(40, y, "Entradas no Caixa (por origem)")
-        y -= 18
-        c.setFont("Helvetica", 10)
-
         def _classificar_motivo_rel(vlr, mot):
             mtxt = (mot or '').strip()
             low = mtxt.lower()
@@ -3583,7 +6095,7 @@ def gerar_relatorio_vendas_dia_pdf(data_str: str = None, abrir_pdf: bool = True)
             return 'Outros'
 
         # Lançamentos do CAIXA do dia
-        cursor.execute("SELECT COALESCE(valor,0), COALESCE(motivo,'') FROM caixa WHERE data=?", (data_alvo,))
+        cursor.execute("SELECT COALESCE(valor,0), COALESCE(motivo,'') FROM caixa WHERE data_iso=?", (iso_alvo,))
         rows_cx = cursor.fetchall() or []
 
         soma_pos = { 'Venda': 0.0, 'Manutenção': 0.0, 'Devedor': 0.0, 'Upgrade': 0.0, 'Outros': 0.0, 'Estorno': 0.0 }
@@ -3599,10 +6111,10 @@ def gerar_relatorio_vendas_dia_pdf(data_str: str = None, abrir_pdf: bool = True)
                 saidas_cx_abs += abs(v)
 
         # Fontes oficiais (para explicar melhor)
-        cursor.execute("SELECT COALESCE(SUM(total),0) FROM vendas WHERE data=?", (data_alvo,))
+        cursor.execute("SELECT COALESCE(SUM(total),0) FROM vendas_diario WHERE dia=?", (iso_alvo,))
         vendas_oficial = float((cursor.fetchone() or [0])[0] or 0.0)
 
-        cursor.execute("SELECT COALESCE(SUM(valor),0), COUNT(1) FROM manutencao WHERE COALESCE(aprovado,0)=1 AND data=?", (data_alvo,))
+        cursor.execute("SELECT COALESCE(SUM(valor),0), COUNT(1) FROM manutencao WHERE data_iso=? AND COALESCE(aprovado,0)=1", (iso_alvo,))
         os_sum, os_cnt = cursor.fetchone() or (0, 0)
         os_sum = float(os_sum or 0.0)
         os_cnt = int(os_cnt or 0)
@@ -3612,112 +6124,59 @@ def gerar_relatorio_vendas_dia_pdf(data_str: str = None, abrir_pdf: bool = True)
         dev_sum = float(dev_sum or 0.0)
         dev_cnt = int(dev_cnt or 0)
 
-        c.drawString(40, y, f"1) Vendas do dia (tabela VENDAS): R$ {vendas_oficial:.2f}")
-        y -= 14
-        c.drawString(40, y, f"2) OS aprovadas (qtd {os_cnt}): R$ {os_sum:.2f}")
-        y -= 14
-        c.drawString(40, y, f"3) Devedores pagos (qtd {dev_cnt}): R$ {dev_sum:.2f}")
-        y -= 14
-        c.drawString(40, y, f"4) Upgrade (tabela CAIXA): R$ {float(soma_pos.get('Upgrade',0.0)):.2f}")
-        y -= 14
-        c.drawString(40, y, f"5) Outras entradas (tabela CAIXA): R$ {float(soma_pos.get('Outros',0.0)):.2f}")
-        y -= 16
-
         entradas_explicadas = float(vendas_oficial + os_sum + dev_sum + float(soma_pos.get('Upgrade',0.0)) + float(soma_pos.get('Outros',0.0)))
-        c.setFont("Helvetica-Bold", 11)
-        c.drawString(40, y, f"TOTAL DE ENTRADAS (explicado): R$ {entradas_explicadas:.2f}")
-        y -= 18
-        c.setFont("Helvetica", 10)
-        c.drawString(40, y, "Conferência rápida com lançamentos do CAIXA:")
-        y -= 14
-        c.drawString(60, y, f"• Entradas no CAIXA (valor > 0): R$ {entradas_cx:.2f}")
-        y -= 14
-        c.drawString(60, y, f"• Saídas no CAIXA (valor < 0): R$ {saidas_cx_abs:.2f}")
-        y -= 14
-        c.drawString(60, y, f"• Saldo do CAIXA (Entradas - Saídas): R$ {(entradas_cx - saidas_cx_abs):.2f}")
-        y -= 18
-        c.drawString(40, y, "Obs.: o \"Total líquido do caixa\" ao final do relatório considera os lançamentos do CAIXA do dia.")
-        y -= 18
-
-        if y < 120:
-            c.showPage()
-            _pdf_draw_logo(c, x=40, y=740, w=260, h=90)
-            c.setFont("Helvetica-Bold", 12)
-            c.drawString(40, 760, f"Relatório de Vendas - {data_alvo} (continuação)")
-            c.setFont("Helvetica", 11)
-            c.drawString(40, 702, "-" * 110)
-            y = 680
+        doc.garantir(190)  # bloco inteiro na mesma página
+        doc.linha("Entradas no Caixa (por origem)", negrito=True, tamanho=12, passo=18)
+        doc.linha(f"1) Vendas do dia (tabela VENDAS): R$ {vendas_oficial:.2f}", passo=14)
+        doc.linha(f"2) OS aprovadas (qtd {os_cnt}): R$ {os_sum:.2f}", passo=14)
+        doc.linha(f"3) Devedores pagos (qtd {dev_cnt}): R$ {dev_sum:.2f}", passo=14)
+        doc.linha(f"4) Upgrade (tabela CAIXA): R$ {float(soma_pos.get('Upgrade',0.0)):.2f}", passo=14)
+        doc.linha(f"5) Outras entradas (tabela CAIXA): R$ {float(soma_pos.get('Outros',0.0)):.2f}", passo=16)
+        doc.linha(f"TOTAL DE ENTRADAS (explicado): R$ {entradas_explicadas:.2f}", negrito=True, tamanho=11, passo=18)
+        doc.linha("Conferência rápida com lançamentos do CAIXA:", passo=14)
+        doc.linha(f"• Entradas no CAIXA (valor > 0): R$ {entradas_cx:.2f}", x=60, passo=14)
+        doc.linha(f"• Saídas no CAIXA (valor < 0): R$ {saidas_cx_abs:.2f}", x=60, passo=14)
+        doc.linha(f"• Saldo do CAIXA (Entradas - Saídas): R$ {(entradas_cx - saidas_cx_abs):.2f}", x=60, passo=18)
+        doc.linha("Obs.: o \"Total líquido do caixa\" ao final do relatório considera os lançamentos do CAIXA do dia.", passo=18)
     except Exception as ex:
         logging.error("Erro ignorado: %s", ex, exc_info=True)
     # -----------------------------------------------------------------------------
 
     # Saídas do dia
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(40, y, "Saídas do dia")
-    y -= 18
-    c.setFont("Helvetica", 11)
+    doc.garantir(60)
+    doc.linha("Saídas do dia", negrito=True, tamanho=12, passo=18)
     # >>> Consulta compatível com colunas hora/motivo criadas na migração
     cursor.execute(
-        "SELECT hora, motivo, valor FROM caixa WHERE data=? AND valor<0 ORDER BY hora DESC",
-        (data_alvo,),
+        "SELECT hora, motivo, valor FROM caixa WHERE data_iso=? AND valor<0 ORDER BY hora DESC",
+        (iso_alvo,),
     )
     saidas = cursor.fetchall()
-    total_saidas = 0.0
-    if not saidas:
-        c.drawString(40, y, "Nenhuma saída registrada neste dia.")
-        y -= 18
-    else:
-        c.setFont("Helvetica-Bold", 10)
-        c.drawString(40, y, "Hora")
-        c.drawString(100, y, "Motivo")
-        c.drawString(520, y, "Valor")
-        y -= 16
-        c.setFont("Helvetica", 10)
-        for hora_s, motivo_s, valor_s in saidas:
-            if y < 60:
-                c.showPage()
-                _pdf_draw_logo(c, x=40, y=740, w=260, h=90)
-                c.setFont("Helvetica-Bold", 12)
-                c.drawString(40, 720, f"Relatório de Vendas - {data_alvo}")
-                c.setFont("Helvetica", 11)
-                c.drawString(40, 702, "-" * 110)
-                y = 680
-                c.setFont("Helvetica-Bold", 12)
-                c.drawString(40, y, "Saídas do dia (continuação)")
-                y -= 18
-                c.setFont("Helvetica-Bold", 10)
-                c.drawString(40, y, "Hora")
-                c.drawString(100, y, "Motivo")
-                c.drawString(520, y, "Valor")
-                y -= 16
-                c.setFont("Helvetica", 10)
-            hora_txt = str(hora_s or "--:--:--")
-            motivo_txt = str(motivo_s or "(sem motivo)")[:48]
-            c.drawString(40, y, hora_txt)
-            c.drawString(100, y, motivo_txt)
-            c.drawRightString(590, y, f"R$ {abs(float(valor_s)):.2f}")
-            total_saidas += abs(float(valor_s))
-            y -= 16
+    total_saidas = sum(abs(float(valor_s)) for _h, _m, valor_s in saidas)
+    doc.tabela(
+        [PdfColuna("Hora", 40), PdfColuna("Motivo", 100, max_chars=48), PdfColuna("Valor", 590, alinhar="e")],
+        [(str(hora_s or "--:--:--"), str(motivo_s or "(sem motivo)"), f"R$ {abs(float(valor_s)):.2f}")
+         for hora_s, motivo_s, valor_s in saidas],
+        vazio="Nenhuma saída registrada neste dia.",
+        continuacao="Saídas do dia (continuação)",
+    )
     # Resumo do caixa
-    c.setFont("Helvetica", 11)
-    c.drawString(40, y, "-" * 110)
-    y -= 18
-    cursor.execute("SELECT SUM(valor) FROM caixa WHERE data=?", (data_alvo,))
+    cursor.execute("SELECT SUM(valor) FROM caixa WHERE data_iso=?", (iso_alvo,))
     total_liquido = cursor.fetchone()[0] or 0.0
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(40, y, f"Total de saídas: R$ {total_saidas:.2f}")
-    y -= 18
-    c.drawString(40, y, f"Total líquido do caixa: R$ {total_liquido:.2f}")
-    c.save()
+    doc.garantir(36)
+    doc.regua()
+    doc.linha(f"Total de saídas: R$ {total_saidas:.2f}", negrito=True, tamanho=12, passo=18)
+    doc.linha(f"Total líquido do caixa: R$ {total_liquido:.2f}", negrito=True, tamanho=12)
+    doc.salvar()
     try:
         backup_pdf(nome_arquivo, "relatorios")
     except Exception as ex:
         logging.error("Erro ignorado: %s", ex, exc_info=True)
-    try:
-        open_in_default_app(nome_arquivo)
-    except Exception as ex:
-        logging.error("Erro ignorado: %s", ex, exc_info=True)
-    bring_app_to_front()
+    if abrir_pdf:
+        try:
+            open_in_default_app(nome_arquivo)
+        except Exception as ex:
+            logging.error("Erro ignorado: %s", ex, exc_info=True)
+        bring_app_to_front()
     return nome_arquivo
 
 
@@ -3735,6 +6194,7 @@ def gerar_relatorio_vendas_mes_pdf(ano: int = None, mes: int = None, top_n: int
 
     Retorna o caminho do PDF.
     """
+    cursor = DB.cur()  # conexão da thread atual (pode rodar fora do Tk)
     hoje_dt = datetime.date.today()
     ano = int(ano or hoje_dt.year)
     mes = int(mes or hoje_dt.month)
@@ -3744,27 +6204,20 @@ def gerar_relatorio_vendas_mes_pdf(ano: int = None, mes: int = None, top_n: int
     os.makedirs(pasta_rel, exist_ok=True)
     nome_arquivo = os.path.join(pasta_rel, f"relatorio_vendas_mensal_{ano:04d}-{mes:02d}.pdf")
 
-    mm = f"{mes:02d}"
-    yyyy = f"{ano:04d}"
+    iso_ini, iso_fim = _iso_range_mes(ano, mes)
 
-    # Totais por dia / pagamentos / ranking (robusto para datas com/sem zero à esquerda)
+    # Totais por dia / pagamentos / ranking (data_iso já normaliza datas com/sem zero à esquerda)
     total_por_data = {}
     totais_pg = {"PIX": 0.0, "Cartão": 0.0, "Dinheiro": 0.0, "OUTROS": 0.0}
     prod_stats = {}  # {produto: {qtd:int, valor:float}}
 
-    # Vendas do ano (filtra por mês/ano em Python para aceitar formatos antigos)
+    # Vendas do mês (resumo diário pré-agregado)
     cursor.execute(
-        "SELECT data, COALESCE(total,0), pagamento, produto, COALESCE(quantidade,0) FROM vendas WHERE data LIKE ?",
-        (f"%/{yyyy}",),
+        "SELECT dia, total, pagamento, produto, quantidade FROM vendas_diario WHERE dia >= ? AND dia < ?",
+        (iso_ini, iso_fim),
     )
-    for data_raw, tot_raw, pg_raw, prod_raw, qtd_raw in (cursor.fetchall() or []):
-        dmY = _parse_br_date_flex(data_raw)
-        if not dmY:
-            continue
-        d, mo, y = dmY
-        if y != ano or mo != mes:
-            continue
-        key = f"{d:02d}/{mo:02d}/{y:04d}"
+    for data_iso, tot_raw, pg_raw, prod_raw, qtd_raw in (cursor.fetchall() or []):
+        key = f"{data_iso[8:10]}/{mes:02d}/{ano:04d}"
         v = float(tot_raw or 0.0)
         total_por_data[key] = float(total_por_data.get(key, 0.0) + v)
 
@@ -3800,16 +6253,10 @@ def gerar_relatorio_vendas_mes_pdf(ano: int = None, mes: int = None, top_n: int
     qtd_os = 0
     qtd_os_aprov = 0
     cursor.execute(
-        "SELECT data, COALESCE(valor,0), COALESCE(aprovado,0) FROM manutencao WHERE data LIKE ?",
-        (f"%/{yyyy}",),
+        "SELECT COALESCE(valor,0), COALESCE(aprovado,0) FROM manutencao WHERE data_iso >= ? AND data_iso < ?",
+        (iso_ini, iso_fim),
     )
-    for data_raw, val_raw, aprov_raw in (cursor.fetchall() or []):
-        dmY = _parse_br_date_flex(data_raw)
-        if not dmY:
-            continue
-        d, mo, y = dmY
-        if y != ano or mo != mes:
-            continue
+    for val_raw, aprov_raw in (cursor.fetchall() or []):
         try:
             val = float(val_raw or 0.0)
         except Exception:
@@ -3834,7 +6281,8 @@ def gerar_relatorio_vendas_mes_pdf(ano: int = None, mes: int = None, top_n: int
     chart_path = os.path.join(pasta_rel, f"_chart_vendas_{ano:04d}{mes:02d}.png")
     chart_ok = False
     try:
-        if _HAS_MPL and plt is not None:
+        plt = _pyplot()
+        if plt is not None:
             xticks = dias if last_day <= 15 else list(range(1, last_day + 1, 2))
             fig = plt.figure(figsize=(10.2, 3.8), dpi=170)
             ax = fig.add_subplot(111)
@@ -3854,38 +6302,25 @@ def gerar_relatorio_vendas_mes_pdf(ano: int = None, mes: int = None, top_n: int
         chart_ok = False
 
     # Monta PDF
-    c = canvas.Canvas(nome_arquivo, pagesize=A4)
-    logo_path_local = str(P('logo.png'))
-    _pdf_draw_logo(c, x=40, y=740, w=260, h=90)
-    c.setFont("Helvetica-Bold", 13)
-    c.drawString(40, 720, f"Relatório Mensal de Vendas — {mes:02d}/{ano:04d}")
-    c.setFont("Helvetica", 11)
-    c.drawString(40, 702, "-" * 110)
+    doc = PdfDocumento(nome_arquivo, f"Relatório Mensal de Vendas — {mes:02d}/{ano:04d}", tamanho_titulo=13, rodape=110)
+    c = doc.c
     # Resumo
-    y = 680
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(40, y, f"Total do mês (vendas): R$ {total_mes:.2f}")
-    y -= 16
-    c.setFont("Helvetica", 11)
-    c.drawString(
-        40, y,
-        f"Manutenções (OS): R$ {valor_total_os:.2f}  |  Aprovadas: R$ {valor_total_os_aprov:.2f}  |  OS: {qtd_os} (Aprov.: {qtd_os_aprov})"
+    doc.linha(f"Total do mês (vendas): R$ {total_mes:.2f}", negrito=True, tamanho=12)
+    doc.linha(
+        f"Manutenções (OS): R$ {valor_total_os:.2f}  |  Aprovadas: R$ {valor_total_os_aprov:.2f}  |  OS: {qtd_os} (Aprov.: {qtd_os_aprov})",
+        tamanho=11,
     )
-    y -= 16
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(40, y, f"TOTAL GERAL (vendas + manutenções aprovadas): R$ {total_geral_mes:.2f}")
-    y -= 18
-    c.setFont("Helvetica", 11)
-    c.drawString(
-        40, y,
+    doc.linha(f"TOTAL GERAL (vendas + manutenções aprovadas): R$ {total_geral_mes:.2f}", negrito=True, tamanho=12, passo=18)
+    doc.linha(
         f"PIX: R$ {totais_pg['PIX']:.2f}   |   Cartão: R$ {totais_pg['Cartão']:.2f}   |   "
-        f"Dinheiro: R$ {totais_pg['Dinheiro']:.2f}   |   Outros: R$ {totais_pg['OUTROS']:.2f}"
+        f"Dinheiro: R$ {totais_pg['Dinheiro']:.2f}   |   Outros: R$ {totais_pg['OUTROS']:.2f}",
+        tamanho=11,
     )
 
     # Gráfico
     if chart_ok:
         try:
-            c.drawImage(ImageReader(chart_path), 40, 395, width=520, height=220,
+            c.drawImage(_reportlab().ImageReader(chart_path), 40, 395, width=520, height=220,
                         preserveAspectRatio=True, mask="auto")
         except Exception:
             chart_ok = False
@@ -3895,76 +6330,36 @@ def gerar_relatorio_vendas_mes_pdf(ano: int = None, mes: int = None, top_n: int
         c.drawString(40, 625, "(Gráfico indisponível — matplotlib não encontrado. Relatório gerado sem gráfico.)")
 
     # Ranking
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(40, 375, f"Ranking TOP {top_n} de produtos (por valor vendido)")
-    c.setFont("Helvetica", 10)
-    c.drawString(40, 363, "#")
-    c.drawString(60, 363, "Produto")
-    c.drawString(400, 363, "Qtd")
-    c.drawString(520, 363, "Valor")
-    c.drawString(40, 357, "-" * 110)
-
-    y = 341
-    c.setFont("Helvetica", 10)
-    if not ranking:
-        c.drawString(40, y, "Nenhuma venda registrada neste mês.")
-        y -= 14
-    else:
-        for idx, (produto, qtd_total, valor_total) in enumerate(ranking, start=1):
-            prod_txt = str(produto or "(sem produto)")
-            if len(prod_txt) > 48:
-                prod_txt = prod_txt[:45] + "..."
-            c.drawString(40, y, str(idx))
-            c.drawString(60, y, prod_txt)
-            c.drawRightString(455, y, str(int(qtd_total or 0)))
-            c.drawRightString(590, y, f"R$ {float(valor_total or 0.0):.2f}")
-            y -= 14
-            if y < 110:
-                c.showPage()
-                _pdf_draw_logo(c, x=40, y=740, w=260, h=90)
-                c.setFont("Helvetica-Bold", 13)
-                c.drawString(40, 720, f"Relatório Mensal de Vendas — {mes:02d}/{ano:04d} (continuação)")
-                c.setFont("Helvetica", 11)
-                c.drawString(40, 702, "-" * 110)
-                c.setFont("Helvetica-Bold", 11)
-                c.drawString(40, 730, f"Ranking TOP {top_n} de produtos (por valor vendido)")
-                c.setFont("Helvetica", 10)
-                c.drawString(40, 718, "#")
-                c.drawString(60, 718, "Produto")
-                c.drawString(400, 718, "Qtd")
-                c.drawString(520, 718, "Valor")
-                c.drawString(40, 712, "-" * 110)
-                y = 696
+    doc.y = 375
+    doc.linha(f"Ranking TOP {top_n} de produtos (por valor vendido)", negrito=True, tamanho=11, passo=12)
+    linhas_rank = []
+    for idx, (produto, qtd_total, valor_total) in enumerate(ranking, start=1):
+        prod_txt = str(produto or "(sem produto)")
+        if len(prod_txt) > 48:
+            prod_txt = prod_txt[:45] + "..."
+        linhas_rank.append((idx, prod_txt, int(qtd_total or 0), f"R$ {float(valor_total or 0.0):.2f}"))
+    doc.tabela(
+        [PdfColuna("#", 40), PdfColuna("Produto", 60), PdfColuna("Qtd", 455, alinhar="e", x_titulo=400),
+         PdfColuna("Valor", 590, alinhar="e")],
+        linhas_rank,
+        vazio="Nenhuma venda registrada neste mês.",
+        continuacao=f"Ranking TOP {top_n} de produtos (por valor vendido)",
+        passo=14, regua=True,
+    )
 
     # Totais por dia (tabela)
-    if y < 140:
-        c.showPage()
-        _pdf_draw_logo(c, x=40, y=740, w=260, h=90)
-        c.setFont("Helvetica-Bold", 13)
-        c.drawString(40, 720, f"Relatório Mensal de Vendas — {mes:02d}/{ano:04d} (totais por dia)")
-        c.setFont("Helvetica", 11)
-        c.drawString(40, 702, "-" * 110)
-        y = 730
-
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(40, y, "Totais por dia")
-    y -= 12
-    c.setFont("Helvetica", 10)
-    c.drawString(40, y, "Data")
-    c.drawString(160, y, "Total")
-    y -= 6
-    c.drawString(40, y, "-" * 110)
-    y -= 14
-
-    for dt, val in zip(datas, valores):
-        c.drawString(40, y, dt)
-        c.drawRightString(220, y, f"R$ {float(val):.2f}")
-        y -= 14
-        if y < 60:
-            c.showPage()
-            y = 780
+    doc.rodape = 60
+    doc.espaco(10)
+    doc.garantir(80)
+    doc.linha("Totais por dia", negrito=True, tamanho=11, passo=12)
+    doc.tabela(
+        [PdfColuna("Data", 40), PdfColuna("Total", 220, alinhar="e", x_titulo=160)],
+        [(dt, f"R$ {float(val):.2f}") for dt, val in zip(datas, valores)],
+        continuacao="Totais por dia",
+        passo=14, regua=True,
+    )
 
-    c.save()
+    doc.salvar()
 
     # Limpa png temporário
     try:
@@ -3976,11 +6371,12 @@ def gerar_relatorio_vendas_mes_pdf(ano: int = None, mes: int = None, top_n: int
         backup_pdf(nome_arquivo, "relatorios")
     except Exception as ex:
         logging.error("Erro ignorado: %s", ex, exc_info=True)
-    try:
-        open_in_default_app(nome_arquivo)
-    except Exception as ex:
-        logging.error("Erro ignorado: %s", ex, exc_info=True)
-    bring_app_to_front()
+    if abrir_pdf:
+        try:
+            open_in_default_app(nome_arquivo)
+        except Exception as ex:
+            logging.error("Erro ignorado: %s", ex, exc_info=True)
+        bring_app_to_front()
     return nome_arquivo
 # ================= FORMATAÇÃO CPF/TELEFONE/MOEDA =================
 def formatar_cpf(event, entry):
@@ -4023,8 +6419,9 @@ def formatar_moeda(event, entry):
 
 
 # ================= DASHBOARD (Resumo / KPIs) =================
-# Aba inicial com indicadores e mini-gráfico (sparkline) opcional via matplotlib.
+# Aba inicial com indicadores e mini-gráfico (sparkline) desenhado num tk.Canvas.
 # Não altera regras do sistema; apenas consome as tabelas existentes.
+# Os KPIs são calculados por DASHBOARD (JOBS); a UI só aplica o snapshot pronto.
 
 def _dash_fmt_brl(valor: float) -> str:
     """Formata número para Real (pt-BR) sem depender de locale."""
@@ -4050,25 +6447,27 @@ def calcular_totais_dia(data_str: str = None):
     - saidas_dia: soma absoluta das saídas (tabela caixa, valor < 0)
     - total_caixa_dia: vendas_dia + outras_entradas_dia - saidas_dia
     """
+    cursor = DB.cur()
     data_str = data_str or today_br()
+    data_iso = _br_to_iso(data_str) or data_str
 
     # Vendas do dia (tabela vendas)
     try:
-        cursor.execute("SELECT COALESCE(SUM(total),0) FROM vendas WHERE data=?", (data_str,))
+        cursor.execute("SELECT COALESCE(SUM(total),0) FROM vendas_diario WHERE dia=?", (data_iso,))
         vendas_dia = float((cursor.fetchone() or [0])[0] or 0.0)
     except Exception:
         vendas_dia = 0.0
 
     # Outras entradas (tabela caixa, valores positivos)
     try:
-        cursor.execute("SELECT COALESCE(SUM(valor),0) FROM caixa WHERE data=? AND valor > 0", (data_str,))
+        cursor.execute("SELECT COALESCE(SUM(valor),0) FROM caixa WHERE data_iso=? AND valor > 0", (data_iso,))
         outras_entradas_dia = float((cursor.fetchone() or [0])[0] or 0.0)
     except Exception:
         outras_entradas_dia = 0.0
 
     # Saídas (tabela caixa, valores negativos)
     try:
-        cursor.execute("SELECT COALESCE(SUM(valor),0) FROM caixa WHERE data=? AND valor < 0", (data_str,))
+        cursor.execute("SELECT COALESCE(SUM(valor),0) FROM caixa WHERE data_iso=? AND valor < 0", (data_iso,))
         saidas_neg = float((cursor.fetchone() or [0])[0] or 0.0)
         saidas_dia = abs(saidas_neg)
     except Exception:
@@ -4081,16 +6480,6 @@ def calcular_totais_dia(data_str: str = None):
 
 
 
-def _dash_datas_ultimos_dias(n: int = 7):
-    hoje = datetime.date.today()
-    return [(hoje - datetime.timedelta(days=i)).strftime("%d/%m/%Y") for i in range(int(n))][::-1]
-
-
-def _dash_mes_ano_atual():
-    hoje = datetime.date.today()
-    return f"{hoje.month:02d}", f"{hoje.year:04d}"
-
-
 def _dash_criar_card(parent, titulo: str, valor_inicial: str = "—", subtitulo: str = ""):
     """Card simples estilo KPI."""
     card = ttk.Frame(parent, padding=12)
@@ -4104,39 +6493,231 @@ def _dash_criar_card(parent, titulo: str, valor_inicial: str = "—", subtitulo:
     return card, lbl_v, lbl_s
 
 
-def _dash_gerar_sparkline_img(valores, width: int = 260, height: int = 60):
-    """Gera uma sparkline como PhotoImage (ou None)."""
+def _dash_misturar_cor(cor: str, fundo: str, alfa: float) -> str:
+    """`cor` com opacidade `alfa` sobre `fundo` (#rrggbb); o Canvas do Tk não tem alpha."""
     try:
-        if not globals().get('_HAS_MPL') or globals().get('plt') is None:
-            return None
-        plt_mod = globals().get('plt')
-        fig = plt_mod.figure(figsize=(max(1, width) / 100.0, max(1, height) / 100.0), dpi=100)
-        ax = fig.add_subplot(111)
-        xs = list(range(len(valores)))
-        ax.plot(xs, valores, linewidth=2.0, color="#2563eb")
-        ax.fill_between(xs, valores, alpha=0.15, color="#2563eb")
-        ax.set_axis_off()
-        fig.tight_layout(pad=0)
-        buf = BytesIO()
-        fig.savefig(buf, format="png", transparent=True)
-        try:
-            plt_mod.close(fig)
-        except Exception as ex:
-            logging.error("Erro ignorado: %s", ex, exc_info=True)
-        buf.seek(0)
-        img = Image.open(buf)
-        return ImageTk.PhotoImage(img)
+        c1 = [int(cor[i:i + 2], 16) for i in (1, 3, 5)]
+        c2 = [int(fundo[i:i + 2], 16) for i in (1, 3, 5)]
+        return "#" + "".join(f"{round(a * alfa + b * (1 - alfa)):02x}" for a, b in zip(c1, c2))
     except Exception:
-        return None
+        return cor
 
 
-def montar_aba_resumo_dashboard(abas: ttk.Notebook, conn: sqlite3.Connection, cursor: sqlite3.Cursor):
-    """Cria a aba Resumo/Home com KPIs e atualiza a cada 60s. Retorna o frame da aba."""
-    aba_resumo = ttk.Frame(abas, padding=10)
-    try:
-        abas.insert(0, aba_resumo, text="Resumo")
-    except Exception:
-        abas.add(aba_resumo, text="Resumo")
+import weakref
+
+class SparklineCanvas(tk.Canvas):
+    """Sparkline (linha + área) ou mini-barras desenhada direto num tk.Canvas.
+
+    Os itens são criados uma vez; `atualizar(valores)` só move as coordenadas
+    (`coords`), então não há figura, PNG nem PhotoImage a cada minuto. Mesmo visual
+    da versão matplotlib: linha azul de 2px, área a 15% e eixo y partindo do zero.
+    """
+
+    MARGEM_Y = 0.05  # folga vertical (como as margens padrão do matplotlib)
+    _instancias = weakref.WeakSet()  # para reaplicar_tema() na troca claro/escuro
+
+    def __init__(self, parent, width: int = 260, height: int = 60, cor: str = "#2563eb",
+                 alfa_area: float = 0.15, modo: str = "linha"):
+        super().__init__(parent, width=width, height=height, highlightthickness=0, borderwidth=0)
+        self.cor = cor
+        self.alfa_area = float(alfa_area)
+        self.modo = modo
+        self._valores = []
+        self._barras = []
+        self._area = self.create_polygon(0, 0, 0, 0, 0, 0, outline="", fill=cor)
+        self._linha = self.create_line(0, 0, 0, 0, fill=cor, width=2, capstyle="round", joinstyle="round")
+        self._ajustar_cores()
+        self.bind("<Configure>", lambda _e: self._redesenhar())
+        SparklineCanvas._instancias.add(self)
+
+    @classmethod
+    def reaplicar_tema(cls):
+        """Recolore fundo e área de todas as sparklines vivas (chamar após trocar o tema)."""
+        for spark in list(cls._instancias):
+            try:
+                if spark.winfo_exists():
+                    spark._ajustar_cores()
+            except tk.TclError:
+                pass
+
+    def _ajustar_cores(self):
+        # acompanha o tema (sv_ttk claro/escuro) do card onde está
+        try:
+            fundo = ttk.Style().lookup("TFrame", "background") or "#ffffff"
+            fundo = self.winfo_rgb(fundo)
+            fundo = "#%02x%02x%02x" % tuple(v // 256 for v in fundo)
+        except Exception:
+            fundo = "#ffffff"
+        self.configure(bg=fundo)
+        self.itemconfigure(self._area, fill=_dash_misturar_cor(self.cor, fundo, self.alfa_area))
+
+    def atualizar(self, valores):
+        self._valores = [float(v or 0.0) for v in (valores or [])]
+        self._redesenhar()
+
+    def _redesenhar(self):
+        # antes do primeiro <Configure> winfo_* vale 1: usa o tamanho pedido
+        w = self.winfo_width() if self.winfo_width() > 1 else int(self["width"])
+        h = self.winfo_height() if self.winfo_height() > 1 else int(self["height"])
+        vals = self._valores
+        if not vals:
+            self.coords(self._linha, 0, h - 1, w, h - 1)
+            self.coords(self._area, 0, h, 0, h, w, h)
+            self._ajustar_barras(0)
+            return
+        lo, hi = min(0.0, min(vals)), max(0.0, max(vals))
+        if hi - lo < 1e-9:
+            hi = lo + 1.0
+        folga = (hi - lo) * self.MARGEM_Y
+        lo, hi = lo - folga, hi + folga
+        pad = 1  # meia espessura da linha
+        def y(v):
+            return pad + (hi - v) / (hi - lo) * (h - 2 * pad)
+
+        if self.modo == "barras":
+            self.coords(self._linha, 0, y(0), w, y(0))
+            self.coords(self._area, 0, h, 0, h, w, h)
+            self._ajustar_barras(len(vals))
+            passo = w / len(vals)
+            for i, (item, v) in enumerate(zip(self._barras, vals)):
+                x0 = i * passo + passo * 0.15
+                self.coords(item, x0, min(y(v), y(0)), x0 + passo * 0.7, max(y(v), y(0)))
+            return
+
+        self._ajustar_barras(0)
+        n = len(vals)
+        xs = [pad + (w - 2 * pad) * (i / (n - 1) if n > 1 else 0.5) for i in range(n)]
+        pontos = [c for x, v in zip(xs, vals) for c in (x, y(v))]
+        if n == 1:
+            pontos = [0, pontos[1], w, pontos[1]]
+            xs = [0, w]
+        self.coords(self._linha, *pontos)
+        base = y(0)
+        self.coords(self._area, xs[0], base, *pontos, xs[-1], base)
+
+    def _ajustar_barras(self, n: int):
+        while len(self._barras) < n:
+            self._barras.append(self.create_rectangle(0, 0, 0, 0, outline="", fill=self.cor))
+        while len(self._barras) > n:
+            self.delete(self._barras.pop())
+
+
+DASH_ESTOQUE_CRITICO = 5
+DASH_CACHE_MAX_SEG = 300
+
+
+class DashboardSnapshots:
+    """KPIs da aba Resumo calculados numa única passada, fora da thread do Tk.
+
+    O snapshot fica em cache com a versão (dia, seq do journal): toda escrita em
+    vendas_diario/produtos/manutencao/resgates_pontos passa pelos triggers do journal e
+    avança a seq, então enquanto nada for gravado o cache é devolvido sem consultar nada.
+    DASH_CACHE_MAX_SEG é só uma rede de segurança (ex.: triggers ausentes).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versao = None
+        self._snap = None
+        self._em = 0.0
+
+    def atual(self):
+        """Último snapshot calculado (ou None). Não consulta o banco."""
+        return self._snap
+
+    def versao(self, c=None):
+        c = c or DB.get()
+        return (today_iso(), _journal_seq(c))
+
+    def obter(self):
+        """Snapshot atualizado: o do cache se a versão não mudou, senão recalcula."""
+        c = DB.get()
+        with self._lock:
+            versao = self.versao(c)
+            if self._snap is not None and versao == self._versao and time.monotonic() - self._em < DASH_CACHE_MAX_SEG:
+                return self._snap
+            snap = self.calcular(c)
+            snap["versao"] = versao
+            self._snap, self._versao, self._em = snap, versao, time.monotonic()
+            return snap
+
+    def calcular(self, c=None) -> dict:
+        c = c or DB.get()
+        hoje_dt = datetime.date.today()
+        hoje = hoje_dt.strftime("%Y-%m-%d")
+        ini_mes, fim_mes = _iso_range_mes(hoje_dt.year, hoje_dt.month)
+        ini_7d = (hoje_dt - datetime.timedelta(days=6)).strftime("%Y-%m-%d")
+        dias14 = [(hoje_dt - datetime.timedelta(days=i)).strftime("%Y-%m-%d") for i in range(14)][::-1]
+        amanha = (hoje_dt + datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+
+        # 1) vendas: uma leitura por faixa da PK (dia, pagamento, produto) cobrindo
+        #    mês + 14 dias; hoje/7d/mês/pagamentos/top 5/série saem daqui
+        por_dia, pagamentos, produtos = {}, {"PIX": 0.0, "Cartão": 0.0, "Dinheiro": 0.0, "OUTROS": 0.0}, {}
+        total_mes = 0.0
+        for dia, pg, prod, total in c.execute(
+            "SELECT dia, pagamento, produto, total FROM vendas_diario WHERE dia >= ? AND dia < ?",
+            (min(ini_mes, dias14[0]), max(fim_mes, amanha)),
+        ):
+            v = float(total or 0.0)
+            por_dia[dia] = por_dia.get(dia, 0.0) + v
+            if ini_mes <= dia < fim_mes:
+                total_mes += v
+                pg = (pg or "").strip()
+                pagamentos[pg if pg in pagamentos else "OUTROS"] += v
+                produtos[prod] = produtos.get(prod, 0.0) + v
+        top5 = sorted(produtos.items(), key=lambda kv: kv[1], reverse=True)[:5]
+
+        # 2) OS do mês + pontos resgatados (índices por data_iso)
+        pend, aprov, pts = c.execute(
+            """
+            SELECT m.pendentes, m.aprovadas, r.pontos
+            FROM (SELECT SUM(CASE WHEN COALESCE(aprovado,0)=0 THEN 1 ELSE 0 END) AS pendentes,
+                         SUM(CASE WHEN COALESCE(aprovado,0)=1 THEN 1 ELSE 0 END) AS aprovadas
+                  FROM manutencao WHERE data_iso >= ? AND data_iso < ?) AS m,
+                 (SELECT COALESCE(SUM(pontos_usados),0) AS pontos
+                  FROM resgates_pontos WHERE data_iso >= ? AND data_iso < ?) AS r
+            """,
+            (ini_mes, fim_mes, ini_mes, fim_mes),
+        ).fetchone() or (0, 0, 0)
+
+        # 3) estoque crítico
+        estoque = c.execute(
+            """
+            SELECT nome, COALESCE(estoque,0)
+            FROM produtos
+            WHERE COALESCE(estoque,0) <= ?
+            ORDER BY COALESCE(estoque,0) ASC, nome ASC
+            LIMIT 10
+            """,
+            (DASH_ESTOQUE_CRITICO,),
+        ).fetchall()
+
+        return {
+            "total_hoje": por_dia.get(hoje, 0.0),
+            "total_7d": sum(v for d, v in por_dia.items() if ini_7d <= d <= hoje),
+            "total_mes": total_mes,
+            "pagamentos": pagamentos,
+            "top5": top5,
+            "estoque_critico": [(nome, int(est or 0)) for nome, est in estoque],
+            "os_pendentes": int(pend or 0),
+            "os_aprovadas": int(aprov or 0),
+            "pontos_resgatados": int(pts or 0),
+            "serie14": [por_dia.get(d, 0.0) for d in dias14],
+        }
+
+
+DASHBOARD = DashboardSnapshots()
+
+
+def montar_aba_resumo_dashboard(abas: ttk.Notebook, conn: sqlite3.Connection, cursor: sqlite3.Cursor, aba_resumo=None):
+    """Cria a aba Resumo/Home com KPIs e atualiza a cada 60s. Retorna o frame da aba.
+    Se `aba_resumo` vier pronta (aba sob demanda), só monta o conteúdo dentro dela."""
+    if aba_resumo is None:
+        aba_resumo = ttk.Frame(abas, padding=10)
+        try:
+            abas.insert(0, aba_resumo, text="Resumo")
+        except Exception:
+            abas.add(aba_resumo, text="Resumo")
 
     # Layout base
     aba_resumo.columnconfigure(0, weight=1)
@@ -4157,8 +6738,8 @@ def montar_aba_resumo_dashboard(abas: ttk.Notebook, conn: sqlite3.Connection, cu
     card_mes.grid(row=0, column=2, sticky="ew", padx=(8, 0))
 
     # Sparkline dentro do card do mês
-    spark_lbl = ttk.Label(card_mes)
-    spark_lbl.pack(anchor="w", pady=(8, 0))
+    spark = SparklineCanvas(card_mes, width=260, height=60)
+    spark.pack(anchor="w", pady=(8, 0))
 
     # Linha 2: Totais por pagamento (mês)
     row2 = ttk.Frame(aba_resumo)
@@ -4205,150 +6786,66 @@ def montar_aba_resumo_dashboard(abas: ttk.Notebook, conn: sqlite3.Connection, cu
     card_os_a.grid(row=0, column=1, sticky="ew", padx=8)
     card_pts.grid(row=0, column=2, sticky="ew", padx=(8, 0))
 
-    # manter referência das imagens para evitar GC
-    state = {"spark_img": None}
-
-    def _refresh():
-        try:
-            hoje = datetime.date.today().strftime("%d/%m/%Y")
-            mm, yyyy = _dash_mes_ano_atual()
-
-            # Vendas hoje
-            cursor.execute("SELECT COALESCE(SUM(total),0) FROM vendas WHERE data=?", (hoje,))
-            total_hoje = float((cursor.fetchone() or [0])[0] or 0.0)
-
-            # Vendas 7 dias
-            dias7 = _dash_datas_ultimos_dias(7)
-            qmarks = ",".join(["?"] * len(dias7))
-            cursor.execute(f"SELECT COALESCE(SUM(total),0) FROM vendas WHERE data IN ({qmarks})", tuple(dias7))
-            total_7d = float((cursor.fetchone() or [0])[0] or 0.0)
+    state = {"aplicado": None, "calculando": False, "timer": None}
 
-            # Vendas mês
-            cursor.execute(
-                "SELECT COALESCE(SUM(total),0) FROM vendas WHERE substr(data,4,2)=? AND substr(data,7,4)=?",
-                (mm, yyyy),
-            )
-            total_mes = float((cursor.fetchone() or [0])[0] or 0.0)
-
-            lbl_dia.config(text=_dash_fmt_brl(total_hoje))
-            lbl_sem.config(text=_dash_fmt_brl(total_7d))
-            lbl_mes.config(text=_dash_fmt_brl(total_mes))
+    def _aplicar(snap):
+        """Só escreve nos widgets (thread do Tk); o cálculo veio pronto de DASHBOARD."""
+        if snap is None or snap is state["aplicado"]:
+            return
+        state["aplicado"] = snap
+        lbl_dia.config(text=_dash_fmt_brl(snap["total_hoje"]))
+        lbl_sem.config(text=_dash_fmt_brl(snap["total_7d"]))
+        lbl_mes.config(text=_dash_fmt_brl(snap["total_mes"]))
 
-            # Pagamentos mês
-            cursor.execute(
-                """
-                SELECT pagamento, COALESCE(SUM(total),0)
-                FROM vendas
-                WHERE substr(data,4,2)=? AND substr(data,7,4)=?
-                GROUP BY pagamento
-                """,
-                (mm, yyyy),
-            )
-            totals = {"PIX": 0.0, "Cartão": 0.0, "Dinheiro": 0.0, "OUTROS": 0.0}
-            for pg, val in (cursor.fetchall() or []):
-                pg = (pg or "").strip()
-                v = float(val or 0.0)
-                if pg.startswith("Upgrade"):
-                    totals["OUTROS"] += v
-                elif pg in totals:
-                    totals[pg] += v
-                else:
-                    totals["OUTROS"] += v
+        pg = snap["pagamentos"]
+        lbl_pix.config(text=_dash_fmt_brl(pg["PIX"]))
+        lbl_car.config(text=_dash_fmt_brl(pg["Cartão"]))
+        lbl_din.config(text=_dash_fmt_brl(pg["Dinheiro"]))
+        lbl_out.config(text=_dash_fmt_brl(pg["OUTROS"]))
 
-            lbl_pix.config(text=_dash_fmt_brl(totals["PIX"]))
-            lbl_car.config(text=_dash_fmt_brl(totals["Cartão"]))
-            lbl_din.config(text=_dash_fmt_brl(totals["Dinheiro"]))
-            lbl_out.config(text=_dash_fmt_brl(totals["OUTROS"]))
+        top_list.delete(0, "end")
+        for prod, val in snap["top5"]:
+            top_list.insert("end", f"{(prod or '(sem produto)')[:45]} — {_dash_fmt_brl(val)}")
 
-            # Top 5 produtos
-            top_list.delete(0, "end")
-            cursor.execute(
-                """
-                SELECT produto, COALESCE(SUM(total),0) AS valor_total
-                FROM vendas
-                WHERE substr(data,4,2)=? AND substr(data,7,4)=?
-                GROUP BY produto
-                ORDER BY valor_total DESC
-                LIMIT 5
-                """,
-                (mm, yyyy),
-            )
-            for prod, val in (cursor.fetchall() or []):
-                prod = (prod or "(sem produto)")
-                top_list.insert("end", f"{prod[:45]} — {_dash_fmt_brl(float(val or 0.0))}")
+        stock_list.delete(0, "end")
+        for nome, est in snap["estoque_critico"]:
+            stock_list.insert("end", f"{(nome or '')[:48]} — {int(est or 0)} un")
 
-            # Estoque crítico
-            stock_list.delete(0, "end")
-            cursor.execute(
-                """
-                SELECT nome, COALESCE(estoque,0)
-                FROM produtos
-                WHERE COALESCE(estoque,0) <= 5
-                ORDER BY COALESCE(estoque,0) ASC, nome ASC
-                LIMIT 10
-                """
-            )
-            for nome, est in (cursor.fetchall() or []):
-                stock_list.insert("end", f"{(nome or '')[:48]} — {int(est or 0)} un")
+        lbl_os_p.config(text=str(snap["os_pendentes"]))
+        lbl_os_a.config(text=str(snap["os_aprovadas"]))
+        lbl_pts.config(text=f"{snap['pontos_resgatados']} pts")
 
-            # OS pendentes/aprovadas
-            cursor.execute(
-                """
-                SELECT
-                  SUM(CASE WHEN COALESCE(aprovado,0)=0 THEN 1 ELSE 0 END) AS pendentes,
-                  SUM(CASE WHEN COALESCE(aprovado,0)=1 THEN 1 ELSE 0 END) AS aprovadas
-                FROM manutencao
-                WHERE substr(data,4,2)=? AND substr(data,7,4)=?
-                """,
-                (mm, yyyy),
-            )
-            pend, aprov = cursor.fetchone() or (0, 0)
-            lbl_os_p.config(text=str(int(pend or 0)))
-            lbl_os_a.config(text=str(int(aprov or 0)))
+        # Sparkline (últimos 14 dias)
+        spark.atualizar(snap["serie14"])
 
-            # Pontos resgatados no mês
-            cursor.execute(
-                """
-                SELECT COALESCE(SUM(pontos_usados),0)
-                FROM resgates_pontos
-                WHERE substr(data,4,2)=? AND substr(data,7,4)=?
-                """,
-                (mm, yyyy),
-            )
-            pts = int((cursor.fetchone() or [0])[0] or 0)
-            lbl_pts.config(text=f"{pts} pts")
+    def _calculado(snap):
+        state["calculando"] = False
+        try:
+            if aba_resumo.winfo_exists():
+                _aplicar(snap)
+        except Exception as ex:
+            logging.error(f"Falha ao atualizar dashboard: {ex}", exc_info=True)
 
-            # Sparkline (últimos 14 dias)
-            dias14 = _dash_datas_ultimos_dias(14)
-            qmarks14 = ",".join(["?"] * len(dias14))
-            cursor.execute(
-                f"""
-                SELECT data, COALESCE(SUM(total),0)
-                FROM vendas
-                WHERE data IN ({qmarks14})
-                GROUP BY data
-                """,
-                tuple(dias14),
-            )
-            mp = {str(d): float(v or 0.0) for d, v in (cursor.fetchall() or [])}
-            serie = [mp.get(d, 0.0) for d in dias14]
-            img = _dash_gerar_sparkline_img(serie)
-            if img is not None:
-                state["spark_img"] = img
-                spark_lbl.config(image=img, text="")
-            else:
-                spark_lbl.config(image="", text="(sparkline indisponível)")
+    def _falhou(_ex):
+        state["calculando"] = False
 
+    def _refresh():
+        # mostra na hora o último snapshot (se houver) e recalcula em segundo plano;
+        # se nada foi gravado desde então, DASHBOARD.obter devolve o mesmo do cache
+        try:
+            _aplicar(DASHBOARD.atual())
         except Exception as ex:
-            try:
-                logging.error(f"Falha ao atualizar dashboard: {ex}", exc_info=True)
-            except Exception as ex:
-                logging.error("Erro ignorado: %s", ex, exc_info=True)
-        finally:
-            try:
-                aba_resumo.after(60000, _refresh)
-            except Exception as ex:
-                logging.error("Erro ignorado: %s", ex, exc_info=True)
+            logging.error(f"Falha ao atualizar dashboard: {ex}", exc_info=True)
+        if not state["calculando"]:
+            state["calculando"] = True
+            JOBS.submit(DASHBOARD.obter, on_done=_calculado, on_error=_falhou)
+        # um único timer de 60s (trocar de aba não cria outro)
+        try:
+            if state["timer"] is not None:
+                aba_resumo.after_cancel(state["timer"])
+            state["timer"] = aba_resumo.after(60000, _refresh)
+        except Exception as ex:
+            logging.error("Erro ignorado: %s", ex, exc_info=True)
     # atualiza ao abrir e também periodicamente
     _refresh()
 
@@ -4470,6 +6967,83 @@ def reorder_notebook_tabs_alphabetical(abas: 'ttk.Notebook'):
         return
 # =================== FIM NOTEBOOK: ORDENAR ABAS ===================
 
+# ===================== NOTEBOOK: ABAS SOB DEMANDA =====================
+# Ordem das abas carregadas em segundo plano (tempo ocioso) depois que a aba inicial aparece.
+# Caixa vem primeiro: atualizar_caixa() faz o fechamento automático do dia anterior.
+ABAS_PREFETCH = (
+    "Caixa", "Vendas", "Estoque", "Clientes", "Manutenção", "Pontuação",
+    "Devedores", "Agendamento", "Upgrade", "Devolução", "Ferramentas",
+)
+
+class AbasSobDemanda:
+    """Carrega (ou monta) cada aba de um ttk.Notebook só quando ela é selecionada.
+    - registrar(aba, carregar): carregar() roda na 1ª seleção; com sempre=True, em toda seleção
+    - para montar os widgets sob demanda, registre uma função que monta dentro do frame da aba
+    - prefetch: após a aba inicial, as abas de `prefetch` (por texto) são carregadas uma por vez
+      via after_idle, para a próxima aba já estar pronta quando o usuário clicar
+    """
+    def __init__(self, notebook: ttk.Notebook, prefetch=(), atraso_ms: int = 1500, intervalo_ms: int = 150):
+        self._nb = notebook
+        self._carregadores = {}  # {tab_id: [(carregar, sempre)]}
+        self._prontas = set()
+        self._prefetch = list(prefetch)
+        self._atraso_ms = int(atraso_ms)
+        self._intervalo_ms = int(intervalo_ms)
+        self._after_id = None
+        notebook.bind("<<NotebookTabChanged>>", self._on_changed, add=True)
+
+    def registrar(self, aba, carregar, sempre: bool = False):
+        self._carregadores.setdefault(str(aba), []).append((carregar, bool(sempre)))
+
+    def garantir(self, aba, selecionada: bool = False):
+        """Roda os carregadores pendentes da aba (e os `sempre`, se ela acabou de ser selecionada)."""
+        tid = str(aba)
+        if tid not in self._carregadores:
+            return  # ainda em construção (eventos de add/reordenar chegam antes do registrar)
+        primeira = tid not in self._prontas
+        self._prontas.add(tid)
+        for carregar, sempre in list(self._carregadores.get(tid, ())):
+            if primeira or (sempre and selecionada):
+                try:
+                    carregar()
+                except Exception as ex:
+                    logging.error("Erro ignorado: %s", ex, exc_info=True)
+
+    def iniciar(self):
+        """Carrega a aba selecionada agora e agenda o prefetch das demais."""
+        self._on_changed()
+
+    def _on_changed(self, _evt=None):
+        try:
+            tid = self._nb.select()
+        except tk.TclError:
+            return
+        if tid:
+            self.garantir(tid, selecionada=True)
+        self._agendar(self._atraso_ms)
+
+    def _agendar(self, atraso_ms: int):
+        try:
+            if self._after_id is not None:
+                self._nb.after_cancel(self._after_id)
+            self._after_id = self._nb.after(atraso_ms, lambda: self._nb.after_idle(self._prefetch_um))
+        except tk.TclError:
+            self._after_id = None
+
+    def _prefetch_um(self):
+        self._after_id = None
+        try:
+            por_texto = {self._nb.tab(t, "text"): t for t in self._nb.tabs()}
+        except tk.TclError:
+            return
+        for texto in self._prefetch:
+            tid = por_texto.get(texto)
+            if tid and tid not in self._prontas and tid in self._carregadores:
+                self.garantir(tid)
+                self._agendar(self._intervalo_ms)  # uma aba por vez; eventos do usuário passam entre elas
+                return
+# =================== FIM NOTEBOOK: ABAS SOB DEMANDA ===================
+
 # ================= SISTEMA PRINCIPAL =================
 def abrir_sistema_com_logo(username, login_win):
     global CURRENT_USER
@@ -4485,6 +7059,14 @@ def abrir_sistema_com_logo(username, login_win):
     root.after(200, lambda: root.attributes("-topmost", False))
     _bind_fullscreen_shortcuts(root)
     setup_global_exception_handlers(root)
+    # Resultados das tarefas em segundo plano (PDF/e-mail/Telegram) voltam por esta janela
+    JOBS.attach(root)
+    # Envio contínuo do journal de alterações para a pasta de backup
+    JOURNAL.iniciar()
+    # Reenvia o que ficou na fila do Telegram (sessões anteriores)
+    TELEGRAM.iniciar()
+    # Sessão SMTP já autenticada para o primeiro cupom por e-mail
+    JOBS.submit(SMTP.aquecer)
     # Executa atualização após login (se houver)
     try:
         updated = check_and_update_after_login(root)
@@ -4546,6 +7128,14 @@ def abrir_sistema_com_logo(username, login_win):
                     pass
                 except Exception as ex:
                     logging.error("Erro ignorado: %s", ex, exc_info=True)
+                try:
+                    JOURNAL.parar()
+                except Exception as ex:
+                    logging.error("Erro ignorado: %s", ex, exc_info=True)
+                try:
+                    SMTP.fechar()
+                except Exception as ex:
+                    logging.error("Erro ignorado: %s", ex, exc_info=True)
                 try:
                     conn.close()
                 except Exception as ex:
@@ -4565,7 +7155,7 @@ def abrir_sistema_com_logo(username, login_win):
         try:
             apply_theme(tema_var.get())
             _refresh_theme_widgets()
-            _refresh_statusbar_theme()
+            SparklineCanvas.reaplicar_tema()
             try:
                 for t in (tree_cli, tree_upgrades, ag_tree, tree_cx, tree_m, tree_dev, tree_pontos):
                 # Estoque: sem zebra (somente cores por quantidade)
@@ -4616,7 +7206,80 @@ def abrir_sistema_com_logo(username, login_win):
 
             return
 
-        UserAdminDialog(root, current_admin=username)
+        UserAdminDialog(root, current_admin=username)
+
+    def reconstruir_resumo_vendas():
+        if not is_admin(username):
+            messagebox.showerror("Permissão negada", "Apenas administradores podem reconstruir o resumo de vendas.")
+            return
+        if not messagebox.askyesno("Resumo de vendas", "Reconstruir o resumo diário de vendas a partir do histórico?"):
+            return
+        try:
+            n = rebuild_vendas_diario()
+            messagebox.showinfo("Resumo de vendas", f"Resumo diário reconstruído ({n} linhas).")
+        except Exception as ex:
+            logging.error("Falha ao reconstruir vendas_diario", exc_info=True)
+            messagebox.showerror("Erro", f"Falha ao reconstruir resumo de vendas:\n{ex}")
+
+    def restaurar_snapshot_banco():
+        """Escolhe um snapshot do store e reconstrói o banco num arquivo (não mexe no banco em uso).
+        Com o journal marcado, aplica as alterações registradas depois do snapshot."""
+        if not is_admin(username):
+            messagebox.showerror("Permissão negada", "Apenas administradores podem restaurar backups.")
+            return
+        try:
+            nomes = snapshot_listar()
+        except Exception as ex:
+            logging.error("Falha ao listar snapshots", exc_info=True)
+            messagebox.showerror("Erro", f"Falha ao listar snapshots:\n{ex}")
+            return
+        if not nomes:
+            messagebox.showinfo("Restaurar backup", "Nenhum snapshot encontrado.")
+            return
+        win = tk.Toplevel(root)
+        win.title("Restaurar backup do banco")
+        win.geometry("420x420")
+        ttk.Label(win, text="Snapshots (mais recente primeiro):").pack(anchor="w", padx=10, pady=(10, 4))
+        lb = tk.Listbox(win, height=16)
+        lb.pack(fill="both", expand=True, padx=10)
+        for n in nomes:
+            dt = _snapshot_nome_dt(n)
+            lb.insert("end", dt.strftime("%d/%m/%Y %H:%M:%S") if dt else n)
+        lb.selection_set(0)
+        var_journal = tk.BooleanVar(value=True)
+        ttk.Checkbutton(
+            win, text="Aplicar alterações do journal (até o último envio)", variable=var_journal
+        ).pack(anchor="w", padx=10, pady=(6, 0))
+
+        def _restaurar():
+            sel = lb.curselection()
+            if not sel:
+                return
+            nome = nomes[sel[0]]
+            from tkinter import filedialog
+            destino = filedialog.asksaveasfilename(
+                parent=win, title="Salvar banco restaurado como", defaultextension=".db",
+                initialfile=f"{nome}.db", filetypes=[("Banco SQLite", "*.db")],
+            )
+            if not destino:
+                return
+            if var_journal.get():
+                JOBS.submit(
+                    journal_replay, destino, nome,
+                    on_done=lambda res: messagebox.showinfo(
+                        "Restaurar backup",
+                        f"Banco restaurado em:\n{destino}\n\nSnapshot {res[0]} + {res[1]} alteração(ões) do journal.",
+                    ),
+                    on_error=lambda ex: messagebox.showerror("Erro", f"Falha ao restaurar backup:\n{ex}"),
+                )
+                return
+            JOBS.submit(
+                snapshot_restaurar, nome, destino,
+                on_done=lambda caminho: messagebox.showinfo("Restaurar backup", f"Banco restaurado em:\n{caminho}"),
+                on_error=lambda ex: messagebox.showerror("Erro", f"Falha ao restaurar snapshot:\n{ex}"),
+            )
+
+        ttk.Button(win, text="Restaurar para arquivo…", style="Accent.TButton", command=_restaurar).pack(pady=10)
 
 
     if is_admin(username):
@@ -4626,6 +7289,8 @@ def abrir_sistema_com_logo(username, login_win):
             menu_sessao.add_separator()
 
             menu_sessao.add_command(label="Usuários (Admin)…", command=abrir_gerenciar_usuarios)
+            menu_sessao.add_command(label="Reconstruir resumo de vendas (Admin)…", command=reconstruir_resumo_vendas)
+            menu_sessao.add_command(label="Restaurar backup do banco (Admin)…", command=restaurar_snapshot_banco)
             try:
                 # [REMOVIDO] menu_sessao.add_command(label="Licença (Admin)…", command=lambda: admin_gerar_enviar_licenca_dialog(root))
                 pass
@@ -4717,6 +7382,7 @@ def abrir_sistema_com_logo(username, login_win):
                 logging.error("Erro ignorado: %s", ex, exc_info=True)
         current_theme['name'] = theme_name
         _apply_custom_styles(theme_name)
+        STATUSBAR.aplicar_tema(THEME_DARK if theme_name == 'dark' else THEME_LIGHT)
 
     # Aplica tema inicial
     apply_theme('dark')
@@ -4795,6 +7461,8 @@ def abrir_sistema_com_logo(username, login_win):
             logging.error("Erro ignorado: %s", ex, exc_info=True)
     # Notebook
     abas = ttk.Notebook(root)
+    # Cada aba monta/carrega na 1ª seleção; as demais são pré-carregadas em tempo ocioso
+    abas_lazy = AbasSobDemanda(abas, prefetch=ABAS_PREFETCH)
 
     abas.pack(fill="both", expand=True, padx=12, pady=(8, 0))
     # Fallback: garante que o rodapé (statusbar) apareça
@@ -4806,13 +7474,18 @@ def abrir_sistema_com_logo(username, login_win):
         except Exception as ex:
             logging.error("Erro ignorado: %s", ex, exc_info=True)
     # ====== RESUMO (Dashboard KPIs) ======
-    try:
-        montar_aba_resumo_dashboard(abas, conn, cursor)
-    except Exception as _ex_dash:
+    aba_resumo = ttk.Frame(abas, padding=10)
+    abas.add(aba_resumo, text="Resumo")
+
+    def _montar_resumo():
         try:
-            logging.error(f'Falha ao montar aba Resumo: {_ex_dash}', exc_info=True)
-        except Exception as ex:
-            logging.error("Erro ignorado: %s", ex, exc_info=True)
+            montar_aba_resumo_dashboard(abas, conn, cursor, aba_resumo)
+        except Exception as _ex_dash:
+            try:
+                logging.error(f'Falha ao montar aba Resumo: {_ex_dash}', exc_info=True)
+            except Exception as ex:
+                logging.error("Erro ignorado: %s", ex, exc_info=True)
+    abas_lazy.registrar(aba_resumo, _montar_resumo)
     aba_estoque = ttk.Frame(abas, padding=10)
     aba_vendas = ttk.Frame(abas, padding=10)
     aba_clientes = ttk.Frame(abas, padding=10)
@@ -4831,18 +7504,6 @@ def abrir_sistema_com_logo(username, login_win):
     aba_agendamento = ttk.Frame(abas, padding=10)
     abas.add(aba_agendamento, text="Agendamento")
 
-    # Atualiza automaticamente a aba Vendas quando ela for selecionada
-    def _on_tab_changed(event=None):
-
-        try:
-            if abas.select() == aba_vendas._w:
-                carregar_vendas_dia()
-            if abas.select() == aba_caixa._w:
-                atualizar_caixa()
-        except Exception as ex:
-            logging.error("Erro ignorado: %s", ex, exc_info=True)
-    abas.bind("<<NotebookTabChanged>>", _on_tab_changed)
-
     # ====== UPGRADE ======
     aba_upgrade = ttk.Frame(abas, padding=10)
     abas.add(aba_upgrade, text="Upgrade")
@@ -4854,13 +7515,21 @@ def abrir_sistema_com_logo(username, login_win):
     except Exception as ex:
         logging.error("Erro ignorado: %s", ex, exc_info=True)
     # Aba Ferramentas (atalhos com ícones)
+    aba_ferramentas = ttk.Frame(abas, padding=10)
     try:
-        montar_aba_ferramentas(abas, root)
-    except Exception as _ex_tools:
+        abas.insert(1, aba_ferramentas, text='Ferramentas')
+    except Exception:
+        abas.add(aba_ferramentas, text='Ferramentas')
+
+    def _montar_ferramentas():
         try:
-            logging.error(f'Falha ao montar aba Ferramentas: {_ex_tools}', exc_info=True)
-        except Exception as ex:
-            logging.error("Erro ignorado: %s", ex, exc_info=True)
+            montar_aba_ferramentas(abas, root, aba_ferramentas)
+        except Exception as _ex_tools:
+            try:
+                logging.error(f'Falha ao montar aba Ferramentas: {_ex_tools}', exc_info=True)
+            except Exception as ex:
+                logging.error("Erro ignorado: %s", ex, exc_info=True)
+    abas_lazy.registrar(aba_ferramentas, _montar_ferramentas)
     f_u = ttk.Frame(aba_upgrade, padding=8)
     f_u.pack(fill="x", pady=6)
     ttk.Label(f_u, text="CPF").grid(row=0, column=0, sticky="w", padx=6, pady=4)
@@ -4907,27 +7576,31 @@ def abrir_sistema_com_logo(username, login_win):
             valor = float(valor_text)
             data = today_br()
             hora = datetime.datetime.now().strftime("%H:%M:%S")
+            pg_upgrade = f"Upgrade - {ent_pg_u.get().strip()}" if ent_pg_u.get().strip() else "Upgrade"
             with conn:
-                cursor.execute("INSERT INTO vendas(cliente,cpf,produto,quantidade,total,pagamento,data,hora) VALUES (?,?,?,?,?,?,?,?)", (cliente, cpf, descricao, 1, valor, (f"Upgrade - {ent_pg_u.get().strip()}" if ent_pg_u.get().strip() else "Upgrade"), data, hora))
+                cursor.execute("INSERT INTO vendas(cliente,cpf,produto,quantidade,total,pagamento,data,hora,data_iso) VALUES (?,?,?,?,?,?,?,?,?)", (cliente, cpf, descricao, 1, valor, pg_upgrade, data, hora, _br_to_iso(data)))
+                venda_id = cursor.lastrowid
+                vendas_diario_aplicar(_br_to_iso(data), pg_upgrade, descricao, 1, valor)
 
                 # >>> NOVO: soma pontos do cliente (Upgrade também soma pontos)
-                cursor.execute(
-                    "INSERT OR IGNORE INTO pontuacao(cpf,pontos,atualizado_em) VALUES(?,?,?)",
-                    (cpf, 0, now_br()),
-                )
-                adicionar_pontos_cliente(cpf, valor)
+                adicionar_pontos_cliente(cpf, valor, origem='upgrade', ref_id=venda_id)
                 # <<< FIM NOVO: pontos
-                cursor.execute("INSERT INTO caixa(valor,data,hora,motivo) VALUES (?,?,?,?)", (valor, data, hora, (f"Upgrade - {ent_pg_u.get().strip()}" if ent_pg_u.get().strip() else "Upgrade")))
+                cursor.execute("INSERT INTO caixa(valor,data,hora,motivo,data_iso) VALUES (?,?,?,?,?)", (valor, data, hora, pg_upgrade, _br_to_iso(data)))
                 cursor.execute("INSERT OR IGNORE INTO clientes(cpf,nome,telefone) VALUES (?,?,?)", (cpf, cliente, telefone))
-            try:
-                caminho_pdf = gerar_cupom(cliente, descricao, 1, (ent_pg_u.get().strip() or "Upgrade"), valor, cpf=cpf)
+            pg_txt = ent_pg_u.get().strip() or "Upgrade"
 
+            def _cupom_upgrade_pronto(caminho_pdf):
+                try:
+                    open_in_default_app(caminho_pdf)
+                except Exception as ex:
+                    logging.error("Erro ignorado: %s", ex, exc_info=True)
+                bring_app_to_front()
                 try:
                     telegram_notify(f"""🆙 <b>UPGRADE REGISTRADO</b>
                 👤 Cliente: {cliente}
                 📞 Tel: {telefone}
                 📝 Desc: {descricao}
-                💳 {ent_pg_u.get().strip() or 'Upgrade'}
+                💳 {pg_txt}
                 💰 Total: R$ {valor:.2f}
                 🕒 {data} {hora}""", dedupe_key=f"upgrade_{data}_{hora}_{cpf}", dedupe_window_sec=30)
                 except Exception as ex:
@@ -4936,8 +7609,8 @@ def abrir_sistema_com_logo(username, login_win):
                     telegram_send_pdf("🧾 Cupom do upgrade", caminho_pdf, dedupe_key=f"cupom_upgrade_{data}_{hora}_{cpf}", dedupe_window_sec=60)
                 except Exception as ex:
                     logging.error("Erro ignorado: %s", ex, exc_info=True)
-            except Exception as ex:
-                logging.error("Erro ignorado: %s", ex, exc_info=True)
+
+            JOBS.submit(gerar_cupom, cliente, descricao, 1, pg_txt, valor, cpf=cpf, abrir_pdf=False, venda_id=venda_id, on_done=_cupom_upgrade_pronto)
             messagebox.showinfo("Upgrade", f"Upgrade registrado! Total: R$ {valor:.2f}")
             # Atualiza também a lista de vendas do dia (upgrades geram venda)
             try:
@@ -4978,59 +7651,21 @@ def abrir_sistema_com_logo(username, login_win):
         pasta_rel = os.path.join(os.getcwd(), "relatorios")
         os.makedirs(pasta_rel, exist_ok=True)
         nome_arquivo = os.path.join(pasta_rel, f"relatorio_upgrades_{data_alvo.replace('/', '-')}.pdf")
-        c = canvas.Canvas(nome_arquivo, pagesize=A4)
-        logo_path_local = str(P('logo.png'))
-        if os.path.exists(logo_path_local):
-            try:
-                c.drawImage(ImageReader(logo_path_local), 40, 780, width=140, height=40, preserveAspectRatio=True, mask="auto")
-            except Exception as ex:
-                logging.error("Erro ignorado: %s", ex, exc_info=True)
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(40, 720, f"Relatório de Upgrades - {data_alvo}")
-        c.setFont("Helvetica", 11)
-        c.drawString(40, 742, "-" * 110)
-        y = 720
-        cursor.execute("SELECT hora, cliente, produto, pagamento, total FROM vendas WHERE data=? AND pagamento LIKE 'Upgrade%' ORDER BY hora DESC", (hoje,))
+        doc = PdfDocumento(nome_arquivo, f"Relatório de Upgrades - {data_alvo}", logo=(40, 780, 140, 40),
+                           y_regua=742, topo=700)
+        cursor.execute("SELECT hora, cliente, produto, pagamento, total FROM vendas WHERE data_iso=? AND pagamento LIKE 'Upgrade%' ORDER BY hora DESC", (_br_to_iso(data_alvo),))
         linhas = cursor.fetchall()
-        total_dia = 0.0
-        if not linhas:
-            c.drawString(40, y, "Nenhum upgrade registrado neste dia.")
-            y -= 18
-        else:
-            c.setFont("Helvetica-Bold", 10)
-            c.drawString(40, y, "Hora")
-            c.drawString(100, y, "Cliente")
-            c.drawString(280, y, "Descrição")
-            c.drawString(460, y, "Pagto")
-            c.drawString(520, y, "Valor")
-            y -= 16
-            c.setFont("Helvetica", 10)
-            for hora, cliente, produto, pagamento, total in linhas:
-                total_dia += total or 0.0
-                c.drawString(40, y, str(hora))
-                c.drawString(100, y, str(cliente)[:24])
-                c.drawString(280, y, str(produto)[:30])
-                c.drawString(460, y, str(pagamento or "").replace("Upgrade - ", "")[:12])
-                c.drawRightString(590, y, f"R$ {float(total):.2f}")
-                y -= 16
-                if y < 60:
-                    c.showPage()
-                    y = 780
-                    c.setFont("Helvetica-Bold", 12)
-                    c.drawString(40, y, f"Relatório de Upgrades - {data_alvo}")
-                    y -= 20
-                    c.setFont("Helvetica-Bold", 10)
-                    c.drawString(40, y, "Hora")
-                    c.drawString(100, y, "Cliente")
-                    c.drawString(280, y, "Descrição")
-                    c.drawString(460, y, "Pagto")
-                    c.drawString(520, y, "Valor")
-                    y -= 16
-                    c.setFont("Helvetica", 10)
-        y -= 24
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(40, y, f"Total de upgrades do dia: R$ {total_dia:.2f}")
-        c.save()
+        total_dia = sum(float(total or 0.0) for *_cols, total in linhas)
+        doc.tabela(
+            [PdfColuna("Hora", 40), PdfColuna("Cliente", 100, max_chars=24), PdfColuna("Descrição", 280, max_chars=30),
+             PdfColuna("Pagto", 460, max_chars=12), PdfColuna("Valor", 590, alinhar="e")],
+            [(hora, cliente, produto, str(pagamento or "").replace("Upgrade - ", ""), f"R$ {float(total):.2f}")
+             for hora, cliente, produto, pagamento, total in linhas],
+            vazio="Nenhum upgrade registrado neste dia.",
+        )
+        doc.espaco(8)
+        doc.linha(f"Total de upgrades do dia: R$ {total_dia:.2f}", negrito=True, tamanho=12)
+        doc.salvar()
         try:
             backup_pdf(nome_arquivo, "relatorios")
         except Exception as ex:
@@ -5045,12 +7680,12 @@ def abrir_sistema_com_logo(username, login_win):
     ttk.Button(top_hist_u, text="📄 Exportar PDF", style="Accent.TButton", command=lambda: gerar_relatorio_upgrades_dia_pdf()).pack(side="left", padx=6)
     @ui_safe('Upgrade')
     def carregar_upgrades():
-        tree_upgrades.delete(*tree_upgrades.get_children())
-        hoje = today_br()
-        cursor.execute("SELECT hora, cliente, produto, pagamento, total FROM vendas WHERE data=? AND pagamento LIKE 'Upgrade%' ORDER BY hora DESC", (hoje,))
-        for hora, cliente, produto, pagamento, total in cursor.fetchall():
-            tree_upgrades.insert("", "end", values=(hora, cliente, produto, (pagamento or "").replace("Upgrade - ", ""), f"R$ {total:.2f}"))
-        apply_zebra(tree_upgrades)
+        hoje = today_iso()
+        cursor.execute("SELECT id, hora, cliente, produto, pagamento, total FROM vendas WHERE data_iso=? AND pagamento LIKE 'Upgrade%' ORDER BY hora DESC", (hoje,))
+        sync_treeview(tree_upgrades, [
+            (vid, (hora, cliente, produto, (pagamento or "").replace("Upgrade - ", ""), f"R$ {total:.2f}"))
+            for vid, hora, cliente, produto, pagamento, total in cursor.fetchall()
+        ], zebra=True)
     
     # Adicionar status bar na aba Upgrade
     add_tab_statusbar(aba_upgrade)
@@ -5344,7 +7979,7 @@ def abrir_sistema_com_logo(username, login_win):
     btn_next.config(command=lambda: _change_month(1))
 
     # Carrega ao iniciar
-    refresh_agendamento_calendar()
+    abas_lazy.registrar(aba_agendamento, refresh_agendamento_calendar)
 
 
     # Notifica no Telegram se houver agendamento para HOJE (ao abrir)
@@ -5436,7 +8071,6 @@ def abrir_sistema_com_logo(username, login_win):
     ent_custo.bind("<FocusOut>", lambda e: formatar_moeda(e, ent_custo))
     ent_preco.bind("<FocusOut>", lambda e: formatar_moeda(e, ent_preco))
     def listar_estoque():
-        tree.delete(*tree.get_children())
         
         # ===== Cores do estoque (SEM zebra) =====
         # 0 = zerado (vermelho escuro)
@@ -5456,6 +8090,7 @@ def abrir_sistema_com_logo(username, login_win):
             ORDER BY COALESCE(estoque,0) ASC, nome ASC
         """)
         
+        linhas = []
         for codigo, nome, tipo, preco, qtd in cursor.fetchall():
             if qtd == 0:
                 tag = "zerado"
@@ -5467,23 +8102,14 @@ def abrir_sistema_com_logo(username, login_win):
                 tag = "verde"
         
 
-            try:
-                cfg_tg = _load_telegram_config()
-                if int(qtd) == 0:
-                    telegram_notify(f"""⛔ <b>ESTOQUE ZERADO</b>
-            📦 Produto: {nome}
-            🔢 Qtd: {qtd}""", dedupe_key=f"stock_zero_{codigo}", dedupe_window_sec=int(cfg_tg.get('dedupe_zero_sec', 43200)))
-                elif int(qtd) <= 5:
-                    telegram_notify(f"""⚠️ <b>ESTOQUE BAIXO</b>
-            📦 Produto: {nome}
-            🔢 Qtd: {qtd}""", dedupe_key=f"stock_low_{codigo}", dedupe_window_sec=int(cfg_tg.get('dedupe_low_sec', 21600)))
-            except Exception as ex:
-                logging.error("Erro ignorado: %s", ex, exc_info=True)
-            tree.insert("", "end", values=(codigo, nome, tipo, f"R$ {float(preco):.2f}", int(qtd)), tags=(tag,))
+            # Alertas de estoque baixo/zerado: ver estoque_verificar (só nas transições)
+            linhas.append((codigo, (codigo, nome, tipo, f"R$ {float(preco):.2f}", int(qtd)), (tag,)))
+        # Só as linhas alteradas (ex.: o produto vendido) são redesenhadas
+        sync_treeview(tree, linhas)
         
         # NÃO aplicar zebra no estoque
         # apply_zebra(tree)
-    listar_estoque()
+    abas_lazy.registrar(aba_estoque, listar_estoque)
     btn_frame_est = ttk.Frame(aba_estoque)
     btn_frame_est.pack(fill="x", pady=(6, 0))
     @ui_safe('Estoque')
@@ -5503,6 +8129,7 @@ def abrir_sistema_com_logo(username, login_win):
                     "INSERT INTO produtos (codigo,nome,tipo,custo,preco,estoque) VALUES (?,?,?,?,?,?)",
                     (codigo, nome, tipo, custo, preco, qtd),
                 )
+            estoque_verificar(codigos=[codigo])
             listar_estoque()
             messagebox.showinfo("OK", "Produto cadastrado!")
         except sqlite3.IntegrityError:
@@ -5524,6 +8151,7 @@ def abrir_sistema_com_logo(username, login_win):
         if messagebox.askyesno("Excluir Produto", f"Deseja excluir o código {codigo}?"):
             with conn:
                 cursor.execute("DELETE FROM produtos WHERE codigo=?", (codigo,))
+                cursor.execute("DELETE FROM app_meta WHERE key=?", (f"estoque_nivel:{codigo}",))
             listar_estoque()
     def carregar_produto_selecionado():
         item = tree.selection()
@@ -5583,6 +8211,7 @@ def abrir_sistema_com_logo(username, login_win):
                     """,
                     (nome, tipo, custo, preco, qtd, codigo),
                 )
+            estoque_verificar(codigos=[codigo])
             listar_estoque()
             messagebox.showinfo("Sucesso", "Produto atualizado com sucesso!")
             ent_codigo.config(state="normal")
@@ -5624,8 +8253,17 @@ def abrir_sistema_com_logo(username, login_win):
     tree_cli.column("Telefone", width=160, anchor="center")
     tree_cli.pack(side="left", fill="both", expand=True)
     scroll_cli = ttk.Scrollbar(frame_cli, orient="vertical", command=tree_cli.yview)
-    tree_cli.configure(yscroll=scroll_cli.set)
     scroll_cli.pack(side="right", fill="y")
+    # Paginação por keyset (nome, cpf): carrega mais clientes ao rolar perto do fim
+    cli_filtro = {"q": ""}
+
+    def _cli_fetch_page(ultima, limite):
+        return consultar_clientes(cli_filtro["q"], ultima, limite, cur=cursor)
+
+    pager_cli = PagedTreeview(
+        tree_cli, scroll_cli, _cli_fetch_page,
+        lambda r: (r[0], (r[0], r[1], r[2])), zebra=True,
+    )
     # -- FORMULÁRIO --
     form_cli = ttk.Frame(aba_clientes, padding=8)
     form_cli.pack(fill="x")
@@ -5645,12 +8283,8 @@ def abrir_sistema_com_logo(username, login_win):
     # -- FUNÇÕES --
     @ui_safe('Clientes')
     def carregar_clientes():
-        tree_cli.delete(*tree_cli.get_children())
-        for cpf, nome, tel in cursor.execute(
-            "SELECT cpf, nome, telefone FROM clientes ORDER BY nome"
-        ):
-            tree_cli.insert("", "end", values=(cpf, nome, tel))
-        apply_zebra(tree_cli)
+        cli_filtro["q"] = ""
+        pager_cli.recarregar()
     def salvar_cliente():
         """Salva cliente e permite troca de CPF (migração completa de referências)."""
         cpf = (e_cpf.get() or "").strip()
@@ -5686,6 +8320,10 @@ def abrir_sistema_com_logo(username, login_win):
                     cursor.execute("UPDATE resgates_pontos SET cpf=? WHERE cpf=?", (cpf, orig))
                 except Exception as ex:
                     logging.error("Erro ignorado: %s", ex, exc_info=True)
+                try:
+                    cursor.execute("UPDATE pontos_movimentos SET cpf=? WHERE cpf=?", (cpf, orig))
+                except Exception as ex:
+                    logging.error("Erro ignorado: %s", ex, exc_info=True)
                 # pontuacao (PK cpf) com merge
                 try:
                     cursor.execute("SELECT COALESCE(pontos,0) FROM pontuacao WHERE cpf=?", (orig,))
@@ -5720,26 +8358,24 @@ def abrir_sistema_com_logo(username, login_win):
     # -- BUSCA POR NOME (filtro incremental) --
     filtro_frame = ttk.Frame(aba_clientes, padding=8)
     filtro_frame.pack(fill="x")
-    ttk.Label(filtro_frame, text="Buscar por nome").pack(side="left", padx=6)
+    ttk.Label(filtro_frame, text="Buscar (nome, CPF ou telefone)").pack(side="left", padx=6)
     e_busca_nome = ttk.Entry(filtro_frame, width=30)
     e_busca_nome.pack(side="left")
     def carregar_clientes_filtrado(query: str = ""):
-        tree_cli.delete(*tree_cli.get_children())
-        q = (query or "").strip()
-        if q:
-            cursor.execute(
-                "SELECT cpf, nome, telefone FROM clientes WHERE nome LIKE ? ORDER BY nome",
-                (f"%{q}%",),
-            )
-        else:
-            cursor.execute("SELECT cpf, nome, telefone FROM clientes ORDER BY nome")
-        for cpf, nome, tel in cursor.fetchall():
-            tree_cli.insert("", "end", values=(cpf, nome, tel))
-        apply_zebra(tree_cli)
+        cli_filtro["q"] = (query or "").strip()
+        pager_cli.recarregar()
+    def _aplicar_busca_cli(q, linhas):
+        cli_filtro["q"] = (q or "").strip()
+        pager_cli.aplicar(linhas)
+    busca_cli = BuscaIncremental(
+        e_busca_nome,
+        lambda q: consultar_clientes(q, limite=pager_cli.page_size),
+        _aplicar_busca_cli,
+    )
     def _on_busca_nome(_evt=None):
-        carregar_clientes_filtrado(e_busca_nome.get())
+        busca_cli.agendar(e_busca_nome.get())
     e_busca_nome.bind("<KeyRelease>", _on_busca_nome)
-    e_busca_nome.bind("<Return>", _on_busca_nome)
+    e_busca_nome.bind("<Return>", lambda e: busca_cli.agora(e_busca_nome.get()))
     def carregar_para_edicao(event=None):
         item = tree_cli.selection()
         if not item:
@@ -5761,7 +8397,7 @@ def abrir_sistema_com_logo(username, login_win):
     ttk.Button(form_cli, text="Salvar Cliente", command=salvar_cliente).grid(
         row=1, column=1, pady=8
     )
-    carregar_clientes()
+    abas_lazy.registrar(aba_clientes, carregar_clientes)
     
     # Adicionar status bar na aba Clientes
     add_tab_statusbar(aba_clientes)
@@ -6028,24 +8664,17 @@ def abrir_sistema_com_logo(username, login_win):
 
     def carregar_devedores():
         try:
-            for iid in tree_devedores.get_children(""):
-                tree_devedores.delete(iid)
             cursor.execute(
                 """SELECT id, cpf, nome, data_pagamento, COALESCE(valor,0), COALESCE(pago,0)
                    FROM devedores
                    ORDER BY COALESCE(pago,0) ASC, date(data_iso) ASC, nome ASC"""
             )
             rows = cursor.fetchall() or []
+            linhas = []
             for (id_, cpf, nome, data_pag, valor, pago) in rows:
                 status = "Pago" if int(pago or 0) == 1 else "Pendente"
-                tree_devedores.insert(
-                    "", "end",
-                    values=(id_, cpf or "", nome or "", data_pag or "", f"R$ {float(valor or 0.0):.2f}", status)
-                )
-            try:
-                apply_zebra(tree_devedores)
-            except Exception as ex:
-                logging.error("Erro ignorado: %s", ex, exc_info=True)
+                linhas.append((id_, (id_, cpf or "", nome or "", data_pag or "", f"R$ {float(valor or 0.0):.2f}", status)))
+            sync_treeview(tree_devedores, linhas, zebra=True)
         except Exception as ex:
             try:
                 logging.error(f"Falha ao carregar devedores: {ex}", exc_info=True)
@@ -6127,8 +8756,8 @@ def abrir_sistema_com_logo(username, login_win):
 
             cursor.execute("UPDATE devedores SET pago=1, pago_em=? WHERE id=?", (pago_em, id_))
             cursor.execute(
-                "INSERT INTO caixa(valor, data, hora, motivo) VALUES(?,?,?,?)",
-                (float(valor_pago), data_caixa, hora_caixa, motivo_caixa),
+                "INSERT INTO caixa(valor, data, hora, motivo, data_iso) VALUES(?,?,?,?,?)",
+                (float(valor_pago), data_caixa, hora_caixa, motivo_caixa, _br_to_iso(data_caixa)),
             )
         carregar_devedores()
         messagebox.showinfo("OK", "Marcado como PAGO.")
@@ -6170,7 +8799,7 @@ def abrir_sistema_com_logo(username, login_win):
     ttk.Button(btns_dev, text="🗑 Excluir", style="Secondary.TButton", command=excluir_devedor).pack(side="left", padx=6)
     ttk.Button(btns_dev, text="🔄 Atualizar", style="Secondary.TButton", command=carregar_devedores).pack(side="right", padx=6)
 
-    carregar_devedores()
+    abas_lazy.registrar(aba_devedores, carregar_devedores)
 
     # Adicionar status bar na aba Devedores
     add_tab_statusbar(aba_devedores)
@@ -6217,7 +8846,6 @@ def abrir_sistema_com_logo(username, login_win):
 
     tree_pontos.pack(side="left", fill="both", expand=True)
     pt_scroll = ttk.Scrollbar(pt_table_frame, orient="vertical", command=tree_pontos.yview)
-    tree_pontos.configure(yscroll=pt_scroll.set)
     pt_scroll.pack(side="right", fill="y")
 
     pt_actions = ttk.Frame(aba_pontuacao, padding=8)
@@ -6238,66 +8866,40 @@ def abrir_sistema_com_logo(username, login_win):
     btn_resgatar.pack(side="right", padx=6)
 
 
-    def _ultimo_resgate_str(cpf: str) -> str:
-        try:
-            cursor.execute(
-                "SELECT item, data, hora FROM resgates_pontos WHERE cpf=? ORDER BY id DESC LIMIT 1",
-                (cpf,),
-            )
-            r = cursor.fetchone()
-            if not r:
-                return ""
-            item, data, hora = r
-            return f"{item} ({data} {hora})"
-        except Exception:
-            return ""
+    # Paginação por keyset (pontos DESC, nome, cpf)
+    pts_filtro = {"q": ""}
 
+    def _pts_fetch_page(ultima, limite):
+        return consultar_pontuacao(pts_filtro["q"], ultima, limite, cur=cursor)
+
+    def _pts_row_to_item(row):
+        cpf, nome, pontos, last = row
+        cpf_iid = str((cpf or "")).strip()
+        return (cpf_iid, (cpf_iid, nome, int(pontos or 0), last or ""))
+
+    pager_pts = PagedTreeview(tree_pontos, pt_scroll, _pts_fetch_page, _pts_row_to_item, zebra=True)
 
     @ui_safe('Pontuação')
     def carregar_pontuacao(query: str = ""):
-        # Limpa a Treeview (robusto)
-        for _iid in tree_pontos.get_children():
-            tree_pontos.delete(_iid)
-        q = (query or "").strip()
-        if q:
-            cursor.execute(
-                """
-                SELECT c.cpf, COALESCE(c.nome,''), COALESCE(p.pontos,0)
-                FROM clientes c
-                LEFT JOIN pontuacao p ON p.cpf=c.cpf
-                WHERE c.cpf LIKE ? OR c.nome LIKE ?
-                ORDER BY COALESCE(p.pontos,0) DESC, c.nome ASC
-                """,
-                (f"%{q}%", f"%{q}%"),
-            )
-        else:
-            cursor.execute(
-                """
-                SELECT c.cpf, COALESCE(c.nome,''), COALESCE(p.pontos,0)
-                FROM clientes c
-                LEFT JOIN pontuacao p ON p.cpf=c.cpf
-                ORDER BY COALESCE(p.pontos,0) DESC, c.nome ASC
-                """
-            )
+        pts_filtro["q"] = (query or "").strip()
+        pager_pts.recarregar()
 
 
-        for cpf, nome, pontos in cursor.fetchall() or []:
-            cpf_iid = str((cpf or "")).strip()
-            last = _ultimo_resgate_str(cpf_iid)
-            vals = (cpf_iid, nome, int(pontos or 0), last)
-            # Proteção anti-colisão de iid: se já existir, apenas atualiza os valores
-            if tree_pontos.exists(cpf_iid):
-                tree_pontos.item(cpf_iid, values=vals)
-            else:
-                tree_pontos.insert("", "end", iid=cpf_iid, values=vals)
-        apply_zebra(tree_pontos)
+    def _aplicar_busca_pts(q, linhas):
+        pts_filtro["q"] = (q or "").strip()
+        pager_pts.aplicar(linhas)
 
+    busca_pts = BuscaIncremental(
+        ent_busca_pts,
+        lambda q: consultar_pontuacao(q, limite=pager_pts.page_size),
+        _aplicar_busca_pts,
+    )
 
     def _on_busca_pts(_evt=None):
-        carregar_pontuacao(ent_busca_pts.get())
+        busca_pts.agendar(ent_busca_pts.get())
 
     ent_busca_pts.bind("<KeyRelease>", _on_busca_pts)
-    ent_busca_pts.bind("<Return>", _on_busca_pts)
+    ent_busca_pts.bind("<Return>", lambda e: busca_pts.agora(ent_busca_pts.get()))
 
 
     def _on_select_pts(_evt=None):
@@ -6343,10 +8945,7 @@ def abrir_sistema_com_logo(username, login_win):
     btn_resgatar.config(command=_do_resgatar)
     btn_refresh_pts.config(command=lambda: carregar_pontuacao(ent_busca_pts.get()))
 
-    try:
-        carregar_pontuacao()
-    except Exception as ex:
-        logging.error("Erro ignorado: %s", ex, exc_info=True)
+    abas_lazy.registrar(aba_pontuacao, carregar_pontuacao)
     # Adicionar status bar na aba Pontuação
     add_tab_statusbar(aba_pontuacao)
 # ====== VENDAS ======
@@ -6588,16 +9187,14 @@ def abrir_sistema_com_logo(username, login_win):
             hora = datetime.datetime.now().strftime("%H:%M:%S")
             with conn:
                 cursor.execute(
-                    "INSERT INTO vendas(cliente,cpf,produto,quantidade,total,pagamento,data,hora) VALUES (?,?,?,?,?,?,?,?)",
-                    (cliente, cpf, nome_prod, qtd, total, pagamento, data, hora),
+                    "INSERT INTO vendas(cliente,cpf,produto,quantidade,total,pagamento,data,hora,data_iso) VALUES (?,?,?,?,?,?,?,?,?)",
+                    (cliente, cpf, nome_prod, qtd, total, pagamento, data, hora, _br_to_iso(data)),
                 )
+                venda_id = cursor.lastrowid
+                vendas_diario_aplicar(_br_to_iso(data), pagamento, nome_prod, qtd, total)
 
                 # >>> NOVO: soma pontos do cliente (1 R$ = 1 ponto)
-                cursor.execute(
-                    "INSERT OR IGNORE INTO pontuacao(cpf,pontos,atualizado_em) VALUES(?,?,?)",
-                    (cpf, 0, now_br()),
-                )
-                adicionar_pontos_cliente(cpf, total)
+                adicionar_pontos_cliente(cpf, total, origem='venda', ref_id=venda_id)
                 # <<< FIM NOVO: pontos
                 if venda_cadastrada:
                     cursor.execute(
@@ -6639,28 +9236,72 @@ def abrir_sistema_com_logo(username, login_win):
                 motivo_caixa = (motivo_caixa or '').strip()[:90]
                 try:
                     cursor.execute(
-                        "INSERT INTO caixa(valor,data,hora,motivo) VALUES (?,?,?,?)",
-                        (total, data, hora, motivo_caixa),
+                        "INSERT INTO caixa(valor,data,hora,motivo,data_iso) VALUES (?,?,?,?,?)",
+                        (total, data, hora, motivo_caixa, _br_to_iso(data)),
                     )
                 except Exception:
                     cursor.execute(
-                        "INSERT INTO caixa(valor,data,hora) VALUES (?,?,?)",
-                        (total, data, hora),
+                        "INSERT INTO caixa(valor,data,hora,data_iso) VALUES (?,?,?,?)",
+                        (total, data, hora, _br_to_iso(data)),
                     )
                 cursor.execute(
                     "INSERT OR IGNORE INTO clientes(cpf,nome) VALUES (?,?)",
                     (cpf, cliente),
                 )
+            if venda_cadastrada:
+                estoque_verificar(codigos=[codigo])
             listar_estoque()
             # Atualiza a lista de vendas do dia automaticamente
             try:
                 aba_vendas.after(30, carregar_vendas_dia)
             except Exception as ex:
                 logging.error("Erro ignorado: %s", ex, exc_info=True)
-            # Gerar cupom e enviar por e-mail, se marcado
+            # Cupom / Telegram / e-mail em segundo plano: o caixa já pode iniciar a próxima venda
             try:
-                caminho_pdf = gerar_cupom(cliente or "", nome_prod, qtd, pagamento or "", total, cpf=cpf)
+                email_cliente = ent_email_v.get().strip() if var_enviar_email.get() == 1 else ""
+            except Exception:
+                email_cliente = ""
 
+            def _email_feito(res):
+                ok, detail = res
+                if not ok:
+                    try:
+                        messagebox.showwarning("E-mail", f"Falha ao enviar e-mail:\n{detail}")
+                    except Exception as ex:
+                        logging.error("Erro ignorado: %s", ex, exc_info=True)
+
+            def _enviar_email_job(caminho_pdf):
+                ok, detail = enviar_cupom_email(email_cliente, caminho_pdf)
+                if not ok and str(detail).startswith("Falha SSL/TLS"):
+                    raise RuntimeError(detail)  # falha de conexão: JOBS repete com backoff
+                return ok, detail
+
+            # Cupom na térmica: o PDF só abre no visualizador se a impressão falhar
+            termica = {"status": None if AUTO_PRINT_CUPOM else "desligada", "pdf": None}
+
+            def _abrir_pdf_cupom(caminho_pdf):
+                try:
+                    open_in_default_app(caminho_pdf)
+                except Exception as ex:
+                    logging.error("Erro ignorado: %s", ex, exc_info=True)
+                bring_app_to_front()
+
+            def _termica_feita(res):
+                ok, detalhe = res
+                termica["status"] = "ok" if ok else "falhou"
+                if ok:
+                    return
+                try:
+                    messagebox.showwarning("Impressora térmica", f"Cupom não impresso na térmica:\n{detalhe}\n\nO PDF será aberto.")
+                except Exception as ex:
+                    logging.error("Erro ignorado: %s", ex, exc_info=True)
+                if termica["pdf"]:
+                    _abrir_pdf_cupom(termica["pdf"])
+
+            def _cupom_pronto(caminho_pdf):
+                termica["pdf"] = caminho_pdf
+                if termica["status"] in ("desligada", "falhou"):
+                    _abrir_pdf_cupom(caminho_pdf)
                 try:
                     telegram_notify(f"""✅ <b>VENDA REALIZADA</b>
                 👤 Cliente: {cliente}
@@ -6677,29 +9318,32 @@ def abrir_sistema_com_logo(username, login_win):
                     logging.error("Erro ignorado: %s", ex, exc_info=True)
                 # valida o caminho do PDF antes de enviar
                 if not caminho_pdf or not os.path.isfile(caminho_pdf):
-                    try:
+                    if email_cliente:
                         messagebox.showwarning("E-mail", "Cupom não foi gerado corretamente. O envio por e-mail foi pulado.")
-                    except Exception as ex:
-                        logging.error("Erro ignorado: %s", ex, exc_info=True)
-                    email_cliente = ""  # força pular envio
-                # Captura e-mail e tenta enviar
-                try:
-                    email_cliente = ent_email_v.get().strip()
-                except Exception:
-                    email_cliente = ""
-                if var_enviar_email.get() == 1 and email_cliente:
-                    ok, detail = enviar_cupom_email(email_cliente, caminho_pdf)
-                    if not ok:
-                        try:
-                            messagebox.showwarning("E-mail", f"Falha ao enviar e-mail:\n{detail}")
-                        except Exception as ex:
-                            logging.error("Erro ignorado: %s", ex, exc_info=True)
-            except Exception as e:
-                logging.error(f"Falha ao gerar/enviar cupom: {e}", exc_info=True)
+                    return
+                if email_cliente:
+                    JOBS.submit(
+                        _enviar_email_job, caminho_pdf,
+                        on_done=_email_feito,
+                        on_error=lambda e: _email_feito((False, str(e))),
+                        retries=2, backoff_sec=5.0,
+                    )
+
+            def _cupom_falhou(e):
                 try:
                     messagebox.showerror("Cupom/E-mail", "Erro: " + str(e))
                 except Exception as ex:
                     logging.error("Erro ignorado: %s", ex, exc_info=True)
+
+            if AUTO_PRINT_CUPOM:
+                JOBS.submit(
+                    imprimir_cupom_termica, cliente or "", nome_prod, qtd, pagamento or "", total, cpf=cpf,
+                    on_done=_termica_feita, on_error=lambda e: _termica_feita((False, str(e))),
+                )
+            JOBS.submit(
+                gerar_cupom, cliente or "", nome_prod, qtd, pagamento or "", total, cpf=cpf, abrir_pdf=False,
+                venda_id=venda_id, on_done=_cupom_pronto, on_error=_cupom_falhou,
+            )
         except Exception as ex:
             logging.error("Falha ao finalizar venda", exc_info=True)
             try:
@@ -6846,6 +9490,7 @@ def abrir_sistema_com_logo(username, login_win):
             with conn:
                 # Remove a venda
                 cursor.execute("DELETE FROM vendas WHERE id=?", (_id,))
+                vendas_diario_aplicar(_br_to_iso(data_v), pagamento, produto, qtd, total, sinal=-1)
 
                 # Devolve estoque se for um produto cadastrado (por nome)
                 try:
@@ -6858,12 +9503,13 @@ def abrir_sistema_com_logo(username, login_win):
                 # Estorna no caixa (lançamento negativo com motivo)
                 try:
                     cursor.execute(
-                        "INSERT INTO caixa(valor,data,hora,motivo) VALUES (?,?,?,?)",
-                        (-float(total), data_v, hora_now, f"Estorno - exclusão venda ID {_id}"),
+                        "INSERT INTO caixa(valor,data,hora,motivo,data_iso) VALUES (?,?,?,?,?)",
+                        (-float(total), data_v, hora_now, f"Estorno - exclusão venda ID {_id}", _br_to_iso(data_v)),
                     )
                 except Exception:
                     # Compatibilidade caso algum banco antigo não tenha motivo/hora
-                    cursor.execute("INSERT INTO caixa(valor,data) VALUES (?,?)", (-float(total), data_v))
+                    cursor.execute("INSERT INTO caixa(valor,data,data_iso) VALUES (?,?,?)", (-float(total), data_v, _br_to_iso(data_v)))
+            estoque_verificar(nomes=[str(produto)])
 
             # Atualiza telas
             try:
@@ -6897,8 +9543,7 @@ def abrir_sistema_com_logo(username, login_win):
 
     @ui_safe('Vendas')
     def carregar_vendas_dia():
-        tree_vendas.delete(*tree_vendas.get_children())
-        hoje = today_br()
+        hoje = today_iso()
         filtro = (combo_filtro_pg.get() or "").strip()
 
         if filtro:
@@ -6906,7 +9551,7 @@ def abrir_sistema_com_logo(username, login_win):
                 """
                 SELECT id, hora, cliente, produto, quantidade, pagamento, total
                 FROM vendas
-                WHERE data=? AND pagamento=?
+                WHERE data_iso=? AND pagamento=?
                 ORDER BY hora DESC
                 """,
                 (hoje, filtro),
@@ -6916,29 +9561,22 @@ def abrir_sistema_com_logo(username, login_win):
                 """
                 SELECT id, hora, cliente, produto, quantidade, pagamento, total
                 FROM vendas
-                WHERE data=?
+                WHERE data_iso=?
                 ORDER BY hora DESC
                 """,
                 (hoje,),
             )
 
+        linhas = []
         for vid, hora, cliente, produto, qtd, pagamento, total in cursor.fetchall():
             tag = pagamento if pagamento in ("PIX", "Cartão", "Dinheiro") else "default"
-            tree_vendas.insert(
-                "",
-                "end",
-                iid=str(vid),
-                values=(hora, cliente, produto, qtd, pagamento, f"R$ {float(total):.2f}"),
-                tags=(tag,),
-            )
+            linhas.append((vid, (hora, cliente, produto, qtd, pagamento, f"R$ {float(total):.2f}"), (tag,)))
+        sync_treeview(tree_vendas, linhas)
 
     combo_filtro_pg.bind("<<ComboboxSelected>>", lambda e: carregar_vendas_dia())
 
-    # Carrega vendas ao abrir a aba
-    try:
-        carregar_vendas_dia()
-    except Exception as ex:
-        logging.error("Erro ignorado: %s", ex, exc_info=True)
+    # Carrega vendas ao abrir a aba (e a cada seleção)
+    abas_lazy.registrar(aba_vendas, carregar_vendas_dia, sempre=True)
     # Adicionar status bar na aba Vendas
     add_tab_statusbar(aba_vendas)
 # ====== CAIXA ======
@@ -6991,8 +9629,8 @@ def abrir_sistema_com_logo(username, login_win):
                 pass
             # OS aprovadas do dia (somente aprovadas)
             try:
-                hoje = today_br()
-                cursor.execute("SELECT COALESCE(SUM(valor),0), COUNT(1) FROM manutencao WHERE COALESCE(aprovado,0)=1 AND data=?", (hoje,))
+                hoje = today_iso()
+                cursor.execute("SELECT COALESCE(SUM(valor),0), COUNT(1) FROM manutencao WHERE data_iso=? AND COALESCE(aprovado,0)=1", (hoje,))
                 _sum_os, _cnt_os = cursor.fetchone() or (0, 0)
                 _sum_os = float(_sum_os or 0.0)
                 _cnt_os = int(_cnt_os or 0)
@@ -7005,11 +9643,7 @@ def abrir_sistema_com_logo(username, login_win):
                 logging.error("Erro ignorado: %s", ex, exc_info=True)
         except Exception as ex:
             logging.error("Erro ignorado: %s", ex, exc_info=True)
-    # Atualiza ao abrir a aba (primeira renderização)
-    try:
-        atualizar_totais_ganho_dia_caixa()
-    except Exception as ex:
-        logging.error("Erro ignorado: %s", ex, exc_info=True)
+    # Primeira renderização: atualizar_caixa() (aba sob demanda) chama atualizar_totais_ganho_dia_caixa
     lbl_data_hora = ttk.Label(top_cx, text="", font=("Segoe UI", 10))
     lbl_data_hora.pack(side="right", padx=6)
     caixa_ops = ttk.Frame(f_cx)
@@ -7077,8 +9711,8 @@ def abrir_sistema_com_logo(username, login_win):
 
             with conn:
                 cursor.execute(
-                    "INSERT INTO caixa(valor,data,hora,motivo) VALUES (?,?,?,?)",
-                    (-valor, hoje, hora, motivo),
+                    "INSERT INTO caixa(valor,data,hora,motivo,data_iso) VALUES (?,?,?,?,?)",
+                    (-valor, hoje, hora, motivo, _br_to_iso(hoje)),
                 )
 
             ent_saida_cx.delete(0, "end")
@@ -7190,18 +9824,28 @@ def abrir_sistema_com_logo(username, login_win):
     scrollbar_cx = ttk.Scrollbar(
         tree_cx_frame, orient="vertical", command=tree_cx.yview
     )
-    tree_cx.configure(yscroll=scrollbar_cx.set)
     scrollbar_cx.pack(side="right", fill="y")
+
+    def _cx_fetch_page(ultima, limite):
+        if ultima is None:
+            return cursor.execute(
+                "SELECT id, data, total FROM fechamento_caixa ORDER BY id DESC LIMIT ?", (limite,)
+            ).fetchall()
+        return cursor.execute(
+            "SELECT id, data, total FROM fechamento_caixa WHERE id < ? ORDER BY id DESC LIMIT ?",
+            (ultima[0], limite),
+        ).fetchall()
+
+    pager_cx = PagedTreeview(
+        tree_cx, scrollbar_cx, _cx_fetch_page,
+        lambda r: (r[0], (r[1], f"R$ {float(r[2] or 0):.2f}")),
+    )
     @ui_safe('Caixa')
     def carregar_historico_cx():
         try:
             if not tree_cx.winfo_exists():
                 return
-            tree_cx.delete(*tree_cx.get_children())
-            for row in cursor.execute(
-                "SELECT data,total FROM fechamento_caixa ORDER BY data DESC"
-            ):
-                tree_cx.insert("", "end", values=(row[0], f"R$ {row[1]:.2f}"))
+            pager_cx.recarregar()
         except tk.TclError:
             return
         except Exception as ex:
@@ -7219,13 +9863,14 @@ def abrir_sistema_com_logo(username, login_win):
         pdf_dia = None
         pdf_mes = None
         pdf_path = None
-        cursor.execute("SELECT MAX(data) FROM caixa")
-        ultima_data = cursor.fetchone()[0]
+        cursor.execute("SELECT MAX(data_iso) FROM caixa")
+        ultima_iso = cursor.fetchone()[0]
+        ultima_data = f"{ultima_iso[8:10]}/{ultima_iso[5:7]}/{ultima_iso[0:4]}" if ultima_iso else None
         if ultima_data and ultima_data != hoje:
             # Fecha automaticamente o dia anterior (gera relatório antes de limpar a tabela 'caixa')
-            cursor.execute("SELECT COUNT(1) FROM caixa WHERE data=?", (ultima_data,))
+            cursor.execute("SELECT COUNT(1) FROM caixa WHERE data_iso=?", (ultima_iso,))
             qtd_lanc = int((cursor.fetchone() or [0])[0] or 0)
-            cursor.execute("SELECT SUM(valor) FROM caixa WHERE data=?", (ultima_data,))
+            cursor.execute("SELECT SUM(valor) FROM caixa WHERE data_iso=?", (ultima_iso,))
             total_ultimo = cursor.fetchone()[0] or 0
             if qtd_lanc > 0:
                 # 1) Registra fechamento
@@ -7286,7 +9931,7 @@ def abrir_sistema_com_logo(username, login_win):
                 logging.error("Erro ignorado: %s", ex, exc_info=True)
             # 4) Somente agora apagamos os lançamentos do dia do caixa
             with conn:
-                cursor.execute("DELETE FROM caixa WHERE data=?", (ultima_data,))
+                cursor.execute("DELETE FROM caixa WHERE data_iso=?", (ultima_iso,))
             pdf_path = pdf_path or pdf_dia or pdf_mes or "(sem relatório)"
             messagebox.showinfo(
                 "Fechar Caixa",
@@ -7297,64 +9942,85 @@ def abrir_sistema_com_logo(username, login_win):
 
     @ui_safe('Caixa')
     def fechar_caixa():
-        """Fecha o caixa do dia (manual) e gera relatório diário.
-        Retorna o caminho do PDF (ou None)."""
+        """Fecha o caixa do dia (manual). Relatórios, backups e a limpeza do caixa
+        seguem em segundo plano (JOBS); a UI é avisada ao concluir."""
         try:
             agora = datetime.datetime.now()
             hoje = agora.strftime("%d/%m/%Y")
-            cursor.execute("SELECT COUNT(1) FROM caixa WHERE data=?", (hoje,))
+            hoje_iso = agora.strftime("%Y-%m-%d")
+            cursor.execute("SELECT COUNT(1) FROM caixa WHERE data_iso=?", (hoje_iso,))
             qtd = int((cursor.fetchone() or [0])[0] or 0)
-            cursor.execute("SELECT COALESCE(SUM(valor),0) FROM caixa WHERE data=?", (hoje,))
+            cursor.execute("SELECT COALESCE(SUM(valor),0) FROM caixa WHERE data_iso=?", (hoje_iso,))
             total_dia = float((cursor.fetchone() or [0])[0] or 0.0)
             if qtd <= 0:
                 messagebox.showwarning("Fechar Caixa", f"Não há lançamentos para fechar no dia {hoje}.")
                 return None
             if not messagebox.askyesno("Fechar Caixa", f"Deseja fechar o caixa do dia {hoje}?\n\nTotal do dia: R$ {total_dia:.2f}"):
                 return None
-            # 1) Registra fechamento
+            # 1) Registra fechamento (e o último lançamento coberto por ele)
             with conn:
                 cursor.execute("INSERT OR REPLACE INTO fechamento_caixa (data,total) VALUES (?,?)", (hoje, total_dia))
-            # 2) Gera relatório diário
-            pdf_path = None
-            try:
-                pdf_path = gerar_relatorio_vendas_dia_pdf(data_str=hoje, abrir_pdf=True)
-            except Exception as ex:
-                logging.error(f"Falha ao gerar relatório diário ({hoje}): {ex}", exc_info=True)
-            # 2.1) Se for último dia do mês, tenta gerar também o mensal (best-effort)
-            try:
-                dmY = _parse_br_date_flex(hoje)
-                if dmY:
-                    d, mo, y = dmY
-                    if d == calendar.monthrange(y, mo)[1]:
-                        _ = gerar_relatorio_vendas_mes_pdf(y, mo, abrir_pdf=True)
-            except Exception as ex:
-                logging.error("Erro ignorado: %s", ex, exc_info=True)
-            # 3) Telegram / Backups (best-effort)
-            try:
-                telegram_notify(f"🔒 CAIXA FECHADO\nData: {hoje}\nTotal: R$ {total_dia:.2f}", dedupe_key=f"fech_{hoje}", dedupe_window_sec=120)
-            except Exception as ex:
-                logging.error("Erro ignorado: %s", ex, exc_info=True)
-            try:
-                if pdf_path:
-                    telegram_send_pdf(f"📄 Relatório do dia {hoje}", pdf_path, dedupe_key=f"rel_dia_{hoje}", dedupe_window_sec=600)
-            except Exception as ex:
-                logging.error("Erro ignorado: %s", ex, exc_info=True)
-            try:
-                backup_banco()
-                backup_bulk_dir(os.path.join(os.getcwd(), "cupons"), "cupons")
-                backup_bulk_dir(os.path.join(os.getcwd(), "OS"), "OS")
-                backup_bulk_dir(os.path.join(os.getcwd(), "relatorios"), "relatorios")
-            except Exception as ex:
-                logging.error("Erro ignorado: %s", ex, exc_info=True)
-            # 4) Limpa lançamentos do dia
-            with conn:
-                cursor.execute("DELETE FROM caixa WHERE data=?", (hoje,))
-            messagebox.showinfo("Fechar Caixa", f"Caixa do dia {hoje} fechado com sucesso!\nRelatório gerado:\n{pdf_path or '(sem relatório)'}")
-            try:
-                carregar_historico_cx()
-            except Exception as ex:
-                logging.error("Erro ignorado: %s", ex, exc_info=True)
-            return pdf_path
+            cursor.execute("SELECT COALESCE(MAX(id),0) FROM caixa WHERE data_iso=?", (hoje_iso,))
+            ultimo_id = int((cursor.fetchone() or [0])[0] or 0)
+
+            # 2) Relatórios + backups em segundo plano (lêem 'caixa' antes da limpeza)
+            def _fechamento_job():
+                pdf_dia = None
+                pdf_mes = None
+                try:
+                    pdf_dia = gerar_relatorio_vendas_dia_pdf(data_str=hoje, abrir_pdf=False)
+                except Exception as ex:
+                    logging.error(f"Falha ao gerar relatório diário ({hoje}): {ex}", exc_info=True)
+                # 2.1) Se for último dia do mês, tenta gerar também o mensal (best-effort)
+                try:
+                    dmY = _parse_br_date_flex(hoje)
+                    if dmY:
+                        d, mo, y = dmY
+                        if d == calendar.monthrange(y, mo)[1]:
+                            pdf_mes = gerar_relatorio_vendas_mes_pdf(y, mo, abrir_pdf=False)
+                except Exception as ex:
+                    logging.error("Erro ignorado: %s", ex, exc_info=True)
+                try:
+                    backup_banco()
+                    backup_bulk_dir(os.path.join(os.getcwd(), "cupons"), "cupons")
+                    backup_bulk_dir(os.path.join(os.getcwd(), "OS"), "OS")
+                    backup_bulk_dir(os.path.join(os.getcwd(), "relatorios"), "relatorios")
+                except Exception as ex:
+                    logging.error("Erro ignorado: %s", ex, exc_info=True)
+                return pdf_dia, pdf_mes
+
+            def _fechamento_pronto(res):
+                pdf_path, pdf_mes = res
+                for caminho in (pdf_path, pdf_mes):
+                    if caminho:
+                        try:
+                            open_in_default_app(caminho)
+                        except Exception as ex:
+                            logging.error("Erro ignorado: %s", ex, exc_info=True)
+                bring_app_to_front()
+                # 3) Telegram (best-effort)
+                try:
+                    telegram_notify(f"🔒 CAIXA FECHADO\nData: {hoje}\nTotal: R$ {total_dia:.2f}", dedupe_key=f"fech_{hoje}", dedupe_window_sec=120)
+                except Exception as ex:
+                    logging.error("Erro ignorado: %s", ex, exc_info=True)
+                try:
+                    if pdf_path:
+                        telegram_send_pdf(f"📄 Relatório do dia {hoje}", pdf_path, dedupe_key=f"rel_dia_{hoje}", dedupe_window_sec=600)
+                except Exception as ex:
+                    logging.error("Erro ignorado: %s", ex, exc_info=True)
+                # 4) Limpa lançamentos do dia cobertos pelo fechamento
+                with conn:
+                    cursor.execute("DELETE FROM caixa WHERE data_iso=? AND id<=?", (hoje_iso, ultimo_id))
+                messagebox.showinfo("Fechar Caixa", f"Caixa do dia {hoje} fechado com sucesso!\nRelatório gerado:\n{pdf_path or '(sem relatório)'}")
+                try:
+                    carregar_historico_cx()
+                except Exception as ex:
+                    logging.error("Erro ignorado: %s", ex, exc_info=True)
+
+            JOBS.submit(_fechamento_job, on_done=_fechamento_pronto,
+                        on_error=lambda e: messagebox.showerror("Erro", f"Falha ao fechar caixa.\n\nDetalhes: {e}"))
+            show_toast(root, f"Fechando caixa de {hoje}… gerando relatórios.", level="info")
+            return None
         except Exception as ex:
             messagebox.showerror("Erro", f"Falha ao fechar caixa.\n\nDetalhes: {ex}")
             return None
@@ -7400,7 +10066,7 @@ def abrir_sistema_com_logo(username, login_win):
     # ===== FILTRO POR NOME =====
     filtro_m_frame = ttk.Frame(aba_manutencao, padding=8)
     filtro_m_frame.pack(fill="x", pady=6)
-    ttk.Label(filtro_m_frame, text="Filtrar por nome:").pack(side="left", padx=6)
+    ttk.Label(filtro_m_frame, text="Filtrar (nome, CPF, telefone ou descrição):").pack(side="left", padx=6)
     filtro_nome_m_var = tk.StringVar()
     ent_filtro_m = ttk.Entry(filtro_m_frame, textvariable=filtro_nome_m_var, width=30)
     ent_filtro_m.pack(side="left", padx=6)
@@ -7433,37 +10099,47 @@ def abrir_sistema_com_logo(username, login_win):
     tree_m.column("Aprovado", width=100, anchor="center")
     tree_m.pack(side="left", fill="both", expand=True)
     scrollbar_m = ttk.Scrollbar(tree_m_frame, orient="vertical", command=tree_m.yview)
-    tree_m.configure(yscroll=scrollbar_m.set)
     scrollbar_m.pack(side="right", fill="y")
+    # Paginação por keyset: ORDER BY os DESC com WHERE os < ?
+    man_filtro = {"q": ""}
+
+    def _man_fetch_page(ultima, limite):
+        return consultar_manutencao(man_filtro["q"], ultima, limite, cur=cursor)
+
+    def _man_row_to_item(row):
+        aprovado_text = "Sim" if row[7] == 1 else "Não"
+        return (
+            row[0],
+            (
+                row[0],
+                row[1],
+                row[2],
+                row[3],
+                row[4],
+                row[5],
+                f"R$ {row[6]:.2f}",
+                aprovado_text,
+            ),
+        )
+
+    pager_m = PagedTreeview(tree_m, scrollbar_m, _man_fetch_page, _man_row_to_item)
+
     @ui_safe('Manutenção')
     def carregar_manutencao(filtro=""):
-        tree_m.delete(*tree_m.get_children())
-        if filtro:
-            query = "SELECT os, nome, cpf, telefone, descricao, data, COALESCE(valor,0), COALESCE(aprovado,0) FROM manutencao WHERE nome LIKE ? ORDER BY os DESC"
-            rows = cursor.execute(query, (f"%{filtro}%",))
-        else:
-            query = "SELECT os, nome, cpf, telefone, descricao, data, COALESCE(valor,0), COALESCE(aprovado,0) FROM manutencao ORDER BY os DESC"
-            rows = cursor.execute(query)
-        for row in rows:
-            aprovado_text = "Sim" if row[7] == 1 else "Não"
-            tree_m.insert(
-                "",
-                "end",
-                values=(
-                    row[0],
-                    row[1],
-                    row[2],
-                    row[3],
-                    row[4],
-                    row[5],
-                    f"R$ {row[6]:.2f}",
-                    aprovado_text,
-                ),
-            )
+        man_filtro["q"] = (filtro or "").strip()
+        pager_m.recarregar()
+    def _aplicar_busca_m(q, linhas):
+        man_filtro["q"] = (q or "").strip()
+        pager_m.aplicar(linhas)
+    busca_m = BuscaIncremental(
+        ent_filtro_m,
+        lambda q: consultar_manutencao(q, limite=pager_m.page_size),
+        _aplicar_busca_m,
+    )
     def ao_digitar_filtro_m(*args):
-        carregar_manutencao(filtro_nome_m_var.get())
+        busca_m.agendar(filtro_nome_m_var.get())
     filtro_nome_m_var.trace_add("write", ao_digitar_filtro_m)
-    carregar_manutencao()
+    abas_lazy.registrar(aba_manutencao, carregar_manutencao)
     def buscar_cliente_m(event=None):
         try:
             cpf = ent_cpf_m.get().strip()
@@ -7499,32 +10175,31 @@ def abrir_sistema_com_logo(username, login_win):
         data = today_br()
         with conn:
             cursor.execute(
-                "INSERT INTO manutencao(cpf,nome,telefone,descricao,data,valor) VALUES (?,?,?,?,?,?)",
-                (cpf, nome, telefone, desc, data, valor),
+                "INSERT INTO manutencao(cpf,nome,telefone,descricao,data,valor,data_iso) VALUES (?,?,?,?,?,?,?)",
+                (cpf, nome, telefone, desc, data, valor, _br_to_iso(data)),
             )
         os_num = cursor.lastrowid
-        caminho_os_pdf = gerar_os_pdf(
-            os_num,
-            nome,
-            cpf,
-            telefone,
-            desc,
-            valor,
-            abrir_pdf=False,
-            imprimir_termica=AUTO_PRINT_OS,
-        )
+        hora_os = datetime.datetime.now().strftime("%H:%M:%S")
 
-        try:
-            telegram_notify(f"""🧾 <b>NOVA OS REGISTRADA</b>
+        def _os_pdf_pronto(caminho_os_pdf):
+            try:
+                telegram_notify(f"""🧾 <b>NOVA OS REGISTRADA</b>
         🧾 OS Nº: {os_num}
         👤 Cliente: {nome}
         📞 Tel: {telefone}
         📝 Desc: {desc}
         💰 Valor: R$ {valor:.2f}
-        📅 🕒 {data} {datetime.datetime.now().strftime("%H:%M:%S")}""", dedupe_key=f"os_nova_{os_num}", dedupe_window_sec=120)
-            telegram_send_pdf(f"🧾 OS Nº {os_num}", caminho_os_pdf, dedupe_key=f"os_pdf_{os_num}", dedupe_window_sec=300)
-        except Exception as ex:
-            logging.error("Erro ignorado: %s", ex, exc_info=True)
+        📅 🕒 {data} {hora_os}""", dedupe_key=f"os_nova_{os_num}", dedupe_window_sec=120)
+                telegram_send_pdf(f"🧾 OS Nº {os_num}", caminho_os_pdf, dedupe_key=f"os_pdf_{os_num}", dedupe_window_sec=300)
+            except Exception as ex:
+                logging.error("Erro ignorado: %s", ex, exc_info=True)
+
+        # PDF + impressão térmica em segundo plano
+        JOBS.submit(
+            gerar_os_pdf, os_num, nome, cpf, telefone, desc, valor,
+            abrir_pdf=False, imprimir_termica=AUTO_PRINT_OS,
+            on_done=_os_pdf_pronto,
+        )
         carregar_manutencao()
         ent_cpf_m.delete(0, "end")
         ent_nome_m.config(state="normal")
@@ -7613,13 +10288,13 @@ def abrir_sistema_com_logo(username, login_win):
                 motivo_caixa = (motivo_caixa or '').strip()[:90]
                 try:
                     cursor.execute(
-                        "INSERT INTO caixa(valor,data,hora,motivo) VALUES (?,?,?,?)",
-                        (valor, hoje, hora, motivo_caixa),
+                        "INSERT INTO caixa(valor,data,hora,motivo,data_iso) VALUES (?,?,?,?,?)",
+                        (valor, hoje, hora, motivo_caixa, _br_to_iso(hoje)),
                     )
                 except Exception:
                     cursor.execute(
-                        "INSERT INTO caixa(valor,data,hora) VALUES (?,?,?)",
-                        (valor, hoje, hora),
+                        "INSERT INTO caixa(valor,data,hora,data_iso) VALUES (?,?,?,?)",
+                        (valor, hoje, hora, _br_to_iso(hoje)),
                     )
                 cursor.execute(
                     "UPDATE manutencao SET aprovado=1 WHERE os=?", (os_num,)
@@ -7747,7 +10422,7 @@ def abrir_sistema_com_logo(username, login_win):
     ttk.Button(f_d, text="Registrar Devolução", command=registrar_devolucao).grid(
         row=2, column=0, pady=10, sticky="w", padx=6
     )
-    carregar_devolucoes()
+    abas_lazy.registrar(aba_devolucao, carregar_devolucoes)
     # Adicionar status bar na aba Devolução
     add_tab_statusbar(aba_devolucao)
     # ---- Funções de UI: toast e agendador de backup ----
@@ -7761,30 +10436,69 @@ def abrir_sistema_com_logo(username, login_win):
                 messagebox.showinfo('Backup', text)
             except Exception as ex:
                 logging.error("Erro ignorado: %s", ex, exc_info=True)
-    def _backup_timer_tick():
-        """Executa os backups e reprograma o próximo disparo (30 min)."""
+    _backup_estado = {"rodando": False}
+
+    def _backup_status(texto: str):
         try:
-            backup_banco()
-            backup_bulk_dir(os.path.join(os.getcwd(), "cupons"), "cupons")
-            backup_bulk_dir(os.path.join(os.getcwd(), "OS"), "OS")
-            backup_bulk_dir(os.path.join(os.getcwd(), "relatorios"), "relatorios")
-            try:
-                ts = now_br()
-                lbl_status_backup.config(text=f"Backup automático concluído: {ts}")
-                _show_toast_backup("Backup automático concluído", "ok")
-            except Exception as ex:
-                logging.error("Erro ignorado: %s", ex, exc_info=True)
+            lbl_status_backup.config(text=texto)
         except Exception as ex:
             logging.error("Erro ignorado: %s", ex, exc_info=True)
-        finally:
+
+    def _backup_job():
+        """Roda em JOBS (fora da thread do Tk); o progresso volta via JOBS.post."""
+        ultimo = {"pct": -1}
+
+        def _progresso(pct):
+            if pct >= 100 or pct - ultimo["pct"] >= 5:
+                ultimo["pct"] = pct
+                JOBS.post(_backup_status, f"Backup: banco {pct}%")
+
+        destino = backup_banco(progresso=_progresso)
+        if not destino:
+            raise RuntimeError("backup do banco falhou ou não passou no integrity_check")
+        JOBS.post(_backup_status, "Backup: PDFs...")
+        arquivos = total_bytes = 0
+        for pasta in ("cupons", "OS", "relatorios"):
+            n, b = backup_bulk_dir(os.path.join(os.getcwd(), pasta), pasta)
+            arquivos += n
+            total_bytes += b
+        return destino, arquivos, total_bytes
+
+    def _backup_fim(ok: bool, res=None):
+        _backup_estado["rodando"] = False
+        ts = now_br()
+        if ok:
+            _destino, arquivos, total_bytes = res
+            _backup_status(f"Backup automático concluído: {ts} • PDFs: {arquivos} ({total_bytes / 1024:.0f} KB)")
+            _show_toast_backup(f"Backup automático concluído ({arquivos} PDF(s) novos)", "ok")
+        else:
+            _backup_status(f"Backup automático falhou: {ts}")
+            _show_toast_backup("Backup automático falhou (ver log)", "error")
+        try:
             root.after(1_800_000, _backup_timer_tick)
+        except Exception as ex:
+            logging.error("Erro ignorado: %s", ex, exc_info=True)
+
+    def _backup_timer_tick():
+        """Dispara os backups em segundo plano; o próximo disparo (30 min) é agendado ao concluir."""
+        if _backup_estado["rodando"]:
+            return
+        _backup_estado["rodando"] = True
+        _backup_status("Backup: iniciando...")
+        JOBS.submit(
+            _backup_job,
+            on_done=lambda res: _backup_fim(True, res),
+            on_error=lambda _ex: _backup_fim(False),
+        )
     # Disparo inicial: 5 min; depois agenda de 30 min
     root.after(300_000, _backup_timer_tick)
-    # Atualiza os totais do caixa ao abrir a janela
-    try:
-        atualizar_caixa()
-    except Exception as ex:
-        logging.error("Erro ignorado: %s", ex, exc_info=True)
+    # Totais (e fechamento automático do dia anterior) ao abrir a aba Caixa — ou logo após o
+    # login, pelo prefetch (Caixa é a primeira de ABAS_PREFETCH)
+    abas_lazy.registrar(aba_caixa, atualizar_caixa, sempre=True)
+    abas_lazy.registrar(aba_upgrade, carregar_upgrades)
+    abas_lazy.iniciar()
+    PERFIL.marcar("janela principal (abas e widgets)")
+    root.after_idle(lambda: PERFIL.relatorio("sistema aberto"))
     # ====== STATUS BAR (versão | backup | usuário | data/hora) ======
     statusbar = tk.Frame(root, bg=palette['panel'], highlightbackground=palette['border'], highlightthickness=1)
     statusbar.pack(side='bottom', fill='x', pady=(0, 10))
@@ -7799,7 +10513,7 @@ def abrir_sistema_com_logo(username, login_win):
     lbl_status_user.pack(side='right', padx=10, pady=6)
 
     # --- Licença (tempo restante) na Status Bar ---
-    lbl_status_licenca = tk.Label(statusbar, text=get_tempo_restante_licenca_str(), bg=palette['panel'], fg=palette['muted'], font=('Segoe UI', 9))
+    lbl_status_licenca = tk.Label(statusbar, text='', bg=palette['panel'], fg=palette['muted'], font=('Segoe UI', 9))
     lbl_status_licenca.pack(side='left', padx=10, pady=6)
     try:
         bind_licenca_statusbar_auto_update(root, lbl_status_licenca, interval_ms=60000)
@@ -7808,24 +10522,11 @@ def abrir_sistema_com_logo(username, login_win):
     lbl_status_clock = tk.Label(statusbar, text="", bg=palette['panel'], fg=palette['muted'], font=("Segoe UI", 9))
     lbl_status_clock.pack(side='right', padx=10, pady=6)
 
-    def _tick_clock():
-        try:
-            now = now_br()
-            lbl_status_clock.config(text=now)
-        except Exception as ex:
-            logging.error("Erro ignorado: %s", ex, exc_info=True)
-        root.after(1000, _tick_clock)
-
-    _tick_clock()
-
-    def _refresh_statusbar_theme():
-        try:
-            pal = THEME_DARK if current_theme['name'] == 'dark' else THEME_LIGHT
-            statusbar.configure(bg=pal['panel'], highlightbackground=pal['border'])
-            for w in (lbl_status_left, lbl_status_backup, lbl_status_user, lbl_status_clock):
-                w.configure(bg=pal['panel'], fg=pal['muted'])
-        except Exception as ex:
-            logging.error("Erro ignorado: %s", ex, exc_info=True)
+    # Relógio e cores via serviço único (tick compartilhado; recolore só na troca de tema)
+    STATUSBAR.registrar_tema(statusbar, 'frame')
+    for w in (lbl_status_left, lbl_status_backup, lbl_status_user):
+        STATUSBAR.registrar_tema(w, 'label')
+    STATUSBAR.registrar(lbl_status_clock, STATUSBAR.fonte_relogio('%d/%m/%Y %H:%M:%S'))
 # ================= TELA DE LOGIN =================
 
 def abrir_login():
@@ -8183,6 +10884,7 @@ def abrir_login():
                     _clear_remembered_user()
 
                 # Vai para o sistema
+                PERFIL.marcar("login (digitação/autenticação)")
                 login_win.withdraw()
                 try:
                     abrir_sistema_com_logo(user, login_win)
@@ -8208,11 +10910,69 @@ def abrir_login():
     except Exception:
         pass
 
+    PERFIL.marcar("tela de login")
+    login_win.after_idle(lambda: PERFIL.relatorio("login pronto"))
     login_win.mainloop()
 
 
 # ===================== MAIN =====================
+def _cli_backup(argv) -> bool:
+    """Comandos de manutenção sem abrir a UI. Retorna True se tratou algum.
+
+    --listar-snapshots
+    --restaurar-snapshot NOME DESTINO.db
+    --replay-journal DESTINO.db [NOME]   (snapshot NOME ou o mais recente + journal)
+    --benchmark-pdf [N]                   (renderiza N cupons, padrão 1000, e mostra o tempo)
+    --extrair-cupom VENDA_ID              (cupom arquivado da venda como PDF avulso)
+    --teste-termica [DESTINO]             (cupom de teste na térmica; DESTINO como THERMAL_PRINTER_URI)
+    """
+    if not argv:
+        return False
+    if argv[0] == "--listar-snapshots":
+        for n in snapshot_listar():
+            print(n)
+        return True
+    if argv[0] == "--restaurar-snapshot" and len(argv) >= 3:
+        print(snapshot_restaurar(argv[1], argv[2]))
+        return True
+    if argv[0] == "--replay-journal" and len(argv) >= 2:
+        nome, aplicados, ultimo = journal_replay(argv[1], argv[2] if len(argv) >= 3 else None)
+        print(f"{argv[1]}: snapshot {nome} + {aplicados} registro(s) do journal (até o id {ultimo})")
+        return True
+    if argv[0] == "--benchmark-pdf":
+        r = pdf_benchmark_cupons(int(argv[1]) if len(argv) >= 2 else 1000)
+        print(f"{r['n']} cupons em {r['total_s']:.2f}s — 1º {r['primeiro_ms']:.1f} ms, "
+              f"depois {r['ms_por_cupom']:.2f} ms/cupom")
+        return True
+    if argv[0] == "--extrair-cupom" and len(argv) >= 2:
+        loc = cupom_arquivo_localizar(int(argv[1]))
+        if not loc:
+            print(f"Venda {argv[1]}: cupom não está no arquivo diário")
+        else:
+            print(cupom_extrair(loc[0], loc[1]))
+        return True
+    if argv[0] == "--teste-termica":
+        impressora = impressora_termica(argv[1] if len(argv) >= 2 else None)
+        t0 = time.perf_counter()
+        dados = montar_cupom_escpos("CLIENTE TESTE", "PRODUTO TESTE", 1, "Dinheiro", 1.0)
+        t1 = time.perf_counter()
+        try:
+            impressora.enviar(dados, "Cupom de teste")
+        except Exception as ex:
+            print(f"{impressora.descricao}: falha — {ex}")
+            return True
+        t2 = time.perf_counter()
+        print(f"{impressora.descricao}: {len(dados)} bytes — montagem {(t1 - t0) * 1000:.2f} ms, "
+              f"envio {(t2 - t1) * 1000:.1f} ms")
+        return True
+    return False
+
+
+PERFIL.marcar("definições (UI, relatórios, PDFs)")
+
 if __name__ == "__main__":
+    if _cli_backup(sys.argv[1:]):
+        sys.exit(0)
     try:
         # Bloqueio por licença (30 dias)
         if not mostrar_dialogo_licenca():
@@ -8220,6 +10980,7 @@ if __name__ == "__main__":
                 sys.exit(0)
             except Exception:
                 os._exit(0)
+        PERFIL.marcar("licença (diálogo/verificação)")
 
         # Aviso via Telegram quando faltar 1 dia para vencer
         try:
@@ -8255,7 +11016,7 @@ def aba_manutencao(frame):
     filtro_frame = tk.Frame(frame)
     filtro_frame.pack(fill="x", padx=10, pady=5)
 
-    tk.Label(filtro_frame, text="Filtrar por nome:").pack(side="left")
+    tk.Label(filtro_frame, text="Filtrar (nome, CPF, telefone ou descrição):").pack(side="left")
 
     filtro_nome_var = tk.StringVar()
     filtro_entry = tk.Entry(filtro_frame, textvariable=filtro_nome_var, width=30)
@@ -8271,31 +11032,16 @@ def aba_manutencao(frame):
     tree.pack(fill="both", expand=True, padx=10, pady=10)
 
     def carregar_dados(filtro_nome=""):
-        tree.delete(*tree.get_children())
-
-        try:
-            if filtro_nome:
-                cursor.execute("""
-                    SELECT os, nome, cpf, telefone, descricao, data, valor, aprovado
-                    FROM manutencao
-                    WHERE nome LIKE ?
-                    ORDER BY os DESC
-                """, (f"%{filtro_nome}%",))
-            else:
-                cursor.execute("""
-                    SELECT os, nome, cpf, telefone, descricao, data, valor, aprovado
-                    FROM manutencao
-                    ORDER BY os DESC
-                """)
-
-            for row in cursor.fetchall():
-                tree.insert("", "end", values=row)
+        aplicar_filtro_manutencao(tree, filtro_nome)
 
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro ao carregar dados:\n{e}")
+    busca = BuscaIncremental(
+        filtro_entry,
+        lambda q: consultar_manutencao(q, limite=None),
+        lambda _q, linhas: sync_treeview(tree, [(row[0], row) for row in linhas]),
+    )
 
     def ao_digitar(*args):
-        carregar_dados(filtro_nome_var.get())
+        busca.agendar(filtro_nome_var.get())
 
     filtro_nome_var.trace_add("write", ao_digitar)
 
@@ -8304,22 +11050,9 @@ def aba_manutencao(frame):
 
 # ===== FILTRO MANUTENÇÃO (SAFE PATCH) =====
 def aplicar_filtro_manutencao(tree, filtro_nome):
+    """Preenche `tree` com as OS filtradas (mesma consulta/índice da aba Manutenção)."""
     try:
-        tree.delete(*tree.get_children())
-        if filtro_nome:
-            cursor.execute("""
-                SELECT os, nome, cpf, telefone, descricao, data, valor, aprovado
-                FROM manutencao
-                WHERE nome LIKE ?
-                ORDER BY os DESC
-            """, (f"%{filtro_nome}%",))
-        else:
-            cursor.execute("""
-                SELECT os, nome, cpf, telefone, descricao, data, valor, aprovado
-                FROM manutencao
-                ORDER BY os DESC
-            """)
-        for row in cursor.fetchall():
-            tree.insert("", "end", values=row)
+        sync_treeview(tree, [(row[0], row) for row in consultar_manutencao(filtro_nome, limite=None)])
     except Exception as e:
-        print("Erro filtro:", e)
+        logging.error("Erro ao filtrar manutenção: %s", e, exc_info=True)
+        messagebox.showerror("Erro", f"Erro ao carregar dados:\n{e}")
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope="session")
+def loja(tmp_path_factory):
+    """sistema_loja importado numa pasta temporária (banco, logs e PDFs ficam fora do repositório)."""
+    pasta = tmp_path_factory.mktemp("loja")
+    anterior = os.getcwd()
+    os.chdir(pasta)
+    sys.path.insert(0, RAIZ)
+    try:
+        import sistema_loja
+        yield sistema_loja
+    finally:
+        os.chdir(anterior)
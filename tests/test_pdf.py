@@ -0,0 +1,72 @@
+"""Motor de PDF: paginação do PdfDocumento e logo em cache compartilhada entre páginas."""
+import re
+
+import pytest
+
+
+@pytest.fixture
+def pdf_legivel(loja, monkeypatch):
+    """Streams de página sem compressão: o texto desenhado aparece literal no arquivo."""
+    loja._reportlab()
+    from reportlab import rl_config
+    monkeypatch.setattr(rl_config, "pageCompression", 0)
+
+
+def _paginas(dados: bytes) -> int:
+    return len(re.findall(rb"/Type /Page\b(?!s)", dados))
+
+
+def _imagens(dados: bytes) -> int:
+    return len(re.findall(rb"/Subtype /Image\b", dados))
+
+
+def _tabela_vendas(loja, caminho, n):
+    doc = loja.PdfDocumento(str(caminho), "Relatorio Teste")
+    colunas = [loja.PdfColuna("Produto", 40), loja.PdfColuna("Total", 540, alinhar="e")]
+    doc.tabela(colunas, [(f"Item {i:03d}", f"R$ {i:.2f}") for i in range(n)], continuacao="Vendas")
+    return doc.salvar()
+
+
+def test_tabela_longa_quebra_paginas_e_repete_cabecalhos(loja, pdf_legivel, tmp_path):
+    dados = open(_tabela_vendas(loja, tmp_path / "rel.pdf", 120), "rb").read()
+
+    paginas = _paginas(dados)
+    assert paginas == 4
+    assert dados.count(b"(Relatorio Teste) Tj") == 1
+    assert dados.count(b"(Relatorio Teste \\(continua") == paginas - 1
+    assert dados.count(b"(Produto) Tj") == paginas      # cabeçalho da tabela em toda página
+    assert dados.count(b"(Vendas) Tj") == paginas - 1   # subtítulo de continuação
+    assert b"(Item 000) Tj" in dados and b"(Item 119) Tj" in dados
+
+
+def test_logo_e_gravada_uma_vez_e_usada_em_todas_as_paginas(loja, pdf_legivel, tmp_path, caplog):
+    dados = open(_tabela_vendas(loja, tmp_path / "rel.pdf", 120), "rb").read()
+
+    assert "usando drawImage" not in caplog.text  # caminho rápido (XObject em cache)
+
+    assert _imagens(dados) == 2  # logo + máscara de transparência, uma vez no arquivo
+    assert len(re.findall(rb"/FormXob\.\w+ Do", dados)) == _paginas(dados)
+
+
+def test_sem_a_api_interna_cai_no_drawimage(loja, pdf_legivel, tmp_path, monkeypatch):
+    monkeypatch.setattr(loja, "_pdf_xobj_suportado", lambda c: False)
+
+    dados = open(_tabela_vendas(loja, tmp_path / "rel.pdf", 120), "rb").read()
+
+    assert _paginas(dados) == 4
+    assert _imagens(dados) == 2
+    assert len(re.findall(rb"/FormXob\.\w+ Do", dados)) == 4
+
+
+def test_falha_ao_registrar_a_logo_cai_no_drawimage(loja, pdf_legivel, tmp_path, monkeypatch):
+    def _quebrado(c, nome, modelo):
+        raise KeyError("idToObject")
+    monkeypatch.setattr(loja, "_pdf_registrar_logo", _quebrado)
+
+    caminho = loja.pdf_documento_curto(str(tmp_path / "cupom.pdf"), ["Cliente: Ana", "Total: R$ 10.00"])
+    dados = open(caminho, "rb").read()
+
+    assert _paginas(dados) == 1
+    assert _imagens(dados) == 2
+    assert len(re.findall(rb"/FormXob\.\w+ Do", dados)) == 1
+    assert b"(Cliente: Ana) Tj" in dados
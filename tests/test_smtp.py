@@ -0,0 +1,164 @@
+"""SmtpPool contra um servidor SMTP local (sem TLS) no lugar do Gmail."""
+import socket
+import socketserver
+import threading
+from email.message import EmailMessage
+
+import pytest
+
+
+class _SmtpFalso(socketserver.ThreadingTCPServer):
+    """Servidor SMTP mínimo: EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA, NOOP, RSET, QUIT."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Sessao)
+        self.lock = threading.Lock()
+        self.conexoes = 0
+        self.logins = 0
+        self.noops = 0
+        self.mensagens = []
+        self.abertas = []
+
+    def derrubar(self):
+        """Fecha todas as sessões abertas (como o timeout de inatividade do servidor)."""
+        with self.lock:
+            abertas, self.abertas = self.abertas, []
+        for s in abertas:
+            try:
+                s.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            s.close()
+
+
+class _Sessao(socketserver.StreamRequestHandler):
+    def _responder(self, linha):
+        self.wfile.write((linha + "\r\n").encode("ascii"))
+        self.wfile.flush()
+
+    def handle(self):
+        srv = self.server
+        with srv.lock:
+            srv.conexoes += 1
+            srv.abertas.append(self.connection)
+        try:
+            self._responder("220 teste ESMTP")
+            while True:
+                linha = self.rfile.readline()
+                if not linha:
+                    return
+                cmd = linha.decode("ascii", "replace").strip()
+                verbo = cmd.split(" ", 1)[0].upper()
+                if verbo == "EHLO":
+                    self._responder("250-teste")
+                    self._responder("250 AUTH PLAIN LOGIN")
+                elif verbo == "AUTH":
+                    with srv.lock:
+                        srv.logins += 1
+                    self._responder("235 2.7.0 Accepted")
+                elif verbo == "NOOP":
+                    with srv.lock:
+                        srv.noops += 1
+                    self._responder("250 OK")
+                elif verbo in ("MAIL", "RCPT", "RSET", "HELO"):
+                    self._responder("250 OK")
+                elif verbo == "DATA":
+                    self._responder("354 fim com <CRLF>.<CRLF>")
+                    corpo = []
+                    while True:
+                        d = self.rfile.readline()
+                        if not d or d in (b".\r\n", b".\n"):
+                            break
+                        corpo.append(d)
+                    with srv.lock:
+                        srv.mensagens.append(b"".join(corpo))
+                    self._responder("250 OK enfileirada")
+                elif verbo == "QUIT":
+                    self._responder("221 tchau")
+                    return
+                else:
+                    self._responder("502 comando nao implementado")
+        except OSError:
+            pass  # sessão derrubada pelo teste
+
+
+@pytest.fixture
+def smtp_local(loja, monkeypatch):
+    srv = _SmtpFalso()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setattr(loja, "_load_email_config", lambda: {
+        "EMAIL_GMAIL": "loja@teste", "EMAIL_GMAIL_APP": "senha",
+        "EMAIL_SMTP_HOST": "127.0.0.1", "EMAIL_SMTP_PORT": str(srv.server_address[1]),
+        "EMAIL_SMTP_MODO": "plain",
+    })
+    yield srv
+    srv.shutdown()
+    srv.derrubar()
+    srv.server_close()
+
+
+def _msg(n):
+    m = EmailMessage()
+    m["Subject"] = f"Cupom {n}"
+    m["From"] = "loja@teste"
+    m["To"] = "cliente@teste"
+    m.set_content(f"cupom {n}")
+    return m
+
+
+def test_sessao_autenticada_e_reaproveitada(loja, smtp_local):
+    pool = loja.SmtpPool()
+    try:
+        for n in range(3):
+            pool.enviar(_msg(n))
+    finally:
+        pool.fechar()
+
+    assert len(smtp_local.mensagens) == 3
+    assert smtp_local.conexoes == 1
+    assert smtp_local.logins == 1
+
+
+def test_reconecta_quando_o_servidor_derruba_a_sessao(loja, smtp_local):
+    pool = loja.SmtpPool()
+    try:
+        pool.enviar(_msg(1))
+        smtp_local.derrubar()
+        pool.enviar(_msg(2))
+    finally:
+        pool.fechar()
+
+    assert [b"cupom 2" in m for m in smtp_local.mensagens] == [False, True]
+    assert smtp_local.conexoes == 2
+    assert smtp_local.logins == 2
+
+
+def test_sessao_ociosa_e_conferida_com_noop(loja, smtp_local, monkeypatch):
+    monkeypatch.setattr(loja, "SMTP_OCIOSO_MAX_SEG", 0)
+    pool = loja.SmtpPool()
+    try:
+        pool.enviar(_msg(1))
+        pool.enviar(_msg(2))
+        assert smtp_local.noops == 1
+        assert smtp_local.conexoes == 1
+
+        smtp_local.derrubar()
+        pool.enviar(_msg(3))  # NOOP falha -> sessão nova antes de tentar o envio
+    finally:
+        pool.fechar()
+
+    assert len(smtp_local.mensagens) == 3
+    assert smtp_local.conexoes == 2
+
+
+def test_sessao_recente_nao_paga_noop(loja, smtp_local):
+    pool = loja.SmtpPool()
+    try:
+        pool.enviar(_msg(1))
+        pool.enviar(_msg(2))
+    finally:
+        pool.fechar()
+
+    assert smtp_local.noops == 0
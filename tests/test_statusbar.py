@@ -0,0 +1,66 @@
+"""StatusBarService: o relógio único sobrevive à janela que hospedava o after()."""
+import time
+import tkinter as tk
+
+import pytest
+
+
+@pytest.fixture
+def nova_raiz():
+    criadas = []
+
+    def _nova():
+        try:
+            r = tk.Tk()
+        except tk.TclError as ex:
+            pytest.skip(f"sem display para o Tk: {ex}")
+        r.withdraw()
+        criadas.append(r)
+        return r
+
+    yield _nova
+    for r in criadas:
+        try:
+            r.destroy()
+        except tk.TclError:
+            pass
+
+
+def _rodar(raiz, segundos):
+    limite = time.monotonic() + segundos
+    while time.monotonic() < limite:
+        raiz.update()
+        time.sleep(0.01)
+
+
+def test_relogio_continua_depois_que_a_raiz_hospedeira_e_destruida(loja, nova_raiz):
+    svc = loja.StatusBarService(intervalo_ms=50)
+
+    # Tk temporário (como o diálogo de licença) vira o host do after()
+    temporaria = nova_raiz()
+    svc.registrar(tk.Label(temporaria), lambda agora: "licença")
+    temporaria.destroy()
+
+    principal = nova_raiz()
+    ticks = []
+    lbl = tk.Label(principal)
+    svc.registrar(lbl, lambda agora: ticks.append(agora) or str(len(ticks)))
+    _rodar(principal, 0.5)
+
+    assert len(ticks) >= 3  # 1 no registro + vários ticks
+    assert lbl.cget("text") == str(len(ticks))
+
+
+def test_host_morto_sem_destroy_e_reagendado(loja, nova_raiz):
+    svc = loja.StatusBarService(intervalo_ms=50)
+    temporaria = nova_raiz()
+    svc.registrar(tk.Label(temporaria), lambda agora: "x")
+    temporaria.unbind("<Destroy>")  # sem o aviso de destruição: só a checagem de host vivo
+    temporaria.destroy()
+
+    principal = nova_raiz()
+    ticks = []
+    svc.registrar(tk.Label(principal), lambda agora: ticks.append(agora) or "y")
+    _rodar(principal, 0.5)
+
+    assert len(ticks) >= 3
@@ -0,0 +1,192 @@
+"""TelegramDispatcher contra um servidor HTTP local no lugar de api.telegram.org."""
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+
+import pytest
+
+
+class _TelegramFalso(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.pedidos = []      # [(metodo, campos)]
+        self.respostas = []    # [(status, json)] consumidas em ordem; depois 200 ok
+        self.conexoes = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.conexoes += 1
+
+    def do_POST(self):
+        corpo = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.headers.get("Content-Type", "").startswith("application/x-www-form-urlencoded"):
+            campos = {k: v[0] for k, v in urllib.parse.parse_qs(corpo.decode("utf-8")).items()}
+        else:
+            campos = {"_bruto": corpo}
+        with self.server.lock:
+            self.server.pedidos.append((self.path.rsplit("/", 1)[-1], campos))
+            status, resp = self.server.respostas.pop(0) if self.server.respostas else (200, {"ok": True, "result": {}})
+        dados = json.dumps(resp).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def telegram(loja, monkeypatch):
+    srv = _TelegramFalso()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setattr(loja, "_TELEGRAM_CFG_CACHE", {
+        "token": "TESTE", "chat_id": "42", "enabled": True, "send_pdf": True,
+        "dedupe_low_sec": 60, "dedupe_zero_sec": 60, "api_base": srv.base,
+    })
+    monkeypatch.setattr(loja, "TELEGRAM_INTERVALO_CHAT_SEG", 0)
+    c = loja.DB.get()
+    with c:
+        c.execute("DELETE FROM telegram_outbox")
+        c.execute("DELETE FROM telegram_dedupe")
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _dispatcher(loja):
+    """Dispatcher sem thread própria: o teste chama _processar() na hora certa."""
+    d = loja.TelegramDispatcher()
+    d.iniciar = lambda: None
+    return d
+
+
+def _outbox(loja):
+    return loja.DB.get().execute(
+        "SELECT status, proxima_tentativa, ultimo_erro FROM telegram_outbox ORDER BY id"
+    ).fetchall()
+
+
+def test_textos_da_mesma_rajada_viram_uma_mensagem(loja, telegram, monkeypatch):
+    monkeypatch.setattr(loja, "TELEGRAM_JANELA_LOTE_SEG", 0)
+    d = _dispatcher(loja)
+    for texto in ("venda 1", "venda 2", "estoque baixo"):
+        assert d.enfileirar("msg", "42", texto)
+
+    d._processar()
+
+    assert [(m, c["text"]) for m, c in telegram.pedidos] == [("sendMessage", "venda 1\n\nvenda 2\n\nestoque baixo")]
+    assert _outbox(loja) == []
+
+    d.enfileirar("msg", "42", "venda 3")
+    d._processar()
+    assert len(telegram.pedidos) == 2
+    assert telegram.conexoes == 1  # mesma conexão keep-alive
+    d._fechar_conexao()
+
+
+def test_rajada_ainda_aberta_espera_a_janela(loja, telegram, monkeypatch):
+    monkeypatch.setattr(loja, "TELEGRAM_JANELA_LOTE_SEG", 30)
+    d = _dispatcher(loja)
+    d.enfileirar("msg", "42", "venda 1")
+
+    espera = d._processar()
+
+    assert telegram.pedidos == []
+    assert 0 < espera <= 30
+
+
+def test_429_respeita_retry_after(loja, telegram, monkeypatch):
+    monkeypatch.setattr(loja, "TELEGRAM_JANELA_LOTE_SEG", 0)
+    telegram.respostas.append((429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 7}}))
+    d = _dispatcher(loja)
+    d.enfileirar("msg", "42", "venda 1")
+
+    antes = time.time()
+    d._processar()
+    (status, proxima, _erro), = _outbox(loja)
+    assert status == "pendente"
+    assert proxima >= antes + 7
+
+    espera = d._processar()  # ainda no castigo: nada sai
+    assert len(telegram.pedidos) == 1
+    assert 6 < espera <= 7
+
+    c = loja.DB.get()
+    with c:
+        c.execute("UPDATE telegram_outbox SET proxima_tentativa=?", (time.time() - 1,))
+    d._processar()
+    assert len(telegram.pedidos) == 2
+    assert _outbox(loja) == []
+    d._fechar_conexao()
+
+
+def test_dedupe_sobrevive_a_reinicio(loja, telegram):
+    assert _dispatcher(loja).enfileirar("msg", "42", "estoque zerado", dedupe_key="zero_X", dedupe_window_sec=3600)
+
+    # "reinício": outra instância e outra conexão ao mesmo banco
+    outra = loja._db_connect()
+    try:
+        assert outra.execute("SELECT COUNT(*) FROM telegram_dedupe WHERE chave='zero_X'").fetchone()[0] == 1
+    finally:
+        outra.close()
+    assert not _dispatcher(loja).enfileirar("msg", "42", "estoque zerado", dedupe_key="zero_X", dedupe_window_sec=3600)
+    assert len(_outbox(loja)) == 1
+
+
+def test_4xx_marca_falhou_sem_repetir(loja, telegram, monkeypatch):
+    monkeypatch.setattr(loja, "TELEGRAM_JANELA_LOTE_SEG", 0)
+    telegram.respostas.append((400, {"ok": False, "description": "Bad Request: chat not found"}))
+    d = _dispatcher(loja)
+    d.enfileirar("msg", "42", "venda 1")
+
+    d._processar()
+    d._processar()
+
+    assert len(telegram.pedidos) == 1
+    (status, _proxima, erro), = _outbox(loja)
+    assert status == "falhou"
+    assert erro.startswith("400 Bad Request")
+
+    c = loja.DB.get()
+    with c:
+        c.execute("UPDATE telegram_outbox SET criado_em=?", (time.time() - 8 * 86400,))
+    d._podar()
+    assert _outbox(loja) == []
+    d._fechar_conexao()
+
+
+def test_linha_da_transacao_do_chamador_sai_logo_apos_o_commit(loja, telegram, monkeypatch):
+    monkeypatch.setattr(loja, "TELEGRAM_JANELA_LOTE_SEG", 0)
+    d = loja.TelegramDispatcher()
+    d.iniciar()
+    time.sleep(0.3)  # thread já ociosa, como no app em uso
+    c = loja.DB.get()
+    try:
+        with c:
+            c.execute("INSERT INTO telegram_dedupe(chave, enviado_em) VALUES ('tx_aberta', 0)")
+            assert c.in_transaction
+            d.enfileirar("msg", "42", "venda 1")
+            time.sleep(0.3)  # a thread acorda e ainda não vê a linha
+        limite = time.monotonic() + 3
+        while not telegram.pedidos and time.monotonic() < limite:
+            time.sleep(0.05)
+        assert [campos["text"] for _m, campos in telegram.pedidos] == ["venda 1"]
+    finally:
+        d._processar = lambda: 3600  # encerra o trabalho da thread deste teste
+        d._acordar.set()
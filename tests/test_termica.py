@@ -0,0 +1,133 @@
+"""Impressão térmica ESC/POS: backends, URI do destino e bytes dos documentos."""
+import datetime
+import socket
+import threading
+
+import pytest
+
+# Layout da OS antes dos backends (bytes montados direto em imprimir_os_termica)
+INICIO = b"\x1b@" b"\x1bt\x10" b"\x1ba\x01" b"\x1d!\x11" b"BESIM COMPANY\n" b"\x1d!\x00"
+ESQUERDA = b"\x1ba\x00"
+FIM = b"\n\n\n" b"\x1dV\x00"
+
+
+def test_os_sai_com_os_mesmos_bytes_de_antes(loja, monkeypatch, tmp_path):
+    texto = loja._build_os_thermal_text(7, "Ana Lúcia", "123", "11 99999-0000", "Troca de tela", 150)
+    monkeypatch.setattr(loja, "_build_os_thermal_text", lambda *a: texto)
+    destino = tmp_path / "os.bin"
+
+    ok, detalhe = loja.imprimir_os_termica(
+        7, "Ana Lúcia", "123", "11 99999-0000", "Troca de tela", 150, printer_name=f"arquivo:{destino}"
+    )
+
+    assert ok, detalhe
+    esperado = INICIO + b"ORDEM DE SERVICO\n\n" + ESQUERDA + texto.encode("cp1252", errors="replace") + FIM
+    assert destino.read_bytes() == esperado
+
+
+def test_cupom_quebra_linhas_longas_e_usa_cp1252(loja):
+    agora = datetime.datetime(2026, 10, 18, 14, 30, 5)
+    produto = "Película 3D Ultra resistente para iPhone 15 Pro Max com moldura"
+
+    dados = loja.montar_cupom_escpos("João da Silva", produto, 2, "Cartão de Crédito", 123.4, 57, agora)
+
+    cabecalho = INICIO + b"CUPOM NAO FISCAL\n\n" + ESQUERDA
+    assert dados.startswith(cabecalho)
+    assert dados.endswith(FIM)
+    texto = dados[len(cabecalho):-len(FIM)].decode("cp1252")
+    linhas = texto.split("\n")
+    assert all(len(l) <= loja.THERMAL_MAX_CHARS for l in linhas)
+    i = linhas.index(next(l for l in linhas if l.startswith("Produto: ")))
+    assert linhas[i:i + 2] == loja._wrap_thermal_line("Produto", produto, loja.THERMAL_MAX_CHARS)
+    assert linhas[i + 1].startswith(" " * len("Produto: "))
+    assert "Cliente: João da Silva" in linhas
+    assert "Total: R$ 123.40" in linhas
+    assert "Pontos acumulados: 57 pts" in linhas
+    assert "Data: 18/10/2026 14:30:05" in linhas
+
+
+def test_imprimir_cupom_envia_o_payload_montado(loja):
+    captura = loja.ImpressoraArquivo()
+
+    ok, detalhe = loja.imprimir_cupom_termica("Ana", "Capa", 1, "Pix", 30, impressora=captura)
+
+    assert (ok, detalhe) == (True, "memória")
+    (titulo, dados), = captura.enviados
+    assert titulo == "Cupom"
+    assert b"Produto: Capa" in dados
+
+
+@pytest.mark.parametrize("uri, tipo, attrs", [
+    ("tcp://10.0.0.5", "ImpressoraTcp", {"host": "10.0.0.5", "porta": 9100}),
+    ("TCP://impressora.local:9101/", "ImpressoraTcp", {"host": "impressora.local", "porta": 9101}),
+    ("dev:/dev/usb/lp0", "ImpressoraDispositivo", {"caminho": "/dev/usb/lp0"}),
+    ("arquivo:/tmp/cupons.bin", "ImpressoraArquivo", {"caminho": "/tmp/cupons.bin"}),
+    ("arquivo:", "ImpressoraArquivo", {"caminho": None}),
+    ("win32:EPSON TM-T20", "ImpressoraWin32", {"nome": "EPSON TM-T20"}),
+    ("POS-80", "ImpressoraWin32", {"nome": "POS-80"}),
+])
+def test_uri_do_destino(loja, uri, tipo, attrs):
+    imp = loja.impressora_termica(uri)
+
+    assert type(imp).__name__ == tipo
+    assert {k: getattr(imp, k) for k in attrs} == attrs
+
+
+def test_uri_vazia_usa_config_ou_win32_automatico(loja, monkeypatch):
+    monkeypatch.setattr(loja, "THERMAL_PRINTER_URI", "")
+    assert type(loja.impressora_termica()).__name__ == "ImpressoraWin32"
+    assert loja.impressora_termica().nome is None
+
+    monkeypatch.setattr(loja, "THERMAL_PRINTER_URI", "tcp://127.0.0.1:9100")
+    assert type(loja.impressora_termica()).__name__ == "ImpressoraTcp"
+
+
+def test_dispositivo_grava_os_bytes(loja, tmp_path):
+    lp = tmp_path / "lp0"
+    loja.impressora_termica(f"dev:{lp}").enviar(b"\x1b@teste")
+    assert lp.read_bytes() == b"\x1b@teste"
+
+
+def test_tcp_9100_entrega_o_cupom_ao_servidor(loja):
+    srv = socket.socket()
+    srv.bind(("127.0.0.1", 0))
+    srv.listen(1)
+    recebido = []
+
+    def _aceitar():
+        c, _ = srv.accept()
+        with c:
+            partes = []
+            while True:
+                bloco = c.recv(4096)
+                if not bloco:
+                    break
+                partes.append(bloco)
+        recebido.append(b"".join(partes))
+
+    t = threading.Thread(target=_aceitar, daemon=True)
+    t.start()
+    try:
+        imp = loja.impressora_termica(f"tcp://127.0.0.1:{srv.getsockname()[1]}")
+        ok, detalhe = loja.imprimir_cupom_termica("Ana", "Capa", 1, "Pix", 30, impressora=imp)
+        t.join(timeout=5)
+    finally:
+        srv.close()
+
+    assert ok, detalhe
+    assert recebido and recebido[0].startswith(INICIO) and recebido[0].endswith(FIM)
+    assert b"Produto: Capa" in recebido[0]
+
+
+def test_falha_de_conexao_volta_como_erro(loja):
+    srv = socket.socket()
+    srv.bind(("127.0.0.1", 0))
+    porta = srv.getsockname()[1]
+    srv.close()  # porta livre: ninguém escutando
+
+    ok, detalhe = loja.imprimir_cupom_termica(
+        "Ana", "Capa", 1, "Pix", 30, impressora=loja.impressora_termica(f"tcp://127.0.0.1:{porta}")
+    )
+
+    assert not ok
+    assert detalhe